@@ -1,4 +1,4 @@
-from flask import Flask, redirect, url_for, request, has_request_context, current_app
+from flask import Flask, redirect, url_for, request, has_request_context, current_app, flash
 from flask_admin.actions import action
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager, current_user
@@ -15,7 +15,12 @@ import os
 from datetime import datetime
 from sqlalchemy.exc import OperationalError
 from werkzeug.utils import secure_filename
-from app.utils.file_upload import FileUploadField, MultipleFileUploadField
+from app.utils.file_upload import FileUploadField, MultipleFileUploadField, store_upload
+from app.utils.content_versions import content_versions
+from app.utils.response_cache import response_cache
+from app.utils.images import image_pipeline
+from app.utils.image_cache import resized_images, thumbnail_url
+from app.utils.hot_assets import hot_assets
 from wtforms import validators, StringField
 import errno
 import stat
@@ -33,6 +38,7 @@ ckeditor = CKEditor()
 login_manager = LoginManager()
 
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'pdf'}
+LANGUAGES = ('ru', 'tk', 'en')
 
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
@@ -85,10 +91,20 @@ class ModelAdminView(ModelView):
     def is_accessible(self):
         return current_user.is_authenticated and getattr(current_user, 'is_admin', False)
 
+    # Колонки с URL загрузок (строка или список), для которых строятся варианты изображений
+    image_columns = ()
+
+    def after_model_change(self, form, model, is_created):
+        if self.image_columns:
+            image_pipeline.submit(
+                [getattr(model, name, None) for name in self.image_columns],
+                (self.model.__table__.name,)
+            )
+
     def _list_thumbnail(self, context, model, name):
         url = getattr(model, name, None)
         if url:
-            return Markup(f'<img src="{url}" style="max-height:50px;max-width:80px;object-fit:cover;border-radius:4px;">')
+            return Markup(f'<img src="{thumbnail_url(url)}" loading="lazy" style="max-height:50px;max-width:80px;object-fit:cover;border-radius:4px;">')
         return ''
 
     def _ensure_upload_folder(self, folder_path):
@@ -118,6 +134,7 @@ class BannerAdminView(ModelAdminView):
         'id', 'title_ru', 'title_en', 'image_url', 'logo_url', 'button_link', 'created_at'
     )
     column_searchable_list = ('title_ru', 'title_en', 'button_link')
+    image_columns = ('image_url', 'logo_url')
     column_sortable_list = ('id', 'title_ru', 'title_en', 'created_at')
     column_formatters = {
         'image_url': lambda v, c, m, n: v._list_thumbnail(c, m, 'image_url'),
@@ -136,15 +153,9 @@ class BannerAdminView(ModelAdminView):
         upload_folder = current_app.config['UPLOAD_FOLDER']
         self._ensure_upload_folder(upload_folder)
         if form.image_file.data:
-            filename = secure_filename(form.image_file.data.filename)
-            file_path = os.path.join(upload_folder, filename)
-            form.image_file.data.save(file_path)
-            model.image_url = f'/Uploads/{filename}'
+            model.image_url = store_upload(form.image_file.data, upload_folder)
         if form.logo_file.data:
-            filename = secure_filename(form.logo_file.data.filename)
-            file_path = os.path.join(upload_folder, filename)
-            form.logo_file.data.save(file_path)
-            model.logo_url = f'/Uploads/{filename}'
+            model.logo_url = store_upload(form.logo_file.data, upload_folder)
         if not model.image_url and is_created:
             raise ValueError("Banner image required")
 
@@ -239,6 +250,7 @@ class ProjectAdminView(ModelAdminView):
     column_searchable_list = ('title_ru', 'title_en', 'description_ru', 'description_en')
     column_sortable_list = ('id', 'title_ru', 'title_en', 'type', 'created_at')
     column_filters = ['type', 'created_at', 'categories.title_ru']
+    image_columns = ('main_image', 'images')
     column_formatters = {
         'main_image': lambda v, c, m, n: v._list_thumbnail(c, m, 'main_image'),
     }
@@ -271,15 +283,10 @@ class ProjectAdminView(ModelAdminView):
             return
 
         # Удаление изображения через query-параметр
+        # Сам файл удаляет upload_collector, когда на него не останется ссылок
         remove_image_url = request.args.get('remove_image')
         if remove_image_url and project.images and remove_image_url in project.images:
-            project.images.remove(remove_image_url)
-            try:
-                abs_path = os.path.join(current_app.root_path, remove_image_url.lstrip('/'))
-                if os.path.exists(abs_path):
-                    os.remove(abs_path)
-            except Exception as e:
-                current_app.logger.warning(f"Не удалось удалить файл: {e}")
+            project.images = [url for url in project.images if url != remove_image_url]
             db.session.commit()
 
         # Обновлённый список изображений
@@ -324,22 +331,14 @@ class ProjectAdminView(ModelAdminView):
         current_app.logger.info(f"Путь к папке загрузки: {upload_folder}")
         
         if form.main_image_file.data:
-            filename = secure_filename(form.main_image_file.data.filename)
-            file_path = os.path.join(upload_folder, filename)
-            current_app.logger.info(f"Сохранение основного изображения в: {file_path}")
-            form.main_image_file.data.save(file_path)
-            model.main_image = f'/Uploads/{filename}'
+            model.main_image = store_upload(form.main_image_file.data, upload_folder)
+            current_app.logger.info(f"Основное изображение сохранено: {model.main_image}")
         
-        if form.images_files.data:
-            filenames = list(model.images or [])
-            for img in form.images_files.data:
-                if img and hasattr(img, 'filename') and img.filename:
-                    filename = secure_filename(img.filename)
-                    file_path = os.path.join(upload_folder, filename)
-                    current_app.logger.info(f"Сохранение дополнительного изображения в: {file_path}")
-                    img.save(file_path)
-                    filenames.append(f'/Uploads/{filename}')
-            model.images = filenames
+        # Файлы проверены при валидации; сохраняются параллельно только теперь, когда форма принята
+        image_urls = form.images_files.save(upload_folder)
+        if image_urls:
+            model.images = list(model.images or []) + image_urls
+            current_app.logger.info(f"Дополнительных изображений сохранено: {len(image_urls)}")
 
         if form.tags_ru_input.data:
             model.tags_ru = [t.strip() for t in form.tags_ru_input.data.split(',') if t.strip()]
@@ -365,6 +364,7 @@ class BlogAdminView(ModelAdminView):
     )
     column_searchable_list = ('title_ru', 'title_en', 'description_ru', 'description_en')
     column_sortable_list = ('id', 'title_ru', 'title_en', 'date', 'created_at')
+    image_columns = ('image_url', 'additional_images')
     column_formatters = {
         'image_url': lambda v, c, m, n: v._list_thumbnail(c, m, 'image_url'),
     }
@@ -403,19 +403,11 @@ class BlogAdminView(ModelAdminView):
         self._ensure_upload_folder(upload_folder)
 
         if form.image_file.data:
-            filename = secure_filename(form.image_file.data.filename)
-            path = os.path.join(upload_folder, filename)
-            form.image_file.data.save(path)
-            model.image_url = f'/Uploads/{filename}'
-
-        if form.additional_images_files.data:
-            filenames = []
-            for img in form.additional_images_files.data:
-                filename = secure_filename(img.filename)
-                path = os.path.join(upload_folder, filename)
-                img.save(path)
-                filenames.append(f'/Uploads/{filename}')
-            model.additional_images = filenames
+            model.image_url = store_upload(form.image_file.data, upload_folder)
+
+        additional_urls = form.additional_images_files.save(upload_folder)
+        if additional_urls:
+            model.additional_images = additional_urls
 
         if form.tags_input.data:
             model.tags = [t.strip() for t in form.tags_input.data.split(',') if t.strip()]
@@ -434,6 +426,7 @@ class ClientAdminView(ModelAdminView):
     column_list = ('id', 'logo_url', 'default_logo', 'order', 'created_at')
     column_sortable_list = ('id', 'order', 'created_at')
     column_default_sort = ('order', False)
+    image_columns = ('logo_url', 'default_logo')
     column_labels = {
         'id': 'ID',
         'logo_url': 'Логотип',
@@ -454,8 +447,9 @@ class ClientAdminView(ModelAdminView):
     @action('delete', 'Удалить', 'Вы уверены, что хотите удалить выбранные записи?')
     def action_delete(self, ids):
         try:
-            query = Client.query.filter(Client.id.in_(ids))
-            query.delete(synchronize_session='fetch')
+            # По одной записи, чтобы сработали события модели (счётчики ссылок на загрузки)
+            for client in Client.query.filter(Client.id.in_(ids)).all():
+                db.session.delete(client)
             db.session.commit()
         except Exception as ex:
             db.session.rollback()
@@ -465,15 +459,9 @@ class ClientAdminView(ModelAdminView):
         upload_folder = current_app.config['UPLOAD_FOLDER']
         self._ensure_upload_folder(upload_folder)
         if form.logo_file.data:
-            filename = secure_filename(form.logo_file.data.filename)
-            file_path = os.path.join(upload_folder, filename)
-            form.logo_file.data.save(file_path)
-            model.logo_url = f'/Uploads/{filename}'
+            model.logo_url = store_upload(form.logo_file.data, upload_folder)
         if form.default_logo_file.data:
-            filename = secure_filename(form.default_logo_file.data.filename)
-            file_path = os.path.join(upload_folder, filename)
-            form.default_logo_file.data.save(file_path)
-            model.default_logo = f'/Uploads/{filename}'
+            model.default_logo = store_upload(form.default_logo_file.data, upload_folder)
         if not model.logo_url and is_created:
             raise ValueError("Client logo required")
 
@@ -500,6 +488,7 @@ class AboutItemAdminView(ModelAdminView):
         'background_image_file', 'button_text_ru', 'button_text_en', 'button_link',
         'deliverables_ru', 'deliverables_en', 'color', 'type', 'categories'
     )
+    image_columns = ('background_image_url',)
     form_extra_fields = {
         'background_image_file': FileUploadField('Background Image', base_path=lambda: current_app.config['UPLOAD_FOLDER'], allowed_extensions=ALLOWED_EXTENSIONS),
     }
@@ -530,10 +519,7 @@ class AboutItemAdminView(ModelAdminView):
         upload_folder = current_app.config['UPLOAD_FOLDER']
         self._ensure_upload_folder(upload_folder)
         if form.background_image_file.data:
-            filename = secure_filename(form.background_image_file.data.filename)
-            file_path = os.path.join(upload_folder, filename)
-            form.background_image_file.data.save(file_path)
-            model.background_image_url = f'/Uploads/{filename}'
+            model.background_image_url = store_upload(form.background_image_file.data, upload_folder)
 
 # Service Admin
 from app.models.project import Project
@@ -583,8 +569,12 @@ class ServiceAdminView(ModelAdminView):
 # Portfolio PDF Admin
 from app.models.portfolio_pdf import PortfolioPDF
 class PortfolioPDFAdminView(ModelAdminView):
-    column_list = ('id', 'pdf_file')
-    column_sortable_list = ('id',)
+    list_template = 'admin/portfolio_pdf_list.html'
+    # Страницы, превью и облегчённая копия строятся в фоне
+    image_columns = ('pdf_file',)
+    column_list = ('id', 'pdf_file', 'locale', 'created_at')
+    column_sortable_list = ('id', 'locale', 'created_at')
+    form_columns = ('pdf_file',)
     form_overrides = {
         'pdf_file': FileUploadField
     }
@@ -601,13 +591,25 @@ class PortfolioPDFAdminView(ModelAdminView):
         upload_folder = current_app.config['UPLOAD_FOLDER']
         self._ensure_upload_folder(upload_folder)
         if form.pdf_file.data:
-            filename = secure_filename(form.pdf_file.data.filename)
-            file_path = os.path.join(upload_folder, filename)
-            form.pdf_file.data.save(file_path)
-            model.pdf_file = f'/Uploads/{filename}'
+            model.pdf_file = store_upload(form.pdf_file.data, upload_folder)
         elif is_created:
             raise ValueError("PDF-файл обязателен")
 
+    def render(self, template, **kwargs):
+        from app.utils.portfolio import portfolio_builder
+        kwargs.setdefault('builder_running', portfolio_builder.running)
+        return super().render(template, **kwargs)
+
+    @expose('/build/', methods=('POST',))
+    def build_view(self):
+        # Сборка идёт в фоне, строки по языкам появятся в списке по готовности
+        from app.utils.portfolio import portfolio_builder
+        if portfolio_builder.start():
+            flash('Сборка портфолио запущена', 'success')
+        else:
+            flash('Портфолио уже собирается', 'warning')
+        return redirect(url_for('.index_view'))
+
 
 # User Admin
 from wtforms import PasswordField
@@ -642,6 +644,7 @@ class PartnerAdminView(ModelAdminView):
     column_searchable_list = ('name_ru', 'name_en')
     column_sortable_list = ('id', 'name_ru', 'name_en', 'order', 'created_at')
     column_default_sort = ('order', False)
+    image_columns = ('logo_url',)
     column_labels = {
         'id': 'ID',
         'name_ru': 'Название (RU)',
@@ -671,8 +674,9 @@ class PartnerAdminView(ModelAdminView):
     @action('delete', 'Удалить', 'Вы уверены, что хотите удалить выбранные записи?')
     def action_delete(self, ids):
         try:
-            query = Partner.query.filter(Partner.id.in_(ids))
-            query.delete(synchronize_session='fetch')
+            # По одной записи, чтобы сработали события модели (счётчики ссылок на загрузки)
+            for partner in Partner.query.filter(Partner.id.in_(ids)).all():
+                db.session.delete(partner)
             db.session.commit()
         except Exception as ex:
             db.session.rollback()
@@ -682,10 +686,7 @@ class PartnerAdminView(ModelAdminView):
         upload_folder = current_app.config['UPLOAD_FOLDER']
         self._ensure_upload_folder(upload_folder)
         if form.logo_file.data:
-            filename = secure_filename(form.logo_file.data.filename)
-            file_path = os.path.join(upload_folder, filename)
-            form.logo_file.data.save(file_path)
-            model.logo_url = f'/Uploads/{filename}'
+            model.logo_url = store_upload(form.logo_file.data, upload_folder)
         if not model.logo_url and is_created:
             raise ValueError("Logo image required")
 from app.models.contact_request import ContactRequest
@@ -721,9 +722,9 @@ class ReviewAdminView(ModelAdminView):
 def get_locale_from_request():
     if has_request_context():
         lang = request.args.get('lang')
-        if lang in ['ru', 'tk', 'en']:
+        if lang in LANGUAGES:
             return lang
-        return request.accept_languages.best_match(['ru', 'tk', 'en'], default='en')
+        return request.accept_languages.best_match(LANGUAGES, default='en')
     return 'en'
 
 def create_app():
@@ -739,12 +740,34 @@ def create_app():
     app.config['SESSION_COOKIE_SAMESITE'] = 'Lax'
     app.config['UPLOAD_FOLDER'] = os.path.normpath(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'Uploads')))
     app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024
+    # За nginx файлы из Uploads отдаёт nginx через X-Accel-Redirect (например, /_uploads/)
+    app.config['UPLOAD_ACCEL_PREFIX'] = os.environ.get('UPLOAD_ACCEL_PREFIX')
+    # Мелкие файлы (логотипы, иконки) до 256 КБ отдаются из памяти воркера; 0 отключает
+    app.config['HOT_ASSET_MAX_BYTES'] = int(os.environ.get('HOT_ASSET_MAX_BYTES', 32 * 1024 * 1024))
+    # Крупные файлы грузятся частями через /api/uploads, каждая часть меньше MAX_CONTENT_LENGTH
+    app.config['CHUNKED_UPLOAD_CHUNK_SIZE'] = 8 * 1024 * 1024
+    app.config['CHUNKED_UPLOAD_MAX_SIZE'] = int(os.environ.get('CHUNKED_UPLOAD_MAX_SIZE', 512 * 1024 * 1024))
     app.config['BABEL_DEFAULT_LOCALE'] = 'en'
     app.config['BABEL_DEFAULT_TIMEZONE'] = 'UTC'
     app.config['BABEL_TRANSLATION_DIRECTORIES'] = os.path.join(os.path.dirname(__file__), 'translations')
     # CKEditor — serve from flask-ckeditor bundled files (offline, no CDN)
     app.config['CKEDITOR_SERVE_LOCAL'] = True
     app.config['CKEDITOR_PKG_TYPE'] = 'standard'
+    # Кэш ответов публичного API (сбрасывается при коммите изменённых таблиц)
+    app.config['RESPONSE_CACHE_ENABLED'] = os.environ.get('RESPONSE_CACHE_ENABLED', '1') != '0'
+    app.config['RESPONSE_CACHE_SIZE'] = int(os.environ.get('RESPONSE_CACHE_SIZE', 512))
+    # Ответы меньше этого размера (байт) не сжимаются
+    app.config['RESPONSE_COMPRESS_MIN_SIZE'] = int(os.environ.get('RESPONSE_COMPRESS_MIN_SIZE', 1024))
+    # Превышение лимита SQL-запросов эндпоинта: исключение вместо предупреждения
+    app.config['QUERY_BUDGET_STRICT'] = os.environ.get('QUERY_BUDGET_STRICT') == '1'
+    # UPLOAD_GC_AUTO=1: неиспользуемые файлы из Uploads удаляются фоново через сутки после
+    # удаления последней ссылки; без него только `flask uploads-gc`
+    app.config['UPLOAD_GC_AUTO'] = os.environ.get('UPLOAD_GC_AUTO') == '1'
+    app.config['UPLOAD_GC_GRACE'] = int(os.environ.get('UPLOAD_GC_GRACE', 24 * 3600))
+    # Статический снимок API для nginx, пересобирается после коммита в админке
+    app.config['STATIC_EXPORT_AUTO'] = os.environ.get('STATIC_EXPORT_AUTO', '1') != '0'
+    if os.environ.get('STATIC_EXPORT_FOLDER'):
+        app.config['STATIC_EXPORT_FOLDER'] = os.environ['STATIC_EXPORT_FOLDER']
     # ... остальная часть функции create_app остается без изменений ...
     logging.basicConfig(level=logging.INFO)
     app.logger.setLevel(logging.INFO)
@@ -771,8 +794,13 @@ def create_app():
 
     CORS(app, resources={r"/api/*": {"origins": "*"}, r"/static/*": {"origins": "*"}})
 
+    from app.utils.search import search_index, include_object
+    from app.utils.upload_refs import upload_collector
+
     db.init_app(app)
-    migrate.init_app(app, db)
+    migrate.init_app(app, db, include_object=include_object)
+    content_versions.init_app(app, db)
+    response_cache.init_app(app)
     babel.init_app(app, locale_selector=get_locale_from_request)
     ckeditor.init_app(app)
     login_manager.init_app(app)
@@ -780,6 +808,25 @@ def create_app():
 
     from app.routes.main import main_bp
     app.register_blueprint(main_bp)
+    from app.api.resources import init_api
+    init_api(app)
+
+    from app.utils.bundle import homepage_bundle
+    homepage_bundle.init_app(app)
+    from app.utils.static_export import static_exporter
+    static_exporter.init_app(app)
+    image_pipeline.init_app(app)
+    from app.utils.pdf_ingest import pdf_ingest
+    pdf_ingest.init_app(app)
+    # Шрифты PDF читаются один раз, до fork при gunicorn --preload
+    from app.utils.pdf import pdf_fonts
+    pdf_fonts.init_app(app)
+    from app.utils.pdf_cache import project_pdfs
+    project_pdfs.init_app(app)
+    from app.utils.portfolio import portfolio_builder
+    portfolio_builder.init_app(app)
+    resized_images.init_app(app)
+    hot_assets.init_app(app)
 
     from app.models.user import User
     @login_manager.user_loader
@@ -798,6 +845,7 @@ def create_app():
     from app.models.portfolio_pdf import PortfolioPDF
     from app.models.contact import Contact
     from app.models.user import User
+    from app.models.upload_ref import UploadRef
 
     admin = Admin(app, index_view=MyAdminIndexView(), template_mode='bootstrap4', name='Tagma Admin', base_template='admin/my_master.html')
 
@@ -828,5 +876,11 @@ def create_app():
             app.logger.info("База данных инициализирована успешно.")
         except OperationalError as e:
             app.logger.error(f"Ошибка при инициализации базы данных: {str(e)}")
+    search_index.init_app(app)
+    upload_collector.init_app(app)
+    from app.utils import tags
+    tags.init_app(app)
+    from app.utils.media import media_optimizer
+    media_optimizer.init_app(app)
 
     return app
\ No newline at end of file
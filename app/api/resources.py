@@ -6,12 +6,24 @@ from app.models.project import Project
 from app.models.blog import Blog
 from app.models.category import Category
 from app.models.project import project_category
-import io
+from app.utils.response_cache import cached_response
+from app.utils.query_budget import query_budget
+from app.utils.localization import current_locale
+from app.utils.pagination import keyset_paginate, next_page_cursor, count_cache
+from app.utils.fieldsets import parse_fields, fieldset_options
+from app.utils.images import image_pipeline, IMAGE_EXTENSIONS
+from app.utils.chunked_upload import chunked_uploads, ChunkedUploadError
+from app.utils.file_serving import send_upload
+from app.utils.file_upload import UPLOAD_URL_PREFIX, check_upload, store_upload
+from app.utils.pdf_cache import project_pdfs
+from app.utils.tags import string_list, tag_key, tagged
+from flask_login import login_required
 import os
+import re
 from werkzeug.utils import secure_filename
 from werkzeug.datastructures import FileStorage
+from wtforms import ValidationError
 from datetime import datetime
-from fpdf import FPDF
 
 # Парсер для валидации данных Banner
 banner_parser = reqparse.RequestParser()
@@ -50,6 +62,8 @@ blog_parser.add_argument('date', type=str, required=True, help='Date is required
 blog_parser.add_argument('read_time', type=str, default=None)
 blog_parser.add_argument('link', type=str, default='/')
 
+SHA256_HEX = re.compile(r'[0-9a-fA-F]{64}')
+
 # Парсер для загрузки изображения
 image_parser = reqparse.RequestParser()
 image_parser.add_argument('image', type=FileStorage, location='files', required=True, help='Image file is required')
@@ -58,18 +72,41 @@ image_parser.add_argument('image', type=FileStorage, location='files', required=
 pdf_parser = reqparse.RequestParser()
 pdf_parser.add_argument('pdf', type=FileStorage, location='files', required=True, help='PDF file is required')
 
+# Постраничная выдача по курсору (created_at, id) вместо OFFSET
+def keyset_result(query, model, cursor, per_page, count_key, locale, fields, *count_sources):
+    try:
+        page = keyset_paginate(query, model, per_page, cursor)
+    except ValueError:
+        abort(400, description="Invalid cursor")
+
+    pagination = {
+        'per_page': per_page,
+        'has_next': page.has_next,
+        'has_prev': page.has_prev,
+        'next_cursor': page.next_cursor,
+        'prev_cursor': page.prev_cursor
+    }
+    if request.args.get('with_total', type=int):
+        pagination['total'] = count_cache.count(count_key, query, *count_sources)
+    return {
+        'status': 'success',
+        'data': [item.to_dict(locale, fields) for item in page.items],
+        'pagination': pagination
+    }
+
 # Ресурс для Banner
+# Список баннеров (GET /api/banners) отдаёт main_bp
 class BannerResource(Resource):
-    def get(self, banner_id=None):
-        locale = request.args.get('lang', 'en')
-        if banner_id:
-            banner = Banner.query.get_or_404(banner_id)
-            return banner.to_dict()
-        banners = Banner.query.all()
-        return {
-            'status': 'success',
-            'data': [banner.to_dict() for banner in banners]
-        }
+    method_decorators = {
+        'get': [query_budget(1), cached_response(Banner)],
+        'post': [login_required],
+        'put': [login_required],
+        'delete': [login_required],
+    }
+
+    def get(self, banner_id):
+        banner = Banner.query.get_or_404(banner_id)
+        return banner.to_dict()
 
     def post(self):
         args = banner_parser.parse_args()
@@ -107,41 +144,9 @@ class BannerResource(Resource):
         db.session.commit()
         return {'message': 'Banner deleted successfully'}, 200
 
-# Ресурс для проекта
+# Ресурс для проекта: чтение (GET /api/projects, /api/projects/<id>) отдаёт main_bp
 class ProjectResource(Resource):
-    def get(self, project_id=None):
-        locale = request.args.get('lang', 'en')
-        page = request.args.get('page', 1, type=int)
-        per_page = min(request.args.get('per_page', 5, type=int), 50)
-        category_id = request.args.get('category_id', type=int)
-
-        if project_id:
-            project = Project.query.get_or_404(project_id)
-            return project.to_dict()
-
-        query = Project.query
-        if category_id:
-            query = query.join(project_category).filter(project_category.c.category_id == category_id)
-
-        pagination = query.order_by(Project.created_at.desc()).paginate(
-            page=page, per_page=per_page, error_out=False
-        )
-        projects = pagination.items
-
-        return {
-            'status': 'success',
-            'data': [project.to_dict() for project in projects],
-            'pagination': {
-                'total': pagination.total,
-                'pages': pagination.pages,
-                'current_page': pagination.page,
-                'per_page': pagination.per_page,
-                'has_next': pagination.has_next,
-                'has_prev': pagination.has_prev,
-                'next_page': pagination.next_num if pagination.has_next else None,
-                'prev_page': pagination.prev_num if pagination.has_prev else None
-            }
-        }
+    method_decorators = [login_required]
 
     def post(self):
         args = project_parser.parse_args()
@@ -153,6 +158,8 @@ class ProjectResource(Resource):
             main_image=args['main_image'],
             content_ru=args['content_ru'],
             content_en=args['content_en'],
+            tags_ru=string_list(args['tags_ru']),
+            tags_en=string_list(args['tags_en']),
             bg_color=args['bg_color'],
             type=args['type']
         )
@@ -170,6 +177,10 @@ class ProjectResource(Resource):
         project.main_image = args['main_image']
         project.content_ru = args['content_ru']
         project.content_en = args['content_en']
+        if args['tags_ru'] is not None:
+            project.tags_ru = string_list(args['tags_ru'])
+        if args['tags_en'] is not None:
+            project.tags_en = string_list(args['tags_en'])
         project.bg_color = args['bg_color']
         project.type = args['type']
         db.session.commit()
@@ -182,24 +193,46 @@ class ProjectResource(Resource):
         return {'message': 'Project deleted successfully'}, 200
 
 # Ресурс для Blog
+# Статья по id (GET /api/blog/<id>) и список /api/blog/ — в main_bp, здесь список /api/blog
 class BlogResource(Resource):
-    def get(self, blog_id=None):
-        locale = request.args.get('lang', 'en')
+    method_decorators = {
+        'get': [query_budget(2), cached_response(
+            Blog, args=('page', 'per_page', 'tag', 'cursor', 'fields', 'with_total')
+        )],
+        'post': [login_required],
+        'put': [login_required],
+        'delete': [login_required],
+    }
+
+    def get(self):
+        locale = current_locale()
         page = request.args.get('page', 1, type=int)
         per_page = min(request.args.get('per_page', 5, type=int), 50)
 
-        if blog_id:
-            blog = Blog.query.get_or_404(blog_id)
-            return blog.to_dict()
-
-        pagination = Blog.query.order_by(Blog.created_at.desc()).paginate(
-            page=page, per_page=per_page, error_out=False
+        try:
+            fields = parse_fields(request.args.get('fields'), Blog, Blog.__list_fields__)
+        except ValueError as e:
+            abort(400, description=str(e))
+        query = Blog.query.options(*fieldset_options(Blog, fields))
+        count_query = Blog.query
+        tag = request.args.get('tag', '').strip()
+        if tag:
+            query = query.filter(tagged(Blog, tag))
+            count_query = count_query.filter(tagged(Blog, tag))
+        count_key = ('blog_resource', tag_key(tag))
+
+        if request.args.get('cursor'):
+            return keyset_result(query, Blog, request.args['cursor'], max(per_page, 1), count_key, locale, fields, Blog)
+
+        pagination = query.order_by(Blog.created_at.desc().nulls_last(), Blog.id.desc()).paginate(
+            page=page, per_page=per_page, error_out=False, count=False
         )
+        pagination.total = count_cache.count(count_key, count_query, Blog)
         blogs = pagination.items
 
         return {
             'status': 'success',
-            'data': [blog.to_dict() for blog in blogs],
+            'data': [blog.to_dict(locale, fields) for blog in blogs],
             'pagination': {
                 'total': pagination.total,
                 'pages': pagination.pages,
@@ -208,7 +241,8 @@ class BlogResource(Resource):
                 'has_next': pagination.has_next,
                 'has_prev': pagination.has_prev,
                 'next_page': pagination.next_num if pagination.has_next else None,
-                'prev_page': pagination.prev_num if pagination.has_prev else None
+                'prev_page': pagination.prev_num if pagination.has_prev else None,
+                'next_cursor': next_page_cursor(pagination)
             }
         }
 
@@ -221,7 +255,7 @@ class BlogResource(Resource):
             description_ru=args['description_ru'],
             description_en=args['description_en'],
             image_url=args['image_url'],
-            additional_images=args['additional_images'],
+            additional_images=string_list(args['additional_images']),
             date=datetime.strptime(args['date'], '%Y-%m-%d'),
             read_time=args['read_time'],
             link=args['link']
@@ -239,7 +273,7 @@ class BlogResource(Resource):
         blog.description_ru = args['description_ru']
         blog.description_en = args['description_en']
         blog.image_url = args['image_url']
-        blog.additional_images = args['additional_images']
+        blog.additional_images = string_list(args['additional_images'])
         blog.date = datetime.strptime(args['date'], '%Y-%m-%d')
         blog.read_time = args['read_time']
         blog.link = args['link']
@@ -252,14 +286,95 @@ class BlogResource(Resource):
         db.session.commit()
         return {'message': 'Blog post deleted successfully'}, 200
 
+def upload_id_arg():
+    data = request.get_json(silent=True) or {}
+    return request.form.get('upload_id') or data.get('upload_id')
+
+# Загрузка крупных файлов частями: POST /uploads (init) -> PUT /uploads/<id> (части)
+# -> POST .../complete, затем upload_id передаётся в /upload-image или /project/<id>/upload-pdf
+class ChunkedUploadStartResource(Resource):
+    method_decorators = [login_required]
+
+    def post(self):
+        data = request.get_json(silent=True) or {}
+        filename = data.get('filename') or ''
+        size = data.get('size')
+        sha256 = data.get('sha256')
+        max_size = current_app.config.get('CHUNKED_UPLOAD_MAX_SIZE', 512 * 1024 * 1024)
+        if not isinstance(filename, str) or '.' not in filename or \
+                filename.rsplit('.', 1)[1].lower() not in IMAGE_EXTENSIONS | {'pdf'}:
+            abort(400, description="Invalid file format")
+        if isinstance(size, bool) or not isinstance(size, int) or not 0 < size <= max_size:
+            abort(400, description=f"Size must be between 1 and {max_size} bytes")
+        if sha256 is not None and not (isinstance(sha256, str) and SHA256_HEX.fullmatch(sha256)):
+            abort(400, description="sha256 must be 64 hex characters")
+        status = chunked_uploads.start(filename, size, sha256)
+        status['chunk_size'] = current_app.config.get('CHUNKED_UPLOAD_CHUNK_SIZE', 8 * 1024 * 1024)
+        return status, 201
+
+class ChunkedUploadResource(Resource):
+    method_decorators = [login_required]
+
+    def get(self, upload_id):
+        try:
+            return chunked_uploads.status(upload_id)
+        except ChunkedUploadError as e:
+            return {'message': str(e), **e.extra}, e.status
+
+    def put(self, upload_id):
+        # Смещение из Content-Range: bytes <start>-<end>/<total> или ?offset=
+        content_range = request.headers.get('Content-Range', '')
+        if content_range.startswith('bytes ') and '-' in content_range:
+            offset = content_range[6:].split('-', 1)[0]
+        else:
+            offset = request.args.get('offset', '')
+        if not offset.isdigit():
+            abort(400, description="Chunk offset is required")
+        try:
+            received = chunked_uploads.append(upload_id, int(offset), request.stream)
+        except ChunkedUploadError as e:
+            return {'message': str(e), **e.extra}, e.status
+        return {'upload_id': upload_id, 'offset': received}
+
+    def delete(self, upload_id):
+        try:
+            chunked_uploads.cancel(upload_id)
+        except ChunkedUploadError as e:
+            return {'message': str(e), **e.extra}, e.status
+        return {'message': 'Upload cancelled'}, 200
+
+class ChunkedUploadCompleteResource(Resource):
+    method_decorators = [login_required]
+
+    def post(self, upload_id):
+        try:
+            return chunked_uploads.complete(upload_id)
+        except ChunkedUploadError as e:
+            return {'message': str(e), **e.extra}, e.status
+
 # Ресурс для загрузки изображения
 class ImageUploadResource(Resource):
+    method_decorators = [login_required]
+
     def post(self):
+        upload_id = upload_id_arg()
+        if upload_id:
+            try:
+                url, filename = chunked_uploads.commit(upload_id, IMAGE_EXTENSIONS)
+            except ChunkedUploadError as e:
+                return {'message': str(e), **e.extra}, e.status
+            image_pipeline.submit([url])
+            return {'message': 'Image uploaded successfully', 'filename': filename, 'url': url}, 201
+
         args = image_parser.parse_args()
         image_file = args['image']
 
         if not allowed_file(image_file.filename):
             abort(400, description="Invalid file format. Allowed formats: png, jpg, jpeg, gif")
+        try:
+            check_upload(image_file)
+        except ValidationError as e:
+            abort(400, description=str(e))
 
         filename = secure_filename(image_file.filename)
         upload_dir = os.path.join(current_app.config['UPLOAD_FOLDER'], 'images')
@@ -271,6 +386,7 @@ class ImageUploadResource(Resource):
         try:
             image_file.save(file_path)
             current_app.logger.info(f"Image saved at: {file_path}")
+            image_pipeline.submit([f'/Uploads/images/{filename}'])
         except Exception as e:
             current_app.logger.error(f"Failed to save image at {file_path}: {str(e)}")
             abort(500, description=f"Failed to save image: {str(e)}")
@@ -280,103 +396,89 @@ class ImageUploadResource(Resource):
 # Ресурс для скачивания изображения
 class ImageDownloadResource(Resource):
     def get(self, filename):
-        upload_dir = os.path.join(current_app.config['UPLOAD_FOLDER'], 'images')
-        file_path = os.path.join(upload_dir, filename)
-        if os.path.exists(file_path):
-            return send_file(file_path, as_attachment=True, download_name=filename, mimetype='image/jpeg')
-        abort(404, description="Image not found")
+        # MIME определяется по содержимому файла, а не жёстко 'image/jpeg'
+        return send_upload(f'images/{secure_filename(filename)}', as_attachment=True, download_name=filename)
 
 # Ресурс для загрузки PDF
 class ProjectPDFUploadResource(Resource):
+    method_decorators = [login_required]
+
     def post(self, project_id):
         project = Project.query.get_or_404(project_id)
-        args = pdf_parser.parse_args()
-        pdf_file = args['pdf']
-
-        if not pdf_file.filename.endswith('.pdf'):
-            abort(400, description="Invalid file format. Only PDF is allowed")
-
-        filename = secure_filename(pdf_file.filename)
-        pdf_dir = current_app.config['UPLOAD_FOLDER']
-        if not os.path.exists(pdf_dir):
-            os.makedirs(pdf_dir)
-            current_app.logger.info(f"Created directory: {pdf_dir}")
+        upload_id = upload_id_arg()
+        if upload_id:
+            try:
+                project.pdf_file, filename = chunked_uploads.commit(upload_id, {'pdf'})
+            except ChunkedUploadError as e:
+                return {'message': str(e), **e.extra}, e.status
+        else:
+            args = pdf_parser.parse_args()
+            pdf_file = args['pdf']
+            filename = secure_filename(pdf_file.filename)
+            try:
+                check_upload(pdf_file, {'pdf'})
+            except ValidationError as e:
+                abort(400, description=str(e))
+            try:
+                project.pdf_file = store_upload(pdf_file)
+            except OSError as e:
+                current_app.logger.error(f"Failed to save PDF {filename}: {str(e)}")
+                abort(500, description=f"Failed to save PDF: {str(e)}")
 
-        file_path = os.path.join(pdf_dir, filename)
-        try:
-            pdf_file.save(file_path)
-            current_app.logger.info(f"PDF saved at: {file_path}")
-        except Exception as e:
-            current_app.logger.error(f"Failed to save PDF at {file_path}: {str(e)}")
-            abort(500, description=f"Failed to save PDF: {str(e)}")
-
-        project.pdf_file = f'/static/uploads/{filename}'
         db.session.commit()
         current_app.logger.info(f"Updated project {project_id} with pdf_file: {project.pdf_file}")
+        # Страницы, размер и превью считаются в фоне и появляются в pdf_meta
+        image_pipeline.submit([project.pdf_file], (Project.__table__.name,))
         return {'message': 'PDF uploaded successfully', 'filename': filename, 'pdf_path': project.pdf_file}, 201
 
+def pdf_relative_path(pdf_file):
+    """Path under UPLOAD_FOLDER for /Uploads/... and legacy /static/uploads/<name> references."""
+    if not pdf_file:
+        return None
+    for prefix in (UPLOAD_URL_PREFIX, '/static/uploads/'):
+        if pdf_file.startswith(prefix):
+            return pdf_file[len(prefix):]
+    return None
+
 # Ресурс для скачивания PDF
 class ProjectPDFResource(Resource):
     def get(self, project_id):
         project = Project.query.get_or_404(project_id)
-        
-        if project.pdf_file and os.path.exists(os.path.join(current_app.config['UPLOAD_FOLDER'], project.pdf_file.lstrip('/static/uploads'))):
-            return send_file(os.path.join(current_app.config['UPLOAD_FOLDER'], project.pdf_file.lstrip('/static/uploads')),
-                            as_attachment=True,
-                            download_name=os.path.basename(project.pdf_file),
-                            mimetype='application/pdf')
-
-        pdf = FPDF()
-        pdf.add_page()
-        try:
-            pdf.add_font('DejaVu', '', 'app/static/fonts/DejaVuSans.ttf', uni=True)
-            pdf.set_font('DejaVu', size=12)
-        except Exception as e:
-            pdf.set_font('Arial', size=12)
-            current_app.logger.error(f"Failed to load DejaVu font: {e}")
-
-        pdf.cell(200, 10, txt=f"Project Details - ID: {project_id}", ln=True, align="C")
-        pdf.ln(10)
-
-        pdf.cell(200, 10, txt=f"Title (English): {project.title_en}", ln=True)
-        pdf.cell(200, 10, txt=f"Название (Русский): {project.title_ru}", ln=True)
-        pdf.cell(200, 10, txt=f"At (Türkmen): {project.title_tk}", ln=True)
-        pdf.ln(10)
 
-        pdf.multi_cell(0, 10, txt=f"Description (English): {project.description_en}", align='L')
-        pdf.multi_cell(0, 10, txt=f"Описание (Русский): {project.description_ru}", align='L')
-        pdf.multi_cell(0, 10, txt=f"Bellik (Türkmen): {project.description_tk}", align='L')
-        pdf.ln(10)
+        relative = pdf_relative_path(getattr(project, 'pdf_file', None))
+        if relative and os.path.isfile(os.path.join(current_app.config['UPLOAD_FOLDER'], relative)):
+            return send_upload(relative, mimetype='application/pdf', as_attachment=True,
+                               download_name=os.path.basename(relative))
 
-        pdf.cell(200, 10, txt="Categories:", ln=True)
-        for cat in project.categories:
-            pdf.cell(200, 10, txt=f"- {cat.name_en}", ln=True)
-        pdf.ln(10)
-
-        pdf.cell(200, 10, txt=f"Image URL: {project.background_image_url}", ln=True)
-
-        pdf_file = io.BytesIO()
-        pdf.output(pdf_file)
-        pdf_file.seek(0)
-
-        return send_file(pdf_file,
+        # Готовый PDF из кэша; пересобирается в фоне после изменений проектов и категорий
+        path = project_pdfs.get(project_id)
+        if path is None:
+            abort(404)
+        return send_file(path,
                         as_attachment=True,
                         download_name=f'project_{project_id}.pdf',
-                        mimetype='application/pdf')
+                        mimetype='application/pdf',
+                        conditional=True)
 
 # Регистрация ресурсов
 def init_api(app):
     from flask_restful import Api
     api_bp = Blueprint('api', __name__, url_prefix='/api')
     api = Api(api_bp)
-    app.register_blueprint(api_bp)
+    # Совпадающие GET-маршруты забирает main_bp (он зарегистрирован раньше),
+    # запись через ресурсы — только после входа
     api.add_resource(BannerResource, '/banners', '/banners/<int:banner_id>')
     api.add_resource(ProjectResource, '/projects', '/projects/<int:project_id>')
     api.add_resource(BlogResource, '/blog', '/blog/<int:blog_id>')
-    api.add_resource(ProjectPDFResource, '/project/<int:project_id>/download-pdf')
     api.add_resource(ImageUploadResource, '/upload-image')
     api.add_resource(ImageDownloadResource, '/download-image/<string:filename>')
+    api.add_resource(ProjectPDFResource, '/project/<int:project_id>/download-pdf')
     api.add_resource(ProjectPDFUploadResource, '/project/<int:project_id>/upload-pdf')
+    api.add_resource(ChunkedUploadStartResource, '/uploads')
+    api.add_resource(ChunkedUploadResource, '/uploads/<string:upload_id>')
+    api.add_resource(ChunkedUploadCompleteResource, '/uploads/<string:upload_id>/complete')
+    # Ресурсы добавляются до регистрации: flask_restful переносит их в приложение при register_blueprint
+    app.register_blueprint(api_bp)
 
 # Функция для проверки разрешенных расширений
 def allowed_file(filename):
@@ -1,5 +1,6 @@
 from app import db
-from flask_babel import get_locale
+from app.utils.localization import localized_fields, current_locale
+from app.utils.images import srcset
 
 class About(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -8,15 +9,18 @@ class About(db.Model):
     description_ru = db.Column(db.Text)
     description_en = db.Column(db.Text)
     # Связь с AboutItem
-    items = db.relationship('AboutItem', backref='about', lazy='dynamic')
+    items = db.relationship('AboutItem', backref='about')
 
-    def to_dict(self):
-        locale = str(get_locale()) or 'en'
+    __localized__ = ('title', 'description')
+
+    def to_dict(self, locale=None):
+        locale = locale or current_locale()
+        t = localized_fields(About, locale)
         return {
             'id': self.id,
-            'title': getattr(self, f'title_{locale}', self.title_en),
-            'description': getattr(self, f'description_{locale}', self.description_en),
-            'items': [item.to_dict() for item in self.items]
+            'title': t.title(self),
+            'description': t.description(self),
+            'items': [item.to_dict(locale) for item in self.items]
         }
 
 class AboutItem(db.Model):
@@ -38,19 +42,23 @@ class AboutItem(db.Model):
     # Категории для AboutItem (многие ко многим)
     categories = db.relationship('Category', secondary='aboutitem_category', backref='about_items')
 
-    def to_dict(self):
-        locale = str(get_locale()) or 'en'
+    __localized__ = ('title', 'description', 'button_text', 'deliverables')
+
+    def to_dict(self, locale=None):
+        locale = locale or current_locale()
+        t = localized_fields(AboutItem, locale)
         return {
             'id': self.id,
-            'title': getattr(self, f'title_{locale}', self.title_en),
-            'description': getattr(self, f'description_{locale}', self.description_en),
+            'title': t.title(self),
+            'description': t.description(self),
             'background_image_url': self.background_image_url,
-            'button_text': getattr(self, f'button_text_{locale}', self.button_text_en),
+            'background_image_srcset': srcset(self.background_image_url),
+            'button_text': t.button_text(self),
             'button_link': self.button_link,
-            'deliverables': getattr(self, f'deliverables_{locale}', self.deliverables_en),
+            'deliverables': t.deliverables(self),
             'color': self.color,
             'type': self.type,
-            'categories': [c.to_dict() for c in self.categories],
+            'categories': [c.to_dict(locale) for c in self.categories],
             'created_at': self.created_at.isoformat() if self.created_at else None
         }
 
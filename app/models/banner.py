@@ -1,6 +1,7 @@
 ﻿from app import db
 from datetime import datetime
-from flask_babel import get_locale
+from app.utils.localization import localized_fields
+from app.utils.images import image_meta, srcset
 
 class Banner(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -15,15 +16,21 @@ class Banner(db.Model):
     button_link = db.Column(db.String(255))
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
-    def to_dict(self):
-        locale = str(get_locale()) or 'en'
+    __localized__ = ('title', 'subtitle', 'button_text')
+
+    def to_dict(self, locale=None):
+        t = localized_fields(Banner, locale)
         return {
             'id': self.id,
-            'title': getattr(self, f'title_{locale}', self.title_en),
-            'subtitle': getattr(self, f'subtitle_{locale}', self.subtitle_en),
+            'title': t.title(self),
+            'subtitle': t.subtitle(self),
             'image_url': self.image_url,
+            'image_srcset': srcset(self.image_url),
+            'image_meta': image_meta(self.image_url),
             'logo_url': self.logo_url,
-            'button_text': getattr(self, f'button_text_{locale}', self.button_text_en),
+            'logo_srcset': srcset(self.logo_url),
+            'logo_meta': image_meta(self.logo_url),
+            'button_text': t.button_text(self),
             'button_link': self.button_link,
             'created_at': self.created_at.isoformat() if self.created_at else None
         }
\ No newline at end of file
@@ -1,7 +1,16 @@
 from app import db
 from datetime import datetime
-from sqlalchemy.types import PickleType
-from flask_babel import get_locale
+from app.utils.fieldsets import serialize
+from app.utils.images import image_meta, srcset
+
+# Теги блога по строке на тег, для ?tag= в SQL; заполняется app.utils.tags
+blog_tag = db.Table(
+    'blog_tag',
+    db.Column('blog_id', db.Integer, db.ForeignKey('blog.id', ondelete='CASCADE'), primary_key=True),
+    db.Column('tag_key', db.String(255), primary_key=True),
+    db.Column('tag', db.String(255), nullable=False),
+    db.Index('ix_blog_tag_tag_key', 'tag_key', 'blog_id'),
+)
 
 class Blog(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -10,30 +19,64 @@ class Blog(db.Model):
     description_ru = db.Column(db.Text)
     description_en = db.Column(db.Text)
     image_url = db.Column(db.String(255))
-    additional_images = db.Column(db.PickleType)
+    additional_images = db.Column(db.JSON(none_as_null=True))
     date = db.Column(db.Date)
     read_time = db.Column(db.String(50))
     link = db.Column(db.String(255))
     slug = db.Column(db.String(255), unique=True)
-    tags = db.Column(PickleType)
+    tags = db.Column(db.JSON(none_as_null=True))
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
-    def to_dict(self):
-        locale = str(get_locale()) or 'en'
-        return {
-            'id': self.id,
-            'title': getattr(self, f'title_{locale}', self.title_en),
-            'description': getattr(self, f'description_{locale}', self.description_en),
-            'image_url': self.image_url,
-            'additional_images': self.additional_images if isinstance(self.additional_images, list) else [],
-            'date': self.date.isoformat() if self.date else None,
-            'read_time': self.read_time or "3 min read",
-            'link': self.link or self.slug or "",
-            'slug': self.slug or "",
-            'tags': self.tags if isinstance(self.tags, list) else [],
-            'categories': [],
-            'created_at': self.created_at.isoformat() if self.created_at else None
-        }
+    __table_args__ = (
+        db.Index('ix_blog_created_at_id', 'created_at', 'id'),
+    )
+
+    __localized__ = ('title', 'description')
+
+    # to_dict field -> value; list endpoints serialize only the requested ones
+    __serializers__ = {
+        'id': lambda self, t, locale: self.id,
+        'title': lambda self, t, locale: t.title(self),
+        'description': lambda self, t, locale: t.description(self),
+        'image_url': lambda self, t, locale: self.image_url,
+        'image_srcset': lambda self, t, locale: srcset(self.image_url),
+        'image_meta': lambda self, t, locale: image_meta(self.image_url),
+        'additional_images': lambda self, t, locale: self.additional_images if isinstance(self.additional_images, list) else [],
+        'additional_images_srcset': lambda self, t, locale: [
+            srcset(url) for url in (self.additional_images if isinstance(self.additional_images, list) else [])
+        ],
+        'additional_images_meta': lambda self, t, locale: [
+            image_meta(url) for url in (self.additional_images if isinstance(self.additional_images, list) else [])
+        ],
+        'date': lambda self, t, locale: self.date.isoformat() if self.date else None,
+        'read_time': lambda self, t, locale: self.read_time or "3 min read",
+        'link': lambda self, t, locale: self.link or self.slug or "",
+        'slug': lambda self, t, locale: self.slug or "",
+        'tags': lambda self, t, locale: self.tags if isinstance(self.tags, list) else [],
+        'categories': lambda self, t, locale: [],
+        'created_at': lambda self, t, locale: self.created_at.isoformat() if self.created_at else None,
+    }
+    # Columns each field reads, for load_only() on list queries
+    __field_columns__ = {
+        'title': ('title_ru', 'title_en'),
+        'description': ('description_ru', 'description_en'),
+        'image_url': ('image_url',),
+        'image_srcset': ('image_url',),
+        'image_meta': ('image_url',),
+        'additional_images': ('additional_images',),
+        'additional_images_srcset': ('additional_images',),
+        'additional_images_meta': ('additional_images',),
+        'date': ('date',),
+        'read_time': ('read_time',),
+        'link': ('link', 'slug'),
+        'slug': ('slug',),
+        'tags': ('tags',),
+    }
+    # Blog cards skip the CKEditor HTML of description
+    __list_fields__ = ('id', 'title', 'image_url', 'image_srcset', 'image_meta', 'date', 'read_time', 'link', 'slug', 'tags', 'categories', 'created_at')
+
+    def to_dict(self, locale=None, fields=None):
+        return serialize(self, locale, fields)
 
 from sqlalchemy import event
 from app.utils.slugify import slugify
@@ -1,6 +1,6 @@
 from app import db
 from datetime import datetime
-from flask_babel import get_locale
+from app.utils.localization import localized_fields
 
 class Category(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -13,15 +13,17 @@ class Category(db.Model):
     description_en = db.Column(db.Text)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
-    def to_dict(self):
-        locale = str(get_locale()) or 'en'
+    __localized__ = ('title', 'description')
+
+    def to_dict(self, locale=None):
+        t = localized_fields(Category, locale)
         return {
             'id': self.id,
-            'title': getattr(self, f'title_{locale}', self.title_en),
+            'title': t.title(self),
             'slug': self.slug,
             'link': self.link,
             'bg_color': self.bg_color,
-            'description': getattr(self, f'description_{locale}', self.description_en),
+            'description': t.description(self),
             'created_at': self.created_at.isoformat() if self.created_at else None
         }
     def __str__(self):
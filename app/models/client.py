@@ -1,5 +1,6 @@
 ﻿from app import db
 from datetime import datetime
+from app.utils.images import image_meta, srcset
 
 class Client(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -12,7 +13,11 @@ class Client(db.Model):
         return {
             'id': self.id,
             'logo_url': self.logo_url,
+            'logo_srcset': srcset(self.logo_url),
+            'logo_meta': image_meta(self.logo_url),
             'default_logo': self.default_logo,
+            'default_logo_srcset': srcset(self.default_logo),
+            'default_logo_meta': image_meta(self.default_logo),
             'order': self.order,
             'created_at': self.created_at.isoformat() if self.created_at else None
         }
\ No newline at end of file
@@ -1,5 +1,5 @@
 from app import db
-from flask_babel import get_locale
+from app.utils.localization import localized_fields
 from datetime import datetime
 
 class Contact(db.Model):
@@ -12,12 +12,14 @@ class Contact(db.Model):
     social_media = db.Column(db.String(255))
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
-    def to_dict(self):
-        locale = str(get_locale()) or 'en'
+    __localized__ = ('address',)
+
+    def to_dict(self, locale=None):
+        t = localized_fields(Contact, locale)
         return {
             'id': self.id,
             'phone': self.phone,
-            'address': getattr(self, f'address_{locale}', self.address_en),
+            'address': t.address(self),
             'email': self.email,
             'social_media': self.social_media,
             'created_at': self.created_at.isoformat() if self.created_at else None
@@ -1,5 +1,6 @@
 from app import db
-from flask_babel import get_locale
+from app.utils.localization import localized_fields
+from app.utils.images import srcset
 
 class Partner(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -11,13 +12,16 @@ class Partner(db.Model):
     order = db.Column(db.Integer, default=0)
     created_at = db.Column(db.DateTime, server_default=db.func.now())
 
-    def to_dict(self):
-        locale = str(get_locale()) or 'en'
+    __localized__ = ('name', 'description')
+
+    def to_dict(self, locale=None):
+        t = localized_fields(Partner, locale)
         return {
             'id': self.id,
-            'name': getattr(self, f'name_{locale}', self.name_en),
+            'name': t.name(self),
             'logo_url': self.logo_url,
-            'description': getattr(self, f'description_{locale}', self.description_en),
+            'logo_srcset': srcset(self.logo_url),
+            'description': t.description(self),
             'order': self.order,
             'created_at': self.created_at.isoformat() if self.created_at else None
         }
\ No newline at end of file
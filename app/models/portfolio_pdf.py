@@ -1,13 +1,19 @@
 from app import db
 from datetime import datetime
+from app.utils.pdf_ingest import pdf_meta
 
 class PortfolioPDF(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     pdf_file = db.Column(db.String(255), nullable=False)
+    # Язык собранного портфолио; у загруженных вручную файлов пусто
+    locale = db.Column(db.String(5), index=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
     def to_dict(self):
         return {
             "id": self.id,
-            "pdf_file": self.pdf_file
-        }
\ No newline at end of file
+            "pdf_file": self.pdf_file,
+            "pdf_meta": pdf_meta(self.pdf_file),
+            "locale": self.locale,
+            "created_at": self.created_at.isoformat() if self.created_at else None
+        }
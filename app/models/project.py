@@ -1,6 +1,8 @@
 ﻿from app import db
 from datetime import datetime
-from flask_babel import get_locale
+from app.utils.fieldsets import serialize
+from app.utils.images import image_meta, srcset
+from app.utils.pdf_ingest import pdf_meta
 from sqlalchemy.orm import validates
 from sqlalchemy import CheckConstraint
 
@@ -10,6 +12,16 @@ project_category = db.Table(
     db.Column('category_id', db.Integer, db.ForeignKey('category.id'))
 )
 
+# Теги из tags_ru/tags_en по строке на тег, для ?tag= в SQL; заполняется app.utils.tags
+project_tag = db.Table(
+    'project_tag',
+    db.Column('project_id', db.Integer, db.ForeignKey('project.id', ondelete='CASCADE'), primary_key=True),
+    db.Column('locale', db.String(5), primary_key=True),
+    db.Column('tag_key', db.String(255), primary_key=True),
+    db.Column('tag', db.String(255), nullable=False),
+    db.Index('ix_project_tag_tag_key', 'tag_key', 'project_id'),
+)
+
 class Project(db.Model):
     __tablename__ = 'project'
 
@@ -20,10 +32,11 @@ class Project(db.Model):
     description_en = db.Column(db.Text)
     content_ru = db.Column(db.Text)
     content_en = db.Column(db.Text)
-    tags_ru = db.Column(db.PickleType)
-    tags_en = db.Column(db.PickleType)
+    tags_ru = db.Column(db.JSON(none_as_null=True))
+    tags_en = db.Column(db.JSON(none_as_null=True))
     main_image = db.Column(db.String(255))
-    images = db.Column(db.PickleType)
+    images = db.Column(db.JSON(none_as_null=True))
+    pdf_file = db.Column(db.String(255))
     bg_color = db.Column(db.String(32))
     type = db.Column(db.String(64), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
@@ -39,20 +52,51 @@ class Project(db.Model):
 
     __table_args__ = (
         CheckConstraint("type IN ('branding', 'others')", name='check_project_type'),
+        db.Index('ix_project_created_at_id', 'created_at', 'id'),
     )
 
-    def to_dict(self):
-        locale = str(get_locale()) or 'en'
-        return {
-            'id': self.id,
-            'title': getattr(self, f'title_{locale}', self.title_en),
-            'description': getattr(self, f'description_{locale}', self.description_en),
-            'content': getattr(self, f'content_{locale}', self.content_en),
-            "tags": (lambda t: t if isinstance(t, list) and t else ["Branding", "Design"])(getattr(self, f"tags_{locale}", None)),
-            'main_image': self.main_image,
-            'images': self.images or [],
-            'bg_color': self.bg_color,
-            'type': self.type,
-            'created_at': self.created_at.isoformat() if self.created_at else None,
-            'categories': [c.to_dict() for c in self.categories]
-        }
+    __localized__ = ('title', 'description', 'content')
+    __localized_optional__ = ('tags',)
+
+    # to_dict field -> value; list endpoints serialize only the requested ones
+    __serializers__ = {
+        'id': lambda self, t, locale: self.id,
+        'title': lambda self, t, locale: t.title(self),
+        'description': lambda self, t, locale: t.description(self),
+        'content': lambda self, t, locale: t.content(self),
+        'tags': lambda self, t, locale: (lambda tags: tags if isinstance(tags, list) and tags else ["Branding", "Design"])(t.tags(self)),
+        'main_image': lambda self, t, locale: self.main_image,
+        'main_image_srcset': lambda self, t, locale: srcset(self.main_image),
+        'main_image_meta': lambda self, t, locale: image_meta(self.main_image),
+        'images': lambda self, t, locale: self.images or [],
+        'images_srcset': lambda self, t, locale: [srcset(url) for url in self.images or []],
+        'images_meta': lambda self, t, locale: [image_meta(url) for url in self.images or []],
+        'pdf_file': lambda self, t, locale: self.pdf_file,
+        'pdf_meta': lambda self, t, locale: pdf_meta(self.pdf_file),
+        'bg_color': lambda self, t, locale: self.bg_color,
+        'type': lambda self, t, locale: self.type,
+        'created_at': lambda self, t, locale: self.created_at.isoformat() if self.created_at else None,
+        'categories': lambda self, t, locale: [c.to_dict(locale) for c in self.categories],
+    }
+    # Columns each field reads, for load_only() on list queries
+    __field_columns__ = {
+        'title': ('title_ru', 'title_en'),
+        'description': ('description_ru', 'description_en'),
+        'content': ('content_ru', 'content_en'),
+        'tags': ('tags_ru', 'tags_en'),
+        'main_image': ('main_image',),
+        'main_image_srcset': ('main_image',),
+        'main_image_meta': ('main_image',),
+        'images': ('images',),
+        'images_srcset': ('images',),
+        'images_meta': ('images',),
+        'pdf_file': ('pdf_file',),
+        'pdf_meta': ('pdf_file',),
+        'bg_color': ('bg_color',),
+        'type': ('type',),
+    }
+    # Project cards skip the CKEditor HTML of description/content
+    __list_fields__ = ('id', 'title', 'tags', 'main_image', 'main_image_srcset', 'main_image_meta', 'bg_color', 'type', 'created_at', 'categories')
+
+    def to_dict(self, locale=None, fields=None):
+        return serialize(self, locale, fields)
@@ -1,5 +1,5 @@
 from app import db
-from flask_babel import get_locale
+from app.utils.localization import localized_fields
 from datetime import datetime
 
 class Review(db.Model):
@@ -14,12 +14,14 @@ class Review(db.Model):
     project = db.relationship('Project', backref='reviews')
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
-    def to_dict(self):
-        locale = str(get_locale()) or 'en'
+    __localized__ = ('content', 'author')
+
+    def to_dict(self, locale=None):
+        t = localized_fields(Review, locale)
         return {
             'id': self.id,
-            'content': getattr(self, f'content_{locale}', self.content_en),
-            'author': getattr(self, f'author_{locale}', self.author_en),
+            'content': t.content(self),
+            'author': t.author(self),
             'project_id': self.project_id,
             'created_at': self.created_at.isoformat() if self.created_at else None
         }
\ No newline at end of file
@@ -1,6 +1,6 @@
 ﻿from app import db
 from datetime import datetime
-from flask_babel import get_locale
+from app.utils.localization import localized_fields, current_locale
 
 service_blog = db.Table(
     'service_blog',
@@ -24,13 +24,16 @@ class Service(db.Model):
     projects = db.relationship('Project', secondary=service_project, backref='services')
     blogs = db.relationship('Blog', secondary=service_blog, backref='services')
 
-    def to_dict(self):
-        locale = str(get_locale()) or 'en'
+    __localized__ = ('content',)
+
+    def to_dict(self, locale=None):
+        locale = locale or current_locale()
+        t = localized_fields(Service, locale)
         return {
             'id': self.id,
-            'content': getattr(self, f'content_{locale}', self.content_en),
-            'category': self.category.to_dict() if self.category else None,
-            'projects': [p.to_dict() for p in self.projects],
-            'blogs': [b.to_dict() for b in self.blogs],
+            'content': t.content(self),
+            'category': self.category.to_dict(locale) if self.category else None,
+            'projects': [p.to_dict(locale) for p in self.projects],
+            'blogs': [b.to_dict(locale) for b in self.blogs],
             'created_at': self.created_at.isoformat() if self.created_at else None
         }
@@ -0,0 +1,9 @@
+from app import db
+from datetime import datetime
+
+class UploadRef(db.Model):
+    """How many rows reference a file in Uploads/; kept by app.utils.upload_refs."""
+    path = db.Column(db.String(512), primary_key=True)
+    refs = db.Column(db.Integer, nullable=False, default=0)
+    # Когда счётчик последний раз менялся; от него отсчитывается срок до удаления файла
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
@@ -1,4 +1,4 @@
-﻿from flask import Blueprint, jsonify, render_template, request, redirect, url_for, flash, session, send_from_directory, current_app, abort
+﻿from flask import Blueprint, jsonify, render_template, request, redirect, url_for, flash, session, send_from_directory, send_file, current_app, abort
 from flask_login import login_user, logout_user, login_required
 from flask_babel import _
 from app.models.banner import Banner
@@ -19,6 +19,24 @@ from app.models.partner import Partner
 from app.models.portfolio_pdf import PortfolioPDF
 import os
 from flask_babel import get_locale
+from app.models.about import AboutItem, aboutitem_category
+from app.models.project import project_category
+from app.models.service import service_project, service_blog
+from app.utils.response_cache import cached_response
+from app.utils.query_budget import query_budget
+from app.utils.prefetch import project_plan, service_plan, about_plan
+from app.utils.bundle import homepage_bundle, BUNDLE_TABLES
+from app.utils.localization import current_locale
+from app.utils.pagination import keyset_paginate, next_page_cursor, count_cache
+from app.utils.fieldsets import parse_fields, fieldset_options
+from app.utils.search import search_index, relevance_order, with_highlight
+from app.utils.file_upload import IMMUTABLE_MAX_AGE, is_immutable_upload
+from app.utils.file_serving import send_upload, resolve_upload
+from app.utils.file_upload import detect_mimetype
+from app.utils.images import IMAGE_EXTENSIONS
+from PIL import Image
+from app.utils.image_cache import resized_images
+from app.utils.tags import tag_key, tagged
 
 main_bp = Blueprint('main', __name__)
 
@@ -27,23 +45,31 @@ def root_redirect():
     return redirect('/admin')
 
 @main_bp.route('/index')
+@cached_response(Banner)
+@query_budget(1)
 def index():
+    locale = current_locale()
     banners = Banner.query.all()
     return jsonify({
         'status': 'success',
         'message': _('Welcome to the Landing Page API'),
-        'banners': [banner.to_dict() for banner in banners]
+        'banners': [banner.to_dict(locale) for banner in banners]
     })
 
 @main_bp.route('/api/banners')
+@cached_response(Banner)
+@query_budget(1)
 def get_banners():
+    locale = current_locale()
     banners = Banner.query.all()
     return jsonify({
         'status': 'success',
-        'data': [banner.to_dict() for banner in banners]
+        'data': [banner.to_dict(locale) for banner in banners]
     })
 
 @main_bp.route('/api/clients')
+@cached_response(Client)
+@query_budget(1)
 def get_clients():
     clients = Client.query.order_by(Client.order.asc(), Client.id.asc()).all()
     return jsonify({
@@ -51,20 +77,32 @@ def get_clients():
         'data': [client.to_dict() for client in clients]
     })
 @main_bp.route('/api/categories')
+@cached_response(Category)
+@query_budget(1)
 def get_categories():
+    locale = current_locale()
     categories = Category.query.all()
     return jsonify({
         'status': 'success',
-        'data': [category.to_dict() for category in categories]
+        'data': [category.to_dict(locale) for category in categories]
     })
 
 @main_bp.route('/api/services', methods=['GET', 'POST'])
+@cached_response(Service, Category, Project, Blog, project_category, service_project, service_blog,
+                 args=('search',))
+@query_budget(5)
 def services():
     if request.method == 'GET':
-        services = Service.query.all()
+        locale = current_locale()
+        search = request.args.get('search', '').strip()
+        query = Service.query.options(*service_plan())
+        hits = search_index.search(search, 'service') if search else None
+        if hits is not None:
+            query = query.filter(Service.id.in_(list(hits))).order_by(relevance_order(Service.id, hits))
+        services = query.all()
         return jsonify({
             'status': 'success',
-            'data': [service.to_dict() for service in services]
+            'data': [with_highlight(service.to_dict(locale), hits) for service in services]
         })
     elif request.method == 'POST':
         data = request.get_json()
@@ -92,21 +130,78 @@ def services():
 
         return jsonify({'status': 'success', 'data': service.to_dict()}), 201
 @main_bp.route('/api/partners')
+@cached_response(Partner)
+@query_budget(1)
 def get_partners():
+    locale = current_locale()
     partners = Partner.query.order_by(Partner.order.asc(), Partner.id.asc()).all()
-    return jsonify({'status': 'success', 'data': [p.to_dict() for p in partners]})
+    return jsonify({'status': 'success', 'data': [p.to_dict(locale) for p in partners]})
+
+@main_bp.route('/api/bundle')
+@cached_response(*BUNDLE_TABLES)
+def get_bundle():
+    # Все секции главной страницы одним ответом, заранее собранные для каждого языка
+    return current_app.response_class(homepage_bundle.get(current_locale()), mimetype='application/json')
+
+@main_bp.route('/api/search')
+@cached_response(Project, Blog, Service, Category, args=('q', 'type', 'limit'))
+@query_budget(1)
+def site_search():
+    q = request.args.get('q', '').strip()
+    kind = request.args.get('type')
+    limit = min(max(request.args.get('limit', 20, type=int), 1), 50)
+    if kind is not None and kind not in ('project', 'blog', 'service'):
+        return jsonify({'status': 'error', 'message': 'Unknown type'}), 400
+    hits = search_index.search(q, kind, limit) if q else {}
+    if hits is None:
+        return jsonify({'status': 'error', 'message': 'Search is not available'}), 503
+    return jsonify({'status': 'success', 'data': list(hits.values())})
 
 @main_bp.route('/api/portfolio_pdf')
+@cached_response(PortfolioPDF, args=('locale',))
+@query_budget(1)
 def get_portfolio():
-    pdfs = PortfolioPDF.query.all()
+    query = PortfolioPDF.query
+    # ?locale=ru — только собранное портфолио на этом языке
+    locale = request.args.get('locale')
+    if locale:
+        query = query.filter_by(locale=locale)
+    pdfs = query.order_by(PortfolioPDF.id).all()
     return jsonify({'status': 'success', 'data': [p.to_dict() for p in pdfs]})
 
 @main_bp.route('/Uploads/<path:filename>')
 def uploaded_file(filename):
-    return send_from_directory(
-        current_app.config['UPLOAD_FOLDER'],
-        filename
+    # Файлы с адресом по содержимому не меняются — кэшируются на год
+    immutable = is_immutable_upload(filename)
+    return send_upload(filename, max_age=IMMUTABLE_MAX_AGE if immutable else None, immutable=immutable)
+
+@main_bp.route('/img/<size>/<path:filename>')
+def resized_image(size, filename):
+    # Только размеры из белого списка, иначе кэш можно забить произвольными вариантами
+    if size not in current_app.config['IMAGE_RESIZE_SIZES']:
+        abort(404)
+    if filename.rsplit('.', 1)[-1].lower() not in IMAGE_EXTENSIONS:
+        abort(404)
+    source = resolve_upload(filename)
+    width, height = (int(v) for v in size.split('x'))
+    # Только явный image/webp: */* от старых браузеров не значит, что WebP они покажут
+    fmt = 'webp' if 'image/webp' in request.accept_mimetypes.values() else None
+    try:
+        path = resized_images.get(source, width, height, fmt)
+    except Image.DecompressionBombError:
+        abort(413)
+    except OSError:
+        abort(404)
+    immutable = is_immutable_upload(filename)
+    response = send_file(
+        path, mimetype=detect_mimetype(path), conditional=True,
+        max_age=IMMUTABLE_MAX_AGE if immutable else None
     )
+    if immutable:
+        response.cache_control.public = True
+        response.cache_control.immutable = True
+    response.vary.add('Accept')
+    return response
 
 @main_bp.route('/api/contact-request', methods=['POST'])
 def submit_contact_request():
@@ -124,14 +219,19 @@ def submit_contact_request():
     return jsonify({'status': 'success', 'data': contact.to_dict()}), 201
 
 @main_bp.route('/api/reviews')
+@cached_response(Review)
+@query_budget(1)
 def get_reviews():
+    locale = current_locale()
     reviews = Review.query.all()
     return jsonify({
         'status': 'success',
-        'data': [review.to_dict() for review in reviews]
+        'data': [review.to_dict(locale) for review in reviews]
     })
 
 @main_bp.route('/api/contact')
+@cached_response(Contact)
+@query_budget(1)
 def get_contact():
     contact = Contact.query.first()
     if not contact:
@@ -143,8 +243,10 @@ def get_contact():
 
 
 @main_bp.route('/api/about')
+@cached_response(About, AboutItem, Category, aboutitem_category)
+@query_budget(3)
 def get_about():
-    about = About.query.first()
+    about = About.query.options(*about_plan()).first()
     if not about:
         return jsonify({'status': 'error', 'message': _('No about information found')}), 404
     return jsonify({
@@ -173,20 +275,81 @@ def logout():
 
 # --- API блогов ---
 
+def _page_highlights(matches, search, kind, items):
+    # Подсветка только для строк текущей страницы
+    if matches is None or not items:
+        return None
+    return search_index.search(search, kind, limit=len(items), ids=[item.id for item in items])
+
+
+def _keyset_response(query, model, cursor, per_page, count_key, locale, fields, *count_sources, highlight=None):
+    per_page = max(per_page, 1)
+    try:
+        page = keyset_paginate(query, model, per_page, cursor)
+    except ValueError:
+        return jsonify({'status': 'error', 'message': 'Invalid cursor'}), 400
+
+    hits = _page_highlights(*highlight, page.items) if highlight else None
+    body = {
+        'status': 'success',
+        'per_page': per_page,
+        'next_cursor': page.next_cursor,
+        'prev_cursor': page.prev_cursor,
+        'has_next': page.has_next,
+        'has_prev': page.has_prev,
+        'data': [with_highlight(item.to_dict(locale, fields), hits) for item in page.items]
+    }
+    # COUNT(*) только по запросу, результат кэшируется для набора фильтров
+    if request.args.get('with_total', type=int):
+        body['total'] = count_cache.count(count_key, query, *count_sources)
+    return jsonify(body)
+
 @main_bp.route('/api/blog/', methods=['GET'])
+@cached_response(Blog, args=('page', 'per_page', 'search', 'tag', 'cursor', 'fields', 'with_total'))
+@query_budget(3)
 def blogs_list():
     page = request.args.get('page', 1, type=int)
     per_page = request.args.get('per_page', 10, type=int)
     search = request.args.get('search', '').strip()
-
-    query = Blog.query
+    tag = request.args.get('tag', '').strip()
+    cursor = request.args.get('cursor')
+    locale = current_locale()
+    try:
+        fields = parse_fields(request.args.get('fields'), Blog, Blog.__list_fields__)
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+
+    query = Blog.query.options(*fieldset_options(Blog, fields))
+    matches = None
     if search:
-        query = query.filter(
-            (Blog.title_ru.ilike(f'%{search}%')) |
-            (Blog.title_en.ilike(f'%{search}%'))
-        )
-    pagination = query.order_by(Blog.created_at.desc()).paginate(page=page, per_page=per_page, error_out=False)
+        matches = search_index.matches(search, 'blog')
+        if matches is None:
+            query = query.filter(
+                (Blog.title_ru.ilike(f'%{search}%')) |
+                (Blog.title_en.ilike(f'%{search}%'))
+            )
+        else:
+            # Все совпадения в SQL: страницы и total не упираются в лимит выдачи поиска
+            query = query.join(matches, matches.c.ref_id == Blog.id)
+    if tag:
+        query = query.filter(tagged(Blog, tag))
+    count_key = ('blogs', search, tag_key(tag))
+
+    if cursor:
+        return _keyset_response(query, Blog, cursor, per_page, count_key, locale, fields, Blog,
+                                highlight=(matches, search, 'blog'))
+
+    # Результаты поиска идут по релевантности, остальное — от новых к старым
+    if matches is not None:
+        order = (matches.c.rank, Blog.id.desc())
+    else:
+        order = (Blog.created_at.desc().nulls_last(), Blog.id.desc())
+    pagination = query.order_by(*order).paginate(
+        page=page, per_page=per_page, error_out=False, count=False
+    )
+    pagination.total = count_cache.count(count_key, query, Blog)
     blogs = pagination.items
+    hits = _page_highlights(matches, search, 'blog', blogs)
 
     return jsonify({
         'status': 'success',
@@ -194,25 +357,41 @@ def blogs_list():
         'per_page': per_page,
         'total': pagination.total,
         'pages': pagination.pages,
-        'data': [blog.to_dict() for blog in blogs]
+        'next_cursor': None if matches is not None else next_page_cursor(pagination),
+        'data': [with_highlight(blog.to_dict(locale, fields), hits) for blog in blogs]
     })
 
 @main_bp.route('/api/blog/<int:id>', methods=['GET'])
+@cached_response(Blog)
+@query_budget(1)
 def blog_detail(id):
     blog = Blog.query.get_or_404(id)
     return jsonify({'status': 'success', 'data': blog.to_dict()})
 
 # --- API проектов и работ (объединены) ---
 @main_bp.route('/api/projects', methods=['GET'])
+@cached_response(Project, Category, project_category,
+                 args=('page', 'per_page', 'search', 'tag', 'id', 'category', 'cursor', 'fields', 'with_total'))
+@query_budget(4)
 def projects_works_list():
     page = request.args.get('page', 1, type=int)
     per_page = request.args.get('per_page', 10, type=int)
     search = request.args.get('search', '').strip()
+    tag = request.args.get('tag', '').strip()
     project_id = request.args.get('id', type=int)
 
     category_id = request.args.get('category', type=int)
-
-    query = Project.query
+    cursor = request.args.get('cursor')
+    locale = current_locale()
+    try:
+        # Запрос по id отдаёт проект целиком, как раньше
+        fields = parse_fields(request.args.get('fields'), Project, None if project_id else Project.__list_fields__)
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+
+    query = Project.query.options(*fieldset_options(Project, fields))
+    if fields is None or 'categories' in fields:
+        query = query.options(*project_plan())
 
     if project_id:
         query = query.filter(Project.id == project_id)
@@ -220,14 +399,38 @@ def projects_works_list():
     if category_id:
         query = query.filter(Project.categories.any(Category.id == category_id))
 
+    matches = None
     if search:
-        query = query.filter(
-            (Project.title_ru.ilike(f'%{search}%')) |
-            (Project.title_en.ilike(f'%{search}%'))
-        )
+        matches = search_index.matches(search, 'project')
+        if matches is None:
+            query = query.filter(
+                (Project.title_ru.ilike(f'%{search}%')) |
+                (Project.title_en.ilike(f'%{search}%'))
+            )
+        else:
+            query = query.join(matches, matches.c.ref_id == Project.id)
+
+    if tag:
+        # Индекс project_tag вместо разбора списков в Python
+        query = query.filter(tagged(Project, tag))
 
-    pagination = query.order_by(Project.created_at.desc()).paginate(page=page, per_page=per_page, error_out=False)
+    count_key = ('projects', project_id, category_id, search, tag_key(tag))
+
+    if cursor:
+        return _keyset_response(query, Project, cursor, per_page, count_key, locale, fields,
+                                Project, project_category, Category, highlight=(matches, search, 'project'))
+
+    if matches is not None:
+        order = (matches.c.rank, Project.id.desc())
+    else:
+        order = (Project.created_at.desc().nulls_last(), Project.id.desc())
+    pagination = query.order_by(*order).paginate(
+        page=page, per_page=per_page, error_out=False, count=False
+    )
+    # Category: названия категорий входят в поисковый документ проекта
+    pagination.total = count_cache.count(count_key, query, Project, project_category, Category)
     items = pagination.items
+    hits = _page_highlights(matches, search, 'project', items)
 
     return jsonify({
         'status': 'success',
@@ -235,9 +438,12 @@ def projects_works_list():
         'per_page': per_page,
         'total': pagination.total,
         'pages': pagination.pages,
-        'data': [item.to_dict() for item in items]
+        'next_cursor': None if matches is not None else next_page_cursor(pagination),
+        'data': [with_highlight(item.to_dict(locale, fields), hits) for item in items]
     })
 @main_bp.route('/api/projects/<int:id>', methods=['GET'])
+@cached_response(Project, Category, project_category)
+@query_budget(2)
 def project_work_detail(id):
-    item = Project.query.get_or_404(id)
+    item = Project.query.options(*project_plan()).get_or_404(id)
     return jsonify({'status': 'success', 'data': item.to_dict()})
@@ -0,0 +1,139 @@
+import glob
+import hashlib
+import os
+import threading
+from flask_babel import force_locale
+from app import LANGUAGES
+from app.models.about import About, AboutItem, aboutitem_category
+from app.models.banner import Banner
+from app.models.blog import Blog
+from app.models.category import Category
+from app.models.client import Client
+from app.models.contact import Contact
+from app.models.partner import Partner
+from app.models.project import Project, project_category
+from app.models.review import Review
+from app.models.service import Service, service_blog, service_project
+from app.utils.atomic import atomic_write
+from app.utils.content_versions import content_versions, table_names
+from app.utils.prefetch import about_plan, service_plan
+
+BUNDLE_TABLES = table_names(
+    Banner, Client, Partner, Category, Service, Project, Blog, Review, About, AboutItem, Contact,
+    project_category, service_project, service_blog, aboutitem_category,
+)
+
+
+def _load_rows():
+    # Same queries and ordering as the individual endpoints in app/routes/main.py
+    return {
+        'banners': Banner.query.all(),
+        'clients': Client.query.order_by(Client.order.asc(), Client.id.asc()).all(),
+        'partners': Partner.query.order_by(Partner.order.asc(), Partner.id.asc()).all(),
+        'categories': Category.query.all(),
+        'services': Service.query.options(*service_plan()).all(),
+        'reviews': Review.query.all(),
+        'about': About.query.options(*about_plan()).first(),
+        'contact': Contact.query.first(),
+    }
+
+
+def _serialize(rows, locale):
+    data = {}
+    for section, value in rows.items():
+        if section == 'clients':
+            data[section] = [row.to_dict() for row in value]
+        elif isinstance(value, list):
+            data[section] = [row.to_dict(locale) for row in value]
+        else:
+            data[section] = value.to_dict(locale) if value else None
+    return data
+
+
+def _tag(stamp):
+    return hashlib.sha1(repr(stamp).encode('utf-8')).hexdigest()[:16]
+
+
+class HomepageBundle:
+    """Landing page sections in one payload, prebuilt for every locale.
+
+    The worker that commits a content change rebuilds all locales in a
+    background thread once its commits settle (BUNDLE_BUILD_DELAY) and
+    stores them under BUNDLE_FOLDER, so other workers only have to read the
+    file for the new version.
+    """
+
+    def __init__(self):
+        self.app = None
+        self.folder = None
+        self._built = {}  # locale -> (tag, bytes)
+        self._lock = threading.Lock()
+        self._timer = None
+        self._timer_lock = threading.Lock()
+
+    def init_app(self, app):
+        self.app = app
+        self.folder = app.config.setdefault('BUNDLE_FOLDER', os.path.join(app.instance_path, 'bundle'))
+        app.config.setdefault('BUNDLE_BUILD_DELAY', 1.0)
+        os.makedirs(self.folder, exist_ok=True)
+        content_versions.subscribe(self._on_change)
+
+    def _path(self, locale, tag):
+        return os.path.join(self.folder, f'{locale}.{tag}.json')
+
+    def _on_change(self, tables):
+        if not tables & BUNDLE_TABLES:
+            return
+        # Серия сохранений в админке — одна пересборка после паузы
+        with self._timer_lock:
+            if self._timer is not None:
+                self._timer.cancel()
+            self._timer = threading.Timer(self.app.config['BUNDLE_BUILD_DELAY'], self._build_in_background)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _build_in_background(self):
+        with self.app.app_context():
+            try:
+                self.build()
+            except Exception as e:
+                self.app.logger.error(f"Failed to prebuild homepage bundle: {str(e)}")
+
+    def build(self):
+        with self._lock:
+            tag = _tag(content_versions.stamp(BUNDLE_TABLES))
+            if all(self._built.get(locale, (None,))[0] == tag for locale in LANGUAGES):
+                return tag
+
+            rows = _load_rows()
+            for locale in LANGUAGES:
+                with force_locale(locale):
+                    body = self.app.json.dumps({'status': 'success', 'data': _serialize(rows, locale)}).encode('utf-8')
+                atomic_write(self._path(locale, tag), body)
+                self._built[locale] = (tag, body)
+
+            for path in glob.glob(os.path.join(self.folder, '*.json')):
+                if not path.endswith(f'.{tag}.json'):
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass
+            return tag
+
+    def get(self, locale):
+        """Serialized bundle for ``locale`` at the current content version."""
+        tag = _tag(content_versions.stamp(BUNDLE_TABLES))
+        built = self._built.get(locale)
+        if built and built[0] == tag:
+            return built[1]
+        try:
+            with open(self._path(locale, tag), 'rb') as f:
+                body = f.read()
+        except FileNotFoundError:
+            self.build()
+            return self._built[locale][1]
+        self._built[locale] = (tag, body)
+        return body
+
+
+homepage_bundle = HomepageBundle()
@@ -0,0 +1,199 @@
+import fcntl
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+import uuid
+from flask import current_app
+from app.utils.atomic import atomic_write
+from wtforms import ValidationError
+from app.utils.file_upload import CHUNK_SIZE, check_content, commit_upload, upload_extension
+
+_UPLOAD_ID = re.compile(r'^[0-9a-f]{32}$')
+
+
+class ChunkedUploadError(Exception):
+    def __init__(self, message, status=400, **extra):
+        super().__init__(message)
+        self.status = status
+        self.extra = extra
+
+
+class ChunkedUploads:
+    """Resumable uploads: init, PUT chunks in order, complete, then commit.
+
+    Chunks are appended to a spool file under Uploads/.incoming/chunked and
+    hashed as they stream in. The spool file size is the resume offset, so
+    a dropped connection keeps every byte that reached the disk. Any worker
+    can take the next chunk: the SHA-256 state is kept per process and
+    rebuilt from the spool file when another worker wrote the previous one.
+    """
+
+    def __init__(self):
+        self._hashes = {}  # upload_id -> (offset, sha256 object)
+        self._lock = threading.Lock()
+
+    def _dir(self):
+        path = os.path.join(current_app.config['UPLOAD_FOLDER'], '.incoming', 'chunked')
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def _paths(self, upload_id):
+        if not _UPLOAD_ID.match(upload_id or ''):
+            raise ChunkedUploadError('Upload not found', 404)
+        directory = self._dir()
+        return os.path.join(directory, f'{upload_id}.json'), os.path.join(directory, f'{upload_id}.part')
+
+    def _meta(self, upload_id):
+        meta_path, part_path = self._paths(upload_id)
+        try:
+            with open(meta_path, encoding='utf-8') as f:
+                return json.load(f), meta_path, part_path
+        except (OSError, ValueError):
+            raise ChunkedUploadError('Upload not found', 404)
+
+    def _digest(self, upload_id, f, offset):
+        with self._lock:
+            cached = self._hashes.get(upload_id)
+        if cached and cached[0] == offset:
+            return cached[1]
+        # The previous chunk went to another worker: rehash what is on disk
+        digest = hashlib.sha256()
+        f.seek(0)
+        remaining = offset
+        while remaining:
+            chunk = f.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            digest.update(chunk)
+            remaining -= len(chunk)
+        return digest
+
+    def _remember(self, upload_id, offset, digest):
+        with self._lock:
+            self._hashes[upload_id] = (offset, digest)
+
+    def _forget(self, upload_id):
+        with self._lock:
+            self._hashes.pop(upload_id, None)
+
+    def expire(self):
+        """Remove sessions untouched for CHUNKED_UPLOAD_TTL seconds."""
+        deadline = time.time() - current_app.config.get('CHUNKED_UPLOAD_TTL', 24 * 3600)
+        directory = self._dir()
+        for name in os.listdir(directory):
+            path = os.path.join(directory, name)
+            try:
+                if os.path.getmtime(path) < deadline:
+                    os.remove(path)
+                    self._forget(name.split('.', 1)[0])
+            except OSError:
+                continue
+
+    def start(self, filename, size, sha256=None):
+        self.expire()
+        upload_id = uuid.uuid4().hex
+        meta_path, part_path = self._paths(upload_id)
+        meta = {
+            'upload_id': upload_id,
+            'filename': filename,
+            'size': size,
+            'expected_sha256': sha256.lower() if sha256 else None,
+            'sha256': None,
+            'created_at': time.time(),
+        }
+        open(part_path, 'wb').close()
+        atomic_write(meta_path, json.dumps(meta).encode('utf-8'))
+        return self.status(upload_id)
+
+    def status(self, upload_id):
+        meta, _, part_path = self._meta(upload_id)
+        try:
+            offset = os.path.getsize(part_path)
+        except OSError:
+            offset = 0
+        return {
+            'upload_id': upload_id,
+            'filename': meta['filename'],
+            'size': meta['size'],
+            'offset': offset,
+            'complete': bool(meta['sha256']),
+            'sha256': meta['sha256'],
+        }
+
+    def append(self, upload_id, offset, stream):
+        """Write ``stream`` at ``offset``, which must equal the bytes received so far."""
+        meta, _, part_path = self._meta(upload_id)
+        if meta['sha256']:
+            raise ChunkedUploadError('Upload is already complete', 409)
+        with open(part_path, 'r+b') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            current = os.fstat(f.fileno()).st_size
+            if offset != current:
+                raise ChunkedUploadError(f'Expected offset {current}', 409, offset=current)
+            digest = self._digest(upload_id, f, current)
+            f.seek(current)
+            try:
+                for chunk in iter(lambda: stream.read(CHUNK_SIZE), b''):
+                    if current + len(chunk) > meta['size']:
+                        raise ChunkedUploadError('Chunk exceeds the declared size', 413, offset=current)
+                    f.write(chunk)
+                    digest.update(chunk)
+                    current += len(chunk)
+            finally:
+                # Bytes written before a disconnect stay valid for the resume
+                f.flush()
+                f.truncate(current)
+                self._remember(upload_id, current, digest)
+        os.utime(part_path)
+        return current
+
+    def complete(self, upload_id):
+        meta, meta_path, part_path = self._meta(upload_id)
+        if meta['sha256']:
+            return self.status(upload_id)
+        with open(part_path, 'rb') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            size = os.fstat(f.fileno()).st_size
+            if size != meta['size']:
+                raise ChunkedUploadError(f"Received {size} of {meta['size']} bytes", 409, offset=size)
+            sha256 = self._digest(upload_id, f, size).hexdigest()
+        if meta['expected_sha256'] and meta['expected_sha256'] != sha256:
+            self.cancel(upload_id)
+            raise ChunkedUploadError('Checksum mismatch', 422)
+        meta['sha256'] = sha256
+        atomic_write(meta_path, json.dumps(meta).encode('utf-8'))
+        self._forget(upload_id)
+        return self.status(upload_id)
+
+    def commit(self, upload_id, allowed_extensions=None):
+        """Move a completed upload into content-addressed storage; returns (url, filename)."""
+        meta, meta_path, part_path = self._meta(upload_id)
+        if not meta['sha256']:
+            raise ChunkedUploadError('Upload is not complete', 409)
+        ext = upload_extension(meta['filename'])
+        if allowed_extensions and ext not in allowed_extensions:
+            raise ChunkedUploadError(f'File extension .{ext} is not allowed', 400)
+        # Как и для multipart: содержимое должно совпадать с расширением
+        with open(part_path, 'rb') as f:
+            head = f.read(16)
+        try:
+            check_content(head, ext)
+        except ValidationError as e:
+            self.cancel(upload_id)
+            raise ChunkedUploadError(str(e), 400)
+        url = commit_upload(part_path, meta['sha256'], ext)
+        os.remove(meta_path)
+        return url, meta['filename']
+
+    def cancel(self, upload_id):
+        meta_path, part_path = self._paths(upload_id)
+        for path in (meta_path, part_path):
+            if os.path.exists(path):
+                os.remove(path)
+        self._forget(upload_id)
+
+
+chunked_uploads = ChunkedUploads()
@@ -0,0 +1,118 @@
+import os
+import time
+import tempfile
+from sqlalchemy import event, inspect
+
+
+def table_names(*sources):
+    """Normalize models, Table objects and plain names into a set of table names."""
+    names = set()
+    for source in sources:
+        if isinstance(source, str):
+            names.add(source)
+        elif hasattr(source, '__table__'):
+            names.add(source.__table__.name)
+        else:
+            names.add(source.name)
+    return frozenset(names)
+
+
+def _object_tables(obj, deleted=False):
+    state = inspect(obj)
+    names = {table.name for table in state.mapper.tables}
+    for rel in state.mapper.relationships:
+        if rel.secondary is None:
+            continue
+        if deleted or state.attrs[rel.key].history.has_changes():
+            names.add(rel.secondary.name)
+    return names
+
+
+class ContentVersions:
+    """Per-table content versions shared between all worker processes.
+
+    Each table has a stamp file whose mtime (in ns) is its version. Committed
+    writes touch the stamp files of the tables they changed, so a cache in
+    any gunicorn worker sees the new version on its next read.
+    """
+
+    _session_key = 'content_versions.touched'
+
+    def __init__(self, app=None, db=None):
+        self.directory = None
+        self._listeners = []
+        if app is not None:
+            self.init_app(app, db)
+
+    def init_app(self, app, db):
+        directory = app.config.setdefault(
+            'CONTENT_VERSION_FOLDER', os.path.join(app.instance_path, 'versions')
+        )
+        try:
+            os.makedirs(directory, exist_ok=True)
+        except OSError as e:
+            app.logger.error(f"Не удалось создать папку версий {directory}: {str(e)}")
+            directory = os.path.join(tempfile.gettempdir(), 'tagma-versions')
+            app.logger.warning(f"Переключение на временную папку: {directory}")
+            os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+
+        event.listen(db.session, 'after_flush', self._after_flush)
+        event.listen(db.session, 'do_orm_execute', self._on_orm_execute)
+        event.listen(db.session, 'after_commit', self._after_commit)
+        event.listen(db.session, 'after_rollback', self._after_rollback)
+
+    def subscribe(self, callback):
+        """Call ``callback(tables)`` in this process after every commit that changed content."""
+        self._listeners.append(callback)
+        return callback
+
+    def version(self, table):
+        try:
+            return os.stat(os.path.join(self.directory, table)).st_mtime_ns
+        except (OSError, TypeError):
+            return 0
+
+    def stamp(self, tables):
+        return tuple(self.version(name) for name in sorted(tables))
+
+    def bump(self, tables):
+        now = time.time_ns()
+        for name in tables:
+            path = os.path.join(self.directory, name)
+            try:
+                with open(path, 'a'):
+                    pass
+                os.utime(path, ns=(now, now))
+            except OSError:
+                continue
+        for callback in self._listeners:
+            callback(frozenset(tables))
+
+    def _touch(self, session, tables):
+        session.info.setdefault(self._session_key, set()).update(tables)
+
+    def _after_flush(self, session, flush_context):
+        tables = set()
+        for obj in session.new | session.dirty:
+            tables |= _object_tables(obj)
+        for obj in session.deleted:
+            tables |= _object_tables(obj, deleted=True)
+        if tables:
+            self._touch(session, tables)
+
+    def _on_orm_execute(self, orm_execute_state):
+        # Bulk query.delete()/update() bypass the flush, e.g. action_delete in the admin
+        if (orm_execute_state.is_delete or orm_execute_state.is_update) and orm_execute_state.bind_mapper is not None:
+            self._touch(orm_execute_state.session, {t.name for t in orm_execute_state.bind_mapper.tables})
+
+    def _after_commit(self, session):
+        tables = session.info.pop(self._session_key, None)
+        if tables:
+            self.bump(tables)
+
+    def _after_rollback(self, session):
+        session.info.pop(self._session_key, None)
+
+
+content_versions = ContentVersions()
@@ -0,0 +1,39 @@
+from sqlalchemy.orm import load_only
+from app.utils.localization import current_locale, localized_fields
+
+
+def parse_fields(raw, model, default=None):
+    """Resolve a ``?fields=a,b`` value into to_dict field names.
+
+    Returns ``default`` when the parameter is absent and None (every field)
+    for ``fields=all``. Raises ValueError on unknown field names.
+    """
+    if raw is None or not raw.strip():
+        return default
+    names = [name.strip() for name in raw.split(',') if name.strip()]
+    if names == ['all']:
+        return None
+    unknown = set(names) - set(model.__serializers__)
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(sorted(unknown))}")
+    return tuple(dict.fromkeys(['id'] + names))
+
+
+def fieldset_options(model, fields):
+    """load_only() for the columns ``fields`` read; other columns stay deferred."""
+    if fields is None:
+        return ()
+    # id/created_at are always needed for ordering and cursors
+    columns = {'id', 'created_at'}
+    for name in fields:
+        columns.update(model.__field_columns__.get(name, ()))
+    return (load_only(*(getattr(model, column) for column in sorted(columns))),)
+
+
+def serialize(obj, locale=None, fields=None):
+    """to_dict() of a model with ``__serializers__``, each called as ``(obj, t, locale)``."""
+    model = type(obj)
+    locale = locale or current_locale()
+    t = localized_fields(model, locale)
+    serializers = model.__serializers__
+    return {name: serializers[name](obj, t, locale) for name in (fields or serializers)}
@@ -0,0 +1,69 @@
+import os
+from urllib.parse import quote
+from flask import abort, current_app, request, send_file
+from werkzeug.security import safe_join
+from app.utils.file_upload import detect_mimetype
+from app.utils.hot_assets import hot_assets
+
+
+def resolve_upload(relative):
+    """Absolute path of a servable file under UPLOAD_FOLDER, or 404.
+
+    Hidden entries such as the .incoming spool directory are never served.
+    """
+    relative = (relative or '').lstrip('/')
+    path = safe_join(current_app.config['UPLOAD_FOLDER'], relative)
+    if path is None or any(part.startswith('.') for part in relative.split('/')) or not os.path.isfile(path):
+        abort(404)
+    return path
+
+
+def _content_disposition(filename):
+    ascii_name = filename.encode('ascii', 'ignore').decode('ascii').replace('"', '') or 'download'
+    return f"attachment; filename=\"{ascii_name}\"; filename*=UTF-8''{quote(filename)}"
+
+
+def send_upload(relative, mimetype=None, as_attachment=False, download_name=None, max_age=None, immutable=False):
+    """Send a file from UPLOAD_FOLDER.
+
+    With UPLOAD_ACCEL_PREFIX set the worker only resolves the path and hands
+    the transfer to nginx via X-Accel-Redirect; nginx then handles Range,
+    ETag and Last-Modified. Without it, send_file does the same in-process.
+    Small inline files are answered from hot_assets before either.
+    """
+    entry = None if as_attachment else hot_assets.get((relative or '').lstrip('/'))
+    if entry is not None:
+        response = current_app.response_class(entry.body, mimetype=mimetype or entry.mimetype)
+        response.set_etag(entry.etag)
+        response.last_modified = entry.last_modified
+        if max_age is None:
+            response.cache_control.no_cache = True
+        else:
+            response.cache_control.public = True
+            response.cache_control.max_age = max_age
+        if immutable:
+            response.cache_control.immutable = True
+        return response.make_conditional(request, accept_ranges=True, complete_length=len(entry.body))
+
+    path = resolve_upload(relative)
+    mimetype = mimetype or detect_mimetype(path)
+    download_name = download_name or os.path.basename(path)
+    prefix = current_app.config.get('UPLOAD_ACCEL_PREFIX')
+
+    if prefix:
+        internal = os.path.relpath(path, current_app.config['UPLOAD_FOLDER']).replace(os.sep, '/')
+        response = current_app.response_class(mimetype=mimetype)
+        response.headers['X-Accel-Redirect'] = prefix.rstrip('/') + '/' + quote(internal)
+        if as_attachment:
+            response.headers['Content-Disposition'] = _content_disposition(download_name)
+        if max_age is not None:
+            response.cache_control.public = True
+            response.cache_control.max_age = max_age
+    else:
+        response = send_file(
+            path, mimetype=mimetype, as_attachment=as_attachment, download_name=download_name,
+            conditional=True, max_age=max_age
+        )
+    if immutable:
+        response.cache_control.immutable = True
+    return response
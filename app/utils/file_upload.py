@@ -1,6 +1,120 @@
+import hashlib
+import mimetypes
+import os
+import re
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app
+from werkzeug.utils import secure_filename
 from wtforms import Field, ValidationError
 from wtforms.widgets import FileInput
 
+UPLOAD_URL_PREFIX = '/Uploads/'
+# Uploads/ab/cd/<sha256>.<ext>, plus everything derived from such a file
+IMMUTABLE_UPLOAD = re.compile(r'^(_derived/)?[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}\.[a-z0-9]+(/|$)')
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+CHUNK_SIZE = 64 * 1024
+
+
+# Первые байты поддерживаемых форматов; расширению файла не доверяем
+MAGIC_SIGNATURES = (
+    (b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (b'\xff\xd8\xff', 'image/jpeg'),
+    (b'GIF87a', 'image/gif'),
+    (b'GIF89a', 'image/gif'),
+    (b'%PDF-', 'application/pdf'),
+)
+# Какое содержимое ожидается для расширения
+EXTENSION_MIMETYPES = {
+    'png': 'image/png',
+    'jpg': 'image/jpeg',
+    'jpeg': 'image/jpeg',
+    'gif': 'image/gif',
+    'webp': 'image/webp',
+    'pdf': 'application/pdf',
+}
+
+
+def sniff_mimetype(head):
+    """MIME type from the first bytes of a file, None if the format is unknown."""
+    for signature, mimetype in MAGIC_SIGNATURES:
+        if head.startswith(signature):
+            return mimetype
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'image/webp'
+    return None
+
+
+def detect_mimetype(path):
+    try:
+        with open(path, 'rb') as f:
+            head = f.read(16)
+    except OSError:
+        head = b''
+    return sniff_mimetype(head) or mimetypes.guess_type(path)[0] or 'application/octet-stream'
+
+
+def upload_extension(filename):
+    filename = secure_filename(filename or '')
+    return filename.rsplit('.', 1)[-1].lower() if '.' in filename else 'bin'
+
+
+def content_path(sha256, ext):
+    """Path of a stored file relative to UPLOAD_FOLDER."""
+    return f'{sha256[:2]}/{sha256[2:4]}/{sha256}.{ext}'
+
+
+def is_immutable_upload(relative):
+    return bool(IMMUTABLE_UPLOAD.match(relative))
+
+
+def spool_file(folder):
+    """Temp file inside UPLOAD_FOLDER, so the final rename stays on one filesystem."""
+    incoming = os.path.join(folder, '.incoming')
+    os.makedirs(incoming, exist_ok=True)
+    return tempfile.mkstemp(dir=incoming)
+
+
+def commit_upload(tmp_path, sha256, ext, folder=None):
+    """Move a fully written temp file to its content address and return the URL.
+
+    If the same content is already stored, the temp file is dropped instead.
+    """
+    folder = folder or current_app.config['UPLOAD_FOLDER']
+    relative = content_path(sha256, ext)
+    target = os.path.join(folder, relative)
+    if os.path.exists(target):
+        os.remove(tmp_path)
+        # Fresh mtime restarts the grace period of upload_collector for a re-uploaded orphan
+        os.utime(target)
+    else:
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, target)
+    return UPLOAD_URL_PREFIX + relative
+
+
+def store_upload(file, folder=None):
+    """Save a FileStorage by its SHA-256 and return an immutable /Uploads/ URL."""
+    folder = folder or current_app.config['UPLOAD_FOLDER']
+    stream = getattr(file, 'stream', file)
+    if hasattr(stream, 'seek'):
+        stream.seek(0)
+    digest = hashlib.sha256()
+    fd, tmp_path = spool_file(folder)
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            for chunk in iter(lambda: stream.read(CHUNK_SIZE), b''):
+                digest.update(chunk)
+                out.write(chunk)
+        return commit_upload(tmp_path, digest.hexdigest(), upload_extension(file.filename), folder)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
 class FileUploadField(Field):
     widget = FileInput()
 
@@ -25,14 +139,67 @@ class FileUploadField(Field):
     def populate_obj(self, obj, name):
         pass  # Обработка в AdminView.on_model_change
 
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _upload_pool():
+    global _executor
+    # Created on first use, so threads are started after gunicorn forks
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=current_app.config.get('UPLOAD_WORKERS', 4), thread_name_prefix='upload'
+            )
+        return _executor
+
+
+def check_upload(file, allowed_extensions=None):
+    """Raise ValidationError unless the extension is allowed and the content matches it."""
+    ext = file.filename.rsplit('.', 1)[-1].lower() if '.' in file.filename else ''
+    if allowed_extensions and ext not in allowed_extensions:
+        raise ValidationError(f'File extension .{ext} is not allowed. Allowed: {", ".join(allowed_extensions)}')
+    stream = getattr(file, 'stream', file)
+    head = stream.read(16)
+    stream.seek(0)
+    check_content(head, ext)
+
+
+def check_content(head, ext):
+    """Raise ValidationError if the first bytes of a file are not what ``ext`` promises."""
+    expected = EXTENSION_MIMETYPES.get(ext)
+    if expected and sniff_mimetype(head) != expected:
+        raise ValidationError(f'File content does not match the .{ext} extension')
+
+
 class MultipleFileUploadField(FileUploadField):
+    """Several files at once: checked during validation, stored in parallel by save().
+
+    Nothing is written while the form is validated, so a form rejected
+    because of another field leaves no files behind. Views call save()
+    from on_model_change, once the whole form is valid.
+    """
+
     widget = FileInput(multiple=True)
 
     def process_formdata(self, valuelist):
-        self.data = []
-        for item in valuelist:
-            if item and hasattr(item, 'filename') and item.filename and self.allowed_extensions:
-                ext = item.filename.rsplit('.', 1)[-1].lower() if '.' in item.filename else ''
-                if ext not in self.allowed_extensions:
-                    raise ValidationError(f'File extension .{ext} is not allowed. Allowed: {", ".join(self.allowed_extensions)}')
-            self.data.append(item)
\ No newline at end of file
+        self.data = [item for item in valuelist if item and getattr(item, 'filename', None)]
+
+    def post_validate(self, form, validation_stopped):
+        if validation_stopped or self.errors or not self.data:
+            return
+        for item in self.data:
+            try:
+                check_upload(item, self.allowed_extensions)
+            except ValidationError as e:
+                self.errors.append(f'{item.filename}: {e}')
+
+    def save(self, folder=None):
+        """Store the files in parallel; returns their /Uploads/ URLs in the order they were sent."""
+        if not self.data:
+            return []
+        folder = folder or (self.base_path() if callable(self.base_path) else (self.base_path or current_app.config['UPLOAD_FOLDER']))
+        os.makedirs(folder, exist_ok=True)
+        futures = [_upload_pool().submit(store_upload, item, folder) for item in self.data]
+        # Файлы, сохранённые до ошибки в соседнем, уберёт upload_collector
+        return [future.result() for future in futures]
\ No newline at end of file
@@ -0,0 +1,96 @@
+import hashlib
+import mimetypes
+import os
+import stat
+import threading
+from collections import OrderedDict, namedtuple
+from datetime import datetime, timezone
+from werkzeug.security import safe_join
+from app.utils.file_upload import is_immutable_upload, sniff_mimetype
+
+HotAsset = namedtuple('HotAsset', 'mtime_ns body etag mimetype last_modified')
+
+
+class HotAssetCache:
+    """Small uploads (logos, icons) kept in worker memory, LRU-capped by bytes.
+
+    Entries are keyed by path and validated by mtime, so a replaced file is
+    re-read on the next request. Content-addressed files never change and
+    are served without a stat at all. The ETag is computed once on load.
+    """
+
+    def __init__(self):
+        self.folder = None
+        self.max_bytes = 32 * 1024 * 1024
+        self.max_file_size = 256 * 1024
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.folder = app.config['UPLOAD_FOLDER']
+        self.max_bytes = app.config.setdefault('HOT_ASSET_MAX_BYTES', self.max_bytes)
+        self.max_file_size = app.config.setdefault('HOT_ASSET_MAX_FILE_SIZE', self.max_file_size)
+
+    def get(self, relative):
+        """Cached file for an /Uploads/ path, None if it is missing, hidden or too large."""
+        if not self.max_bytes:
+            return None
+        immutable = is_immutable_upload(relative)
+        if immutable:
+            with self._lock:
+                entry = self._entries.get(relative)
+                if entry is not None:
+                    self._entries.move_to_end(relative)
+                    return entry
+
+        path = safe_join(self.folder, relative)
+        if path is None or any(part.startswith('.') for part in relative.split('/')):
+            return None
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        if not stat.S_ISREG(st.st_mode) or st.st_size > self.max_file_size:
+            return None
+        with self._lock:
+            entry = self._entries.get(relative)
+            if entry is not None and entry.mtime_ns == st.st_mtime_ns:
+                self._entries.move_to_end(relative)
+                return entry
+
+        try:
+            with open(path, 'rb') as f:
+                body = f.read(self.max_file_size + 1)
+        except OSError:
+            return None
+        if len(body) > self.max_file_size:
+            return None
+        # У файлов с адресом по содержимому SHA-256 уже в имени
+        etag = os.path.basename(relative).split('.', 1)[0] if immutable else hashlib.sha1(body).hexdigest()
+        entry = HotAsset(
+            st.st_mtime_ns, body, etag,
+            sniff_mimetype(body[:16]) or mimetypes.guess_type(path)[0] or 'application/octet-stream',
+            datetime.fromtimestamp(st.st_mtime_ns // 10**9, tz=timezone.utc),
+        )
+        self._put(relative, entry)
+        return entry
+
+    def _put(self, relative, entry):
+        with self._lock:
+            old = self._entries.pop(relative, None)
+            if old is not None:
+                self._size -= len(old.body)
+            self._entries[relative] = entry
+            self._size += len(entry.body)
+            while self._size > self.max_bytes and self._entries:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted.body)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+
+hot_assets = HotAssetCache()
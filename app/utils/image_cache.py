@@ -0,0 +1,106 @@
+import fcntl
+import hashlib
+import os
+import threading
+import time
+from app.utils.atomic import atomic_write
+from app.utils.file_upload import UPLOAD_URL_PREFIX
+from app.utils.images import resize_image
+
+
+def thumbnail_url(url, size='160x160'):
+    """/img/<size>/ URL for an uploaded image; other URLs are returned unchanged."""
+    if isinstance(url, str) and url.startswith(UPLOAD_URL_PREFIX):
+        return f'/img/{size}/{url[len(UPLOAD_URL_PREFIX):]}'
+    return url
+
+
+class ResizedImageCache:
+    """On-disk cache of /img/<w>x<h>/ renders, capped at IMAGE_CACHE_MAX_BYTES.
+
+    Keys include the source mtime and size, so a replaced upload simply
+    stops being hit. Hits set the file's atime (mtime stays, so ETags stay
+    stable) and eviction removes the least recently used files first.
+    Concurrent misses for one key, in any worker, wait on the lock file of
+    its subdirectory and reuse the first render.
+    """
+
+    def __init__(self):
+        self.folder = None
+        self.max_bytes = 256 * 1024 * 1024
+        self._written = 0
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.folder = app.config.setdefault('IMAGE_CACHE_FOLDER', os.path.join(app.instance_path, 'img-cache'))
+        self.max_bytes = app.config.setdefault('IMAGE_CACHE_MAX_BYTES', self.max_bytes)
+        app.config.setdefault('IMAGE_RESIZE_SIZES', ('160x160', '320x320', '640x640', '1280x1280'))
+        os.makedirs(self.folder, exist_ok=True)
+
+    def get(self, source, width, height, fmt=None):
+        """Path of the cached render, creating it if needed."""
+        stat = os.stat(source)
+        key = hashlib.sha1(
+            f'{source}|{stat.st_mtime_ns}|{stat.st_size}|{width}x{height}|{fmt}'.encode('utf-8')
+        ).hexdigest()
+        path = os.path.join(self.folder, key[:2], key)
+        if self._touch(path):
+            return path
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Один постоянный файл блокировки на подкаталог: удалённый файл другой воркер
+        # пересоздал бы и заблокировал новый inode, пока первый держит старый
+        with open(os.path.join(os.path.dirname(path), '.lock'), 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            # Another request may have rendered it while we waited
+            if not os.path.exists(path):
+                data = resize_image(source, width, height, fmt)
+                atomic_write(path, data)
+                self._account(len(data))
+        return path
+
+    def _touch(self, path):
+        try:
+            os.utime(path, ns=(time.time_ns(), os.stat(path).st_mtime_ns))
+            return True
+        except OSError:
+            return False
+
+    def _account(self, size):
+        # Scanning the directory is the expensive part: do it every ~10% of the cap
+        with self._lock:
+            self._written += size
+            if self._written < self.max_bytes // 10:
+                return
+            self._written = 0
+        self.evict()
+
+    def evict(self):
+        entries = []
+        for root, _, files in os.walk(self.folder):
+            for name in files:
+                if name.endswith('.lock') or name.startswith('.'):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_atime_ns, stat.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        if total <= self.max_bytes:
+            return 0
+        removed = 0
+        for _, size, path in sorted(entries):
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            removed += 1
+            if total <= self.max_bytes * 0.9:
+                break
+        return removed
+
+
+resized_images = ResizedImageCache()
@@ -1,5 +1,6 @@
 from wtforms import Field
 from markupsafe import Markup
+from app.utils.image_cache import thumbnail_url
 
 class MultipleImagePreviewField(Field):
     def __init__(self, label=None, validators=None, existing_images=None, **kwargs):
@@ -15,7 +16,7 @@ class MultipleImagePreviewField(Field):
             image_id = image_url.split("/")[-1]
             html.append(f'''
                 <div style="position:relative;">
-                    <img src="{image_url}" style="height:80px; border:1px solid #ccc;"/>
+                    <img src="{thumbnail_url(image_url)}" loading="lazy" style="height:80px; border:1px solid #ccc;"/>
                     <a href="?remove_image={image_url}" style="position:absolute; top:0; right:0; background:#f00; color:#fff; padding:2px 5px; text-decoration:none;">×</a>
                 </div>
             ''')
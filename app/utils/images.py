@@ -0,0 +1,296 @@
+import io
+import json
+import os
+import base64
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import click
+from flask import current_app
+from PIL import Image, ImageFilter, ImageOps
+from werkzeug.security import safe_join
+from app.utils.atomic import atomic_write
+from app.utils.content_versions import content_versions
+from app.utils.file_upload import UPLOAD_URL_PREFIX
+
+DERIVED_DIR = '_derived'
+IMAGE_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
+# Ширины для srcset; оригинал шире последней уменьшается до неё
+DERIVATIVE_WIDTHS = (320, 640, 960, 1280, 1920)
+# format -> (file extension, Pillow format, save options)
+DERIVATIVE_FORMATS = {
+    'webp': ('webp', 'WEBP', {'quality': 80, 'method': 6}),
+    'jpeg': ('jpg', 'JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+    'png': ('png', 'PNG', {'optimize': True}),
+}
+# Форматы вариантов для srcset
+SRCSET_FORMATS = ('webp', 'jpeg')
+# Манифесты старой версии пересобираются
+MANIFEST_VERSION = 2
+# Длинная сторона заглушки, которую фронтенд растягивает с CSS blur
+PLACEHOLDER_SIZE = 16
+
+
+def upload_relative(url):
+    """Path of an /Uploads/ URL relative to UPLOAD_FOLDER, None for external URLs."""
+    if not isinstance(url, str) or not url.startswith(UPLOAD_URL_PREFIX):
+        return None
+    return url[len(UPLOAD_URL_PREFIX):]
+
+
+def _derived_dir(folder, relative):
+    return safe_join(folder, DERIVED_DIR, relative)
+
+
+def variant_url(url, width, fmt):
+    relative = upload_relative(url)
+    return f'{UPLOAD_URL_PREFIX}{DERIVED_DIR}/{relative}/{width}.{DERIVATIVE_FORMATS[fmt][0]}'
+
+
+def _flatten(img):
+    # JPEG has no alpha channel: composite onto white
+    if img.mode != 'RGBA':
+        return img
+    background = Image.new('RGB', img.size, (255, 255, 255))
+    background.paste(img, mask=img.getchannel('A'))
+    return background
+
+
+def open_image(source):
+    """Image with EXIF orientation applied, as RGB or RGBA; metadata is not carried over."""
+    with Image.open(source) as original:
+        img = ImageOps.exif_transpose(original)
+    has_alpha = img.mode in ('RGBA', 'LA') or (img.mode == 'P' and 'transparency' in img.info)
+    return img.convert('RGBA' if has_alpha else 'RGB')
+
+
+def encode_image(img, fmt):
+    _, pil_format, options = DERIVATIVE_FORMATS[fmt]
+    buffer = io.BytesIO()
+    (_flatten(img) if fmt == 'jpeg' else img).save(buffer, pil_format, **options)
+    return buffer.getvalue()
+
+
+def resize_image(source, width, height, fmt=None):
+    """Fit an image into width x height without upscaling and encode it.
+
+    ``fmt`` None picks PNG for images with transparency and JPEG otherwise.
+    """
+    img = open_image(source)
+    img.thumbnail((width, height), Image.Resampling.LANCZOS)
+    if fmt is None:
+        fmt = 'png' if img.mode == 'RGBA' else 'jpeg'
+    return encode_image(img, fmt)
+
+
+def dominant_color(img):
+    """Most common colour of a reduced palette as ``#rrggbb``."""
+    small = _flatten(img).copy()
+    small.thumbnail((64, 64))
+    quantized = small.quantize(colors=5, method=Image.Quantize.MEDIANCUT)
+    _, index = max(quantized.getcolors())
+    r, g, b = quantized.getpalette()[index * 3:index * 3 + 3]
+    return f'#{r:02x}{g:02x}{b:02x}'
+
+
+def placeholder(img):
+    """Tiny blurred WebP as a data: URI, a few hundred bytes."""
+    tiny = img.copy()
+    tiny.thumbnail((PLACEHOLDER_SIZE, PLACEHOLDER_SIZE), Image.Resampling.LANCZOS)
+    tiny = tiny.filter(ImageFilter.GaussianBlur(1))
+    buffer = io.BytesIO()
+    tiny.save(buffer, 'WEBP', quality=40)
+    return 'data:image/webp;base64,' + base64.b64encode(buffer.getvalue()).decode('ascii')
+
+
+def build_derivatives(folder, relative):
+    """Write resized, orientation-fixed, EXIF-free variants of one upload.
+
+    Returns False when the existing variants already match the source file.
+    """
+    source = safe_join(folder, relative)
+    target = _derived_dir(folder, relative)
+    if source is None or target is None or relative.startswith(f'{DERIVED_DIR}/'):
+        return False
+    if relative.rsplit('.', 1)[-1].lower() not in IMAGE_EXTENSIONS:
+        return False
+    stat = os.stat(source)
+    manifest_path = os.path.join(target, 'manifest.json')
+    try:
+        with open(manifest_path, encoding='utf-8') as f:
+            manifest = json.load(f)
+        if (manifest.get('source_mtime_ns'), manifest.get('source_size'), manifest.get('version')) == (
+            stat.st_mtime_ns, stat.st_size, MANIFEST_VERSION
+        ):
+            return False
+    except (OSError, ValueError):
+        pass
+
+    with Image.open(source) as original:
+        animated = getattr(original, 'is_animated', False)
+    img = open_image(source)  # для GIF это первый кадр
+
+    width, height = img.size
+    # Анимированные GIF отдаются как есть, для них только метаданные
+    widths = [] if animated else sorted({w for w in DERIVATIVE_WIDTHS if w < width} | {min(width, DERIVATIVE_WIDTHS[-1])})
+    os.makedirs(target, exist_ok=True)
+    written = set()
+    for w in widths:
+        resized = img if w == width else img.resize((w, max(1, round(height * w / width))), Image.Resampling.LANCZOS)
+        for fmt in SRCSET_FORMATS:
+            ext = DERIVATIVE_FORMATS[fmt][0]
+            atomic_write(os.path.join(target, f'{w}.{ext}'), encode_image(resized, fmt))
+            written.add(f'{w}.{ext}')
+
+    # Варианты прежней версии файла, которых больше нет в наборе
+    for name in os.listdir(target):
+        if name not in written and name != 'manifest.json' and not name.startswith('.'):
+            os.remove(os.path.join(target, name))
+
+    manifest = {
+        'version': MANIFEST_VERSION,
+        'source_mtime_ns': stat.st_mtime_ns,
+        'source_size': stat.st_size,
+        'width': width,
+        'height': height,
+        'color': dominant_color(img),
+        'placeholder': placeholder(img),
+        'widths': widths,
+        'formats': list(SRCSET_FORMATS) if widths else [],
+    }
+    atomic_write(manifest_path, json.dumps(manifest).encode('utf-8'))
+    return True
+
+
+_manifests = {}  # manifest path -> (mtime_ns, manifest, srcset)
+
+
+def _manifest(url):
+    """``(manifest, srcset)`` of an uploaded image, None until its variants exist."""
+    relative = upload_relative(url)
+    if relative is None:
+        return None
+    target = _derived_dir(current_app.config['UPLOAD_FOLDER'], relative)
+    if target is None:
+        return None
+    manifest_path = os.path.join(target, 'manifest.json')
+    try:
+        mtime = os.stat(manifest_path).st_mtime_ns
+        cached = _manifests.get(manifest_path)
+        if cached and cached[0] == mtime:
+            return cached[1:]
+        with open(manifest_path, encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    value = {
+        fmt: ', '.join(f'{variant_url(url, w, fmt)} {w}w' for w in manifest['widths'])
+        for fmt in manifest['formats']
+    } or None
+    _manifests[manifest_path] = (mtime, manifest, value)
+    return manifest, value
+
+
+def srcset(url):
+    """``{'webp': '<url> 320w, ...', 'jpeg': ...}`` for an uploaded image, None until its variants exist."""
+    cached = _manifest(url)
+    return cached[1] if cached else None
+
+
+def image_meta(url):
+    """``{'width', 'height', 'color', 'placeholder'}`` for laying out an image before it loads."""
+    cached = _manifest(url)
+    if not cached or 'placeholder' not in cached[0]:
+        return None
+    manifest = cached[0]
+    return {name: manifest[name] for name in ('width', 'height', 'color', 'placeholder')}
+
+
+class ImagePipeline:
+    """Worker pool that builds image variants after uploads are saved.
+
+    When a batch produced new variants, the given tables get a new content
+    version so cached API responses pick up the srcset. Other file types
+    can add their own ``builder(folder, relative)`` with register().
+    """
+
+    def __init__(self):
+        self.app = None
+        self._executor = None
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._builders = {ext: build_derivatives for ext in IMAGE_EXTENSIONS}
+
+    def register(self, extensions, builder):
+        for ext in extensions:
+            self._builders[ext] = builder
+
+    def _builder(self, relative):
+        return self._builders.get(relative.rsplit('.', 1)[-1].lower())
+
+    def init_app(self, app):
+        self.app = app
+        app.config.setdefault('IMAGE_WORKERS', 2)
+        app.cli.command('images-rebuild')(self._rebuild_command)
+
+    def _rebuild_command(self):
+        """Build missing or outdated variants and metadata for every uploaded image and PDF."""
+        from app import db
+        folder = self.app.config['UPLOAD_FOLDER']
+        built = 0
+        for root, dirs, files in os.walk(folder):
+            dirs[:] = [d for d in dirs if not d.startswith('.') and not (root == folder and d == DERIVED_DIR)]
+            for name in files:
+                relative = os.path.relpath(os.path.join(root, name), folder).replace(os.sep, '/')
+                builder = self._builder(relative)
+                if builder is None:
+                    continue
+                try:
+                    built += builder(folder, relative)
+                except Exception as e:
+                    click.echo(f'{relative}: {str(e)}', err=True)
+        if built:
+            content_versions.bump({table.name for table in db.metadata.sorted_tables})
+        click.echo(f'Rebuilt {built} files')
+
+    def _pool(self):
+        # Created on first use, so threads are started after gunicorn forks
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.app.config['IMAGE_WORKERS'], thread_name_prefix='image-pipeline'
+                )
+            return self._executor
+
+    def submit(self, urls, tables=()):
+        """Queue uploads referenced by ``urls`` (strings or lists of strings)."""
+        relatives = []
+        for url in urls:
+            for item in (url if isinstance(url, (list, tuple)) else [url]):
+                relative = upload_relative(item)
+                if relative and self._builder(relative):
+                    relatives.append(relative)
+        if not relatives:
+            return None
+        folder = self.app.config['UPLOAD_FOLDER']
+        return self._pool().submit(self._run, folder, relatives, frozenset(tables))
+
+    def _run(self, folder, relatives, tables):
+        changed = False
+        for relative in relatives:
+            with self._lock:
+                if relative in self._pending:
+                    continue
+                self._pending.add(relative)
+            try:
+                changed |= self._builder(relative)(folder, relative)
+            except Exception as e:
+                self.app.logger.error(f"Не удалось обработать файл {relative}: {str(e)}")
+            finally:
+                with self._lock:
+                    self._pending.discard(relative)
+        if changed and tables:
+            content_versions.bump(tables)
+        return changed
+
+
+image_pipeline = ImagePipeline()
@@ -0,0 +1,40 @@
+from functools import lru_cache
+from operator import attrgetter
+from types import SimpleNamespace
+from flask_babel import get_locale
+
+
+@lru_cache(maxsize=None)
+def _locale_name(locale):
+    return (str(locale) or 'en') if locale else 'en'
+
+
+def current_locale():
+    """Locale code of the current request; Babel memoizes the lookup on the context."""
+    return _locale_name(get_locale())
+
+
+def _missing(obj):
+    return None
+
+
+@lru_cache(maxsize=None)
+def _compile(model, locale):
+    getters = {}
+    for name in getattr(model, '__localized__', ()):
+        column = f'{name}_{locale}'
+        getters[name] = attrgetter(column if hasattr(model, column) else f'{name}_en')
+    # Fields without an _en fallback, e.g. Project tags
+    for name in getattr(model, '__localized_optional__', ()):
+        column = f'{name}_{locale}'
+        getters[name] = attrgetter(column) if hasattr(model, column) else _missing
+    return SimpleNamespace(**getters)
+
+
+def localized_fields(model, locale=None):
+    """Precompiled accessors for ``model.__localized__`` fields in ``locale``.
+
+    Missing ``<field>_<locale>`` columns fall back to ``<field>_en``, the same
+    way the old ``getattr(self, f'title_{locale}', self.title_en)`` did.
+    """
+    return _compile(model, locale or current_locale())
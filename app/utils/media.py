@@ -0,0 +1,221 @@
+import hashlib
+import json
+import os
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+import click
+from PIL import Image
+from sqlalchemy import select
+from werkzeug.security import safe_join
+from app import db
+from app.utils.atomic import atomic_write
+from app.utils.file_upload import UPLOAD_URL_PREFIX, commit_upload, spool_file
+from app.utils.images import IMAGE_EXTENSIONS, build_derivatives, open_image
+from app.utils.upload_refs import (
+    HTML_COLUMNS, TRACKED_MODELS, UPLOAD_COLUMNS, replace_html_urls, row_paths, tracked_columns
+)
+
+# Pillow format -> save options for re-encoding; GIF is left alone
+OPTIMIZE_FORMATS = {
+    'JPEG': {'optimize': True, 'progressive': True},
+    'PNG': {'optimize': True},
+    'WEBP': {'method': 6},
+}
+
+
+def optimize_file(folder, relative, max_size, quality):
+    """Re-encode one upload in a worker process.
+
+    Returns ``(relative, new_relative or None, old_size, new_size, error)``;
+    the new file is content-addressed and already has its variants.
+    """
+    source = safe_join(folder, relative)
+    try:
+        old_size = os.path.getsize(source)
+        with Image.open(source) as original:
+            pil_format = original.format
+            animated = getattr(original, 'is_animated', False)
+        if pil_format not in OPTIMIZE_FORMATS or animated:
+            return relative, None, old_size, old_size, None
+        img = open_image(source)
+        img.thumbnail((max_size, max_size), Image.Resampling.LANCZOS)
+        options = dict(OPTIMIZE_FORMATS[pil_format])
+        if pil_format != 'PNG':
+            options['quality'] = quality
+        fd, tmp_path = spool_file(folder)
+        with os.fdopen(fd, 'wb') as out:
+            img.save(out, pil_format, **options)
+        new_size = os.path.getsize(tmp_path)
+        # Меньше 5% выигрыша не стоит новой ссылки
+        if new_size >= old_size * 0.95:
+            os.remove(tmp_path)
+            return relative, None, old_size, old_size, None
+        digest = hashlib.sha256()
+        with open(tmp_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(64 * 1024), b''):
+                digest.update(chunk)
+        url = commit_upload(tmp_path, digest.hexdigest(), relative.rsplit('.', 1)[-1].lower(), folder)
+        new_relative = url[len(UPLOAD_URL_PREFIX):]
+        build_derivatives(folder, new_relative)
+        return relative, new_relative, old_size, new_size, None
+    except Exception as e:
+        return relative, None, 0, 0, str(e)
+
+
+def _optimize_args(args):
+    return optimize_file(*args)
+
+
+def _replace(value, urls):
+    if isinstance(value, (list, tuple)):
+        return [urls.get(item, item) for item in value]
+    return urls.get(value, value)
+
+
+class MediaOptimizer:
+    """``flask media optimize``: re-encode every image referenced in the DB.
+
+    That covers the upload columns and /Uploads/ links inside the CKEditor
+    HTML columns, the same references upload_refs counts.
+
+    Files are processed in a process pool. After each batch the references
+    to the re-encoded files are rewritten in one transaction, and only then
+    is the batch recorded in the checkpoint file, so an interrupted run
+    resumes where it stopped. The old files lose their references and are
+    removed later by upload_collector.
+    """
+
+    def __init__(self):
+        self.app = None
+
+    def init_app(self, app):
+        self.app = app
+        app.config.setdefault('MEDIA_CHECKPOINT', os.path.join(app.instance_path, 'media-optimize.json'))
+        media = click.Group('media', help='Maintenance of files in Uploads/.')
+
+        @media.command('optimize')
+        @click.option('--workers', type=int, default=None, help='Worker processes (default: CPU count).')
+        @click.option('--batch', type=int, default=50, show_default=True, help='Files per DB transaction.')
+        @click.option('--max-size', type=int, default=2560, show_default=True, help='Longest side in pixels.')
+        @click.option('--quality', type=int, default=85, show_default=True, help='JPEG/WebP quality.')
+        @click.option('--restart', is_flag=True, help='Ignore the checkpoint of a previous run.')
+        def optimize(workers, batch, max_size, quality, restart):
+            """Re-encode and downsize uploaded images referenced in the DB."""
+            self.optimize(workers, batch, max_size, quality, restart)
+
+        app.cli.add_command(media)
+
+    def _references(self):
+        """``{relative: {(model, id), ...}}`` for every image referenced in the DB."""
+        references = defaultdict(set)
+        for model in TRACKED_MODELS:
+            table = model.__table__
+            columns = tracked_columns(model)
+            for row in db.session.execute(select(table.c.id, *(table.c[name] for name in columns))):
+                for relative in row_paths(model, dict(zip(columns, row[1:]))):
+                    if relative.rsplit('.', 1)[-1].lower() in IMAGE_EXTENSIONS:
+                        references[relative].add((model, row[0]))
+        return references
+
+    def _load_checkpoint(self, path):
+        try:
+            with open(path, encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _rewrite(self, results, references):
+        urls = {
+            UPLOAD_URL_PREFIX + relative: UPLOAD_URL_PREFIX + new_relative
+            for relative, new_relative, *_ in results if new_relative
+        }
+        rows = {ref for relative, new_relative, *_ in results if new_relative for ref in references[relative]}
+        try:
+            for model, ref_id in rows:
+                obj = db.session.get(model, ref_id)
+                if obj is None:
+                    continue
+                for name in UPLOAD_COLUMNS.get(model, ()):
+                    value = getattr(obj, name)
+                    replaced = _replace(value, urls)
+                    if replaced != value:
+                        setattr(obj, name, replaced)
+                for name in HTML_COLUMNS.get(model, ()):
+                    value = getattr(obj, name)
+                    replaced = replace_html_urls(value, urls)
+                    if replaced != value:
+                        setattr(obj, name, replaced)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+    def optimize(self, workers=None, batch=50, max_size=2560, quality=85, restart=False):
+        folder = self.app.config['UPLOAD_FOLDER']
+        checkpoint_path = self.app.config['MEDIA_CHECKPOINT']
+        checkpoint = {} if restart else self._load_checkpoint(checkpoint_path)
+        references = self._references()
+        todo = sorted(
+            relative for relative in references
+            if relative not in checkpoint and os.path.isfile(os.path.join(folder, relative))
+        )
+        if checkpoint and todo:
+            click.echo(f'Resuming: {len(checkpoint)} files done, {len(todo)} left')
+
+        errors = []
+        with ProcessPoolExecutor(max_workers=workers) as pool, \
+                click.progressbar(length=len(todo), label='Optimizing') as progress:
+            results = pool.map(
+                _optimize_args, ((folder, relative, max_size, quality) for relative in todo), chunksize=4
+            )
+            pending = []
+            for result in results:
+                progress.update(1)
+                if result[4]:
+                    errors.append((result[0], result[4]))
+                    continue
+                pending.append(result)
+                if len(pending) >= batch:
+                    self._flush(pending, references, checkpoint, checkpoint_path)
+                    pending = []
+            if pending:
+                self._flush(pending, references, checkpoint, checkpoint_path)
+
+        for relative, error in errors:
+            click.echo(f'{relative}: {error}', err=True)
+        self._report(checkpoint)
+
+    def _flush(self, results, references, checkpoint, checkpoint_path):
+        self._rewrite(results, references)
+        for relative, new_relative, old_size, new_size, _ in results:
+            # Модели на момент обработки нужны для отчёта и после перезапуска
+            checkpoint[relative] = {
+                'new': new_relative,
+                'saved': old_size - new_size,
+                'models': sorted({model.__name__ for model, _ in references[relative]}),
+            }
+            if new_relative:
+                # Не пережимать результат повторно после перезапуска
+                checkpoint.setdefault(new_relative, {'new': None, 'saved': 0, 'models': []})
+        atomic_write(checkpoint_path, json.dumps(checkpoint).encode('utf-8'))
+
+    def _report(self, checkpoint):
+        saved = defaultdict(int)
+        optimized = defaultdict(int)
+        for entry in checkpoint.values():
+            if not entry['new']:
+                continue
+            for name in entry['models']:
+                saved[name] += entry['saved']
+                optimized[name] += 1
+        if not saved:
+            click.echo('Nothing to optimize')
+            return
+        # Файл, на который ссылаются несколько моделей, засчитан каждой из них
+        for name in sorted(saved):
+            click.echo(f'{name:<14} {optimized[name]:>6} files  {saved[name]:>14} bytes saved')
+        total = sum(entry['saved'] for entry in checkpoint.values() if entry['new'])
+        click.echo(f"{'Total':<14} {sum(1 for e in checkpoint.values() if e['new']):>6} files  {total:>14} bytes saved")
+
+
+media_optimizer = MediaOptimizer()
@@ -0,0 +1,114 @@
+import base64
+import json
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from sqlalchemy import and_, or_
+from app.utils.content_versions import content_versions, table_names
+
+
+def encode_cursor(direction, row):
+    created_at = row.created_at.isoformat() if row.created_at is not None else None
+    raw = json.dumps([direction, created_at, row.id], separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        direction, created_at, row_id = json.loads(raw)
+        if direction not in ('next', 'prev'):
+            raise ValueError(direction)
+        return direction, datetime.fromisoformat(created_at) if created_at is not None else None, int(row_id)
+    except (ValueError, TypeError):
+        raise ValueError('Invalid cursor')
+
+
+def next_page_cursor(pagination):
+    """Cursor continuing after an offset page, so clients can switch to ``?cursor=``."""
+    if pagination.has_next and pagination.items:
+        return encode_cursor('next', pagination.items[-1])
+    return None
+
+
+class KeysetPage:
+    def __init__(self, items, next_cursor, prev_cursor):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_prev(self):
+        return self.prev_cursor is not None
+
+
+def keyset_paginate(query, model, per_page, cursor=None):
+    """Page ``query`` newest first on (created_at, id) without OFFSET.
+
+    Rows without created_at count as the oldest and come last.
+    Raises ValueError for a malformed cursor.
+    """
+    created_at, pk = model.created_at, model.id
+    direction, boundary = 'next', None
+    if cursor:
+        direction, ts, row_id = decode_cursor(cursor)
+        if direction == 'next' and ts is None:
+            boundary = and_(created_at.is_(None), pk < row_id)
+        elif direction == 'next':
+            boundary = or_(created_at < ts, and_(created_at == ts, pk < row_id), created_at.is_(None))
+        elif ts is None:
+            boundary = or_(created_at.is_not(None), pk > row_id)
+        else:
+            boundary = or_(created_at > ts, and_(created_at == ts, pk > row_id))
+
+    if boundary is not None:
+        query = query.filter(boundary)
+    if direction == 'next':
+        query = query.order_by(created_at.desc().nulls_last(), pk.desc())
+    else:
+        query = query.order_by(created_at.asc().nulls_first(), pk.asc())
+
+    rows = query.limit(per_page + 1).all()
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+
+    if direction == 'next':
+        next_cursor = encode_cursor('next', rows[-1]) if has_more else None
+        prev_cursor = encode_cursor('prev', rows[0]) if cursor and rows else None
+    else:
+        rows.reverse()
+        prev_cursor = encode_cursor('prev', rows[0]) if has_more else None
+        next_cursor = encode_cursor('next', rows[-1]) if rows else None
+    return KeysetPage(rows, next_cursor, prev_cursor)
+
+
+class CountCache:
+    """COUNT(*) results per filter combination, valid until the listed tables change."""
+
+    def __init__(self, maxsize=256):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def count(self, key, query, *sources):
+        stamp = content_versions.stamp(table_names(*sources))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] == stamp:
+                self._entries.move_to_end(key)
+                return entry[1]
+
+        total = query.order_by(None).count()
+        with self._lock:
+            self._entries[key] = (stamp, total)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return total
+
+
+count_cache = CountCache()
@@ -0,0 +1,212 @@
+import hashlib
+import os
+import re
+import threading
+from fpdf import FPDF
+from fpdf.ttfonts import TTFontFile
+from app.models.project import Project
+from app.utils.localization import localized_fields
+
+FONT_FAMILY = 'DejaVu'
+# Абсолютный путь: от рабочего каталога gunicorn не зависит
+DEFAULT_FONT_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'static', 'fonts', 'DejaVuSans.ttf')
+# Системный DejaVu, если в app/static/fonts шрифта нет
+SYSTEM_FONT_PATHS = (
+    '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf',
+    '/usr/share/fonts/TTF/DejaVuSans.ttf',
+    '/usr/share/fonts/dejavu/DejaVuSans.ttf',
+)
+
+
+def _font_metrics(path, fontkey):
+    """What FPDF.add_font(uni=True) builds from a TrueType file, parsed once."""
+    ttf = TTFontFile()
+    ttf.getMetrics(path)
+    return {
+        'name': re.sub('[ ()]', '', ttf.fullName),
+        'type': 'TTF',
+        'desc': {
+            'Ascent': int(round(ttf.ascent, 0)),
+            'Descent': int(round(ttf.descent, 0)),
+            'CapHeight': int(round(ttf.capHeight, 0)),
+            'Flags': ttf.flags,
+            'FontBBox': '[%s %s %s %s]' % tuple(int(round(v, 0)) for v in ttf.bbox),
+            'ItalicAngle': int(ttf.italicAngle),
+            'StemV': int(round(ttf.stemV, 0)),
+            'MissingWidth': int(round(ttf.defaultWidth, 0)),
+        },
+        'up': round(ttf.underlinePosition),
+        'ut': round(ttf.underlineThickness),
+        'ttffile': path,
+        'fontkey': fontkey,
+        'originalsize': os.stat(path).st_size,
+        'cw': ttf.charWidths,
+    }
+
+
+class PDFFonts:
+    """TrueType metrics parsed once per process and shared by every document.
+
+    fpdf 1.7 re-parses the font on each add_font() (or tries to pickle it
+    next to the .ttf). Here the metrics are read when the app is created,
+    i.e. before the fork under ``gunicorn --preload`` and once per worker
+    otherwise. The glyph subset is still built per document, since it
+    depends on the text.
+    """
+
+    def __init__(self):
+        self._fonts = {}  # fontkey -> metrics
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        path = app.config.setdefault('PDF_FONT_PATH', DEFAULT_FONT_PATH)
+        candidates = [path] + [p for p in SYSTEM_FONT_PATHS if p != path]
+        for candidate in candidates:
+            if os.path.isfile(candidate):
+                try:
+                    self.load(FONT_FAMILY, candidate)
+                except Exception as e:
+                    app.logger.error(f"Failed to load font {candidate}: {e}")
+                    continue
+                if candidate != path:
+                    app.logger.warning(f"Шрифт {path} не найден, используется {candidate}")
+                return
+        app.logger.error(f"Шрифт {FONT_FAMILY} не найден ({path}); PDF без кириллицы")
+
+    def load(self, family, path, style=''):
+        fontkey = family.lower() + style.upper()
+        with self._lock:
+            if fontkey not in self._fonts:
+                self._fonts[fontkey] = _font_metrics(path, fontkey)
+
+    def available(self, family, style=''):
+        return family.lower() + style.upper() in self._fonts
+
+    def register(self, pdf, family, style=''):
+        """The add_font() bookkeeping without touching the font file."""
+        fontkey = family.lower() + style.upper()
+        metrics = self._fonts[fontkey]
+        if fontkey in pdf.fonts:
+            return
+        pdf.fonts[fontkey] = {
+            'i': len(pdf.fonts) + 1, 'type': metrics['type'],
+            'name': metrics['name'], 'desc': metrics['desc'],
+            'up': metrics['up'], 'ut': metrics['ut'],
+            'cw': metrics['cw'],
+            'ttffile': metrics['ttffile'], 'fontkey': fontkey,
+            # Per document: fpdf adds the glyphs it uses to this list
+            'subset': list(range(0, 57 if hasattr(pdf, 'str_alias_nb_pages') else 32)),
+            'unifilename': None,
+        }
+        pdf.font_files[fontkey] = {'length1': metrics['originalsize'], 'type': 'TTF', 'ttffile': metrics['ttffile']}
+
+
+pdf_fonts = PDFFonts()
+
+
+class TemplatePDF(FPDF):
+    """FPDF document created from a PDFTemplate."""
+
+    def __init__(self, template, **context):
+        super().__init__(orientation=template.orientation, unit='mm', format=template.format)
+        self.template = template
+        self.context = context
+        self.set_margins(*template.margins)
+        self.set_auto_page_break(True, template.margins[1])
+        if template.page_numbers:
+            self.alias_nb_pages()
+        if pdf_fonts.available(FONT_FAMILY):
+            pdf_fonts.register(self, FONT_FAMILY)
+            self.base_font = FONT_FAMILY
+        else:
+            self.base_font = 'Arial'
+        self.set_font(self.base_font, size=template.font_size)
+
+    def normalize_text(self, txt):
+        # Без TTF-шрифта кириллица заменяется на "?", а не роняет рендер
+        if not self.unifontsubset and isinstance(txt, str):
+            txt = txt.encode('latin-1', 'replace').decode('latin-1')
+        return super().normalize_text(txt)
+
+    def header(self):
+        if self.template.header:
+            self.template.header(self)
+
+    def footer(self):
+        if self.template.page_numbers:
+            self.set_y(-self.template.margins[1] + 5)
+            self.set_font(self.base_font, size=8)
+            self.cell(0, 5, txt=f'{self.page_no()}/{{nb}}', align='C')
+
+    def heading(self, text, size=None):
+        self.set_font(self.base_font, size=size or self.template.heading_size)
+        self.cell(0, 10, txt=text, ln=True, align='C')
+        self.set_font(self.base_font, size=self.template.font_size)
+
+    def render(self):
+        return self.output(dest='S').encode('latin-1')
+
+
+class PDFTemplate:
+    """Page setup, fonts and running header/footer shared by a kind of document.
+
+    ``header`` is called with the document on every new page; per-document
+    values passed to new() are available as ``pdf.context``.
+    """
+
+    def __init__(self, name, orientation='P', format='A4', margins=(15, 15, 15), font_size=12,
+                 heading_size=16, header=None, page_numbers=False):
+        self.name = name
+        self.orientation = orientation
+        self.format = format
+        self.margins = margins
+        self.font_size = font_size
+        self.heading_size = heading_size
+        self.header = header
+        self.page_numbers = page_numbers
+
+    def new(self, **context):
+        return TemplatePDF(self, **context)
+
+
+PROJECT_SHEET = PDFTemplate('project', margins=(10, 10, 10))
+
+
+def project_pdf_version(project):
+    """Short hash of everything render_project_pdf puts on the page."""
+    parts = [project.id, project.main_image]
+    for locale in ('en', 'ru', 'tk'):
+        t = localized_fields(Project, locale)
+        parts += [t.title(project), t.description(project)]
+    parts += [(category.id, category.title_en) for category in project.categories]
+    return hashlib.sha1(repr(parts).encode('utf-8')).hexdigest()[:16]
+
+
+def render_project_pdf(project):
+    """Project details sheet as PDF bytes."""
+    pdf = PROJECT_SHEET.new(project=project)
+    pdf.add_page()
+
+    en, ru, tk = (localized_fields(Project, locale) for locale in ('en', 'ru', 'tk'))
+
+    pdf.cell(200, 10, txt=f"Project Details - ID: {project.id}", ln=True, align="C")
+    pdf.ln(10)
+
+    pdf.cell(200, 10, txt=f"Title (English): {en.title(project)}", ln=True)
+    pdf.cell(200, 10, txt=f"Название (Русский): {ru.title(project)}", ln=True)
+    pdf.cell(200, 10, txt=f"At (Türkmen): {tk.title(project)}", ln=True)
+    pdf.ln(10)
+
+    pdf.multi_cell(0, 10, txt=f"Description (English): {en.description(project)}", align='L')
+    pdf.multi_cell(0, 10, txt=f"Описание (Русский): {ru.description(project)}", align='L')
+    pdf.multi_cell(0, 10, txt=f"Bellik (Türkmen): {tk.description(project)}", align='L')
+    pdf.ln(10)
+
+    pdf.cell(200, 10, txt="Categories:", ln=True)
+    for cat in project.categories:
+        pdf.cell(200, 10, txt=f"- {cat.title_en}", ln=True)
+    pdf.ln(10)
+
+    pdf.cell(200, 10, txt=f"Image URL: {project.main_image}", ln=True)
+
+    return pdf.render()
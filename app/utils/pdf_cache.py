@@ -0,0 +1,131 @@
+import fcntl
+import os
+import threading
+from app import db
+from app.models.category import Category
+from app.models.project import Project, project_category
+from app.utils.atomic import atomic_write
+from app.utils.content_versions import content_versions, table_names
+from app.utils.pdf import project_pdf_version, render_project_pdf
+from app.utils.prefetch import project_plan
+
+PDF_TABLES = table_names(Project, Category, project_category)
+
+
+class ProjectPDFCache:
+    """Rendered project PDFs on disk, one file per project and version.
+
+    The version is a hash of what the sheet shows (titles, descriptions,
+    categories, image URL), so editing one project or category makes only
+    the affected PDFs stale. After a commit that touches projects or
+    categories a background pass renders the stale ones, so downloads are
+    plain file sends. Concurrent cold requests, in any worker, wait on the
+    project's lock file and share one render.
+    """
+
+    def __init__(self):
+        self.app = None
+        self.folder = None
+        self._timer = None
+        self._timer_lock = threading.Lock()
+
+    def init_app(self, app):
+        self.app = app
+        self.folder = app.config.setdefault('PDF_CACHE_FOLDER', os.path.join(app.instance_path, 'pdf-cache'))
+        app.config.setdefault('PDF_CACHE_DELAY', 2.0)
+        app.config.setdefault('PDF_CACHE_BATCH', 50)
+        os.makedirs(self.folder, exist_ok=True)
+        content_versions.subscribe(self._on_change)
+
+    def _path(self, project_id, version):
+        return os.path.join(self.folder, f'project-{project_id}-{version}.pdf')
+
+    def _lock_path(self, project_id):
+        return os.path.join(self.folder, f'project-{project_id}.lock')
+
+    def get(self, project_id):
+        """Path of the current PDF of a project, rendering it if needed; None if there is no such project."""
+        project = Project.query.options(*project_plan()).filter_by(id=project_id).first()
+        if project is None:
+            return None
+        return self._ensure(project)
+
+    def _ensure(self, project):
+        version = project_pdf_version(project)
+        path = self._path(project.id, version)
+        if os.path.exists(path):
+            return path
+        # Файл блокировки не удаляется: иначе другой воркер возьмёт flock на новом inode,
+        # пока первый держит старый, и рендеров станет два
+        with open(self._lock_path(project.id), 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            # Another request may have rendered it while we waited
+            if not os.path.exists(path):
+                atomic_write(path, render_project_pdf(project))
+                self._prune(project.id, version)
+        return path
+
+    def _prune(self, project_id, version=None):
+        """Remove older versions of a project's PDF, or all of them without ``version``."""
+        prefix = f'project-{project_id}-'
+        for name in os.listdir(self.folder):
+            if name.startswith(prefix) and name.endswith('.pdf') and name != f'{prefix}{version}.pdf':
+                try:
+                    os.remove(os.path.join(self.folder, name))
+                except OSError:
+                    pass
+
+    def _on_change(self, tables):
+        if not tables & PDF_TABLES:
+            return
+        # Admin saves come in bursts; check once after they settle
+        with self._timer_lock:
+            if self._timer is not None:
+                self._timer.cancel()
+            self._timer = threading.Timer(self.app.config['PDF_CACHE_DELAY'], self._render_in_background)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _render_in_background(self):
+        with self.app.app_context():
+            try:
+                self.refresh()
+            except Exception as e:
+                self.app.logger.error(f"Failed to render project PDFs: {str(e)}")
+            finally:
+                db.session.remove()
+
+    def refresh(self):
+        """Render the PDFs whose version changed and drop those of deleted projects; returns the render count."""
+        ids = set()
+        rendered = 0
+        last_id = 0
+        batch_size = self.app.config['PDF_CACHE_BATCH']
+        while True:
+            projects = (
+                Project.query.options(*project_plan())
+                .filter(Project.id > last_id).order_by(Project.id).limit(batch_size).all()
+            )
+            if not projects:
+                break
+            for project in projects:
+                ids.add(project.id)
+                # Версия считается без рендера: перерисовываются только изменённые проекты
+                if not os.path.exists(self._path(project.id, project_pdf_version(project))):
+                    self._ensure(project)
+                    rendered += 1
+            last_id = projects[-1].id
+            db.session.expunge_all()
+        # PDF удалённых проектов
+        for name in os.listdir(self.folder):
+            if name.startswith('project-') and name.endswith(('.pdf', '.lock')):
+                project_id = name[len('project-'):].split('-')[0].split('.')[0]
+                if project_id.isdigit() and int(project_id) not in ids:
+                    try:
+                        os.remove(os.path.join(self.folder, name))
+                    except OSError:
+                        pass
+        return rendered
+
+
+project_pdfs = ProjectPDFCache()
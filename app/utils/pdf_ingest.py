@@ -0,0 +1,266 @@
+import json
+import mmap
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+import zlib
+from flask import current_app
+from PIL import Image
+from werkzeug.security import safe_join
+from app.utils.atomic import atomic_write
+from app.utils.file_upload import UPLOAD_URL_PREFIX
+from app.utils.images import DERIVED_DIR, encode_image, image_pipeline, open_image, upload_relative
+
+PDF_EXTENSIONS = {'pdf'}
+PDF_MANIFEST_VERSION = 1
+# Формат превью -> имя файла в _derived/<pdf>/
+PREVIEW_FORMATS = {'webp': 'preview.webp', 'jpeg': 'preview.jpg'}
+WEB_COPY = 'web.pdf'
+
+_PAGE = re.compile(rb'/Type\s*/Page(?![A-Za-z])')
+_OBJECT_STREAM = re.compile(rb'/Type\s*/ObjStm')
+_PDFINFO_PAGES = re.compile(r'^Pages:\s+(\d+)', re.M)
+
+
+# Распаковка потоков объектов идёт кусками, с общим лимитом на файл
+SCAN_CHUNK = 1 << 20
+# Хвост куска, который переносится в следующий: /Type /Page на границе не теряется
+_SCAN_OVERLAP = 64
+
+
+class PDFScanLimitExceeded(ValueError):
+    """Compressed object streams of a PDF unpack to more than the scan limit."""
+
+
+def _count_stream_pages(data, start, end, budget):
+    """/Type /Page matches in one compressed stream and the bytes it unpacked to."""
+    stream = zlib.decompressobj()
+    buf = data[start:end]
+    tail = b''
+    pages = unpacked = 0
+    while buf and not stream.eof:
+        chunk = stream.decompress(buf, SCAN_CHUNK)
+        buf = stream.unconsumed_tail
+        unpacked += len(chunk)
+        if unpacked > budget:
+            raise PDFScanLimitExceeded(f'object streams unpack to more than {budget} bytes')
+        text = tail + chunk
+        cut = max(len(text) - _SCAN_OVERLAP, 0) if buf and not stream.eof else len(text)
+        pages += sum(1 for match in _PAGE.finditer(text) if match.start() < cut)
+        tail = text[cut:]
+    return pages, unpacked
+
+
+def _scan_pages(path, limit):
+    """Page count without external tools: /Type /Page objects, including compressed object streams.
+
+    Raises PDFScanLimitExceeded when the object streams unpack to more
+    than ``limit`` bytes in total.
+    """
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        pages = len(_PAGE.findall(data))
+        for match in _OBJECT_STREAM.finditer(data):
+            start = data.find(b'stream', match.end())
+            end = data.find(b'endstream', start)
+            if start < 0 or end < 0:
+                continue
+            start += len(b'stream')
+            while data[start:start + 1] in (b'\r', b'\n'):
+                start += 1
+            try:
+                found, unpacked = _count_stream_pages(data, start, end, limit)
+            except zlib.error:
+                continue
+            pages += found
+            limit -= unpacked
+    return pages or None
+
+
+def _run(args, timeout):
+    return subprocess.run(args, capture_output=True, timeout=timeout, check=True)
+
+
+class PDFIngest:
+    """Page count, size, first-page preview and a web copy for uploaded PDFs.
+
+    Runs on the image_pipeline workers, never in the request, and writes
+    into ``_derived/<pdf>/`` next to image variants, so the upload collector
+    removes it together with the PDF. The preview needs poppler (pdftoppm)
+    or Ghostscript and the web copy Ghostscript (recompressed, linearized)
+    or qpdf (linearized); without them only pages and size are recorded.
+    """
+
+    def __init__(self):
+        self.app = None
+        self._manifests = {}  # manifest path -> (mtime_ns, manifest)
+
+    def init_app(self, app):
+        self.app = app
+        app.config.setdefault('PDF_PREVIEW_SIZE', 1280)
+        app.config.setdefault('PDF_WEB_COPY', True)
+        # Ghostscript -dPDFSETTINGS: /ebook is 150 dpi images
+        app.config.setdefault('PDF_WEB_SETTINGS', '/ebook')
+        app.config.setdefault('PDF_TOOL_TIMEOUT', 300)
+        # Сколько байт могут дать все потоки объектов при подсчёте страниц без pdfinfo
+        app.config.setdefault('PDF_SCAN_LIMIT', 64 * 1024 * 1024)
+        self.tools = {name: shutil.which(name) for name in ('pdfinfo', 'pdftoppm', 'gs', 'qpdf')}
+        image_pipeline.register(PDF_EXTENSIONS, self.build)
+
+    def build(self, folder, relative):
+        """Process one PDF; False when its manifest already matches the file."""
+        source = safe_join(folder, relative)
+        target = safe_join(folder, DERIVED_DIR, relative)
+        if source is None or target is None or relative.startswith(f'{DERIVED_DIR}/'):
+            return False
+        stat = os.stat(source)
+        manifest_path = os.path.join(target, 'manifest.json')
+        try:
+            with open(manifest_path, encoding='utf-8') as f:
+                manifest = json.load(f)
+            if (manifest.get('source_mtime_ns'), manifest.get('source_size'), manifest.get('version')) == (
+                stat.st_mtime_ns, stat.st_size, PDF_MANIFEST_VERSION
+            ):
+                return False
+        except (OSError, ValueError):
+            pass
+
+        os.makedirs(target, exist_ok=True)
+        width, height = self._preview(source, target)
+        web_size = self._web_copy(source, target, stat.st_size) if self.app.config['PDF_WEB_COPY'] else None
+        manifest = {
+            'version': PDF_MANIFEST_VERSION,
+            'source_mtime_ns': stat.st_mtime_ns,
+            'source_size': stat.st_size,
+            'pages': self._pages(source),
+            'preview_width': width,
+            'preview_height': height,
+            'web_size': web_size,
+        }
+        atomic_write(manifest_path, json.dumps(manifest).encode('utf-8'))
+        return True
+
+    def _pages(self, source):
+        timeout = self.app.config['PDF_TOOL_TIMEOUT']
+        if self.tools['pdfinfo']:
+            try:
+                match = _PDFINFO_PAGES.search(_run([self.tools['pdfinfo'], source], timeout).stdout.decode('utf-8', 'replace'))
+                if match:
+                    return int(match.group(1))
+            except (OSError, subprocess.SubprocessError) as e:
+                self.app.logger.warning(f"pdfinfo failed for {source}: {e}")
+        try:
+            return _scan_pages(source, self.app.config['PDF_SCAN_LIMIT'])
+        except PDFScanLimitExceeded as e:
+            self.app.logger.warning(f"Страницы {source} не посчитаны: {e}")
+            return None
+
+    def _render_first_page(self, source, directory):
+        timeout = self.app.config['PDF_TOOL_TIMEOUT']
+        size = str(self.app.config['PDF_PREVIEW_SIZE'])
+        if self.tools['pdftoppm']:
+            _run([self.tools['pdftoppm'], '-f', '1', '-l', '1', '-singlefile', '-png',
+                  '-scale-to', size, source, os.path.join(directory, 'page')], timeout)
+            return os.path.join(directory, 'page.png')
+        if self.tools['gs']:
+            output = os.path.join(directory, 'page.png')
+            _run([self.tools['gs'], '-q', '-dSAFER', '-dBATCH', '-dNOPAUSE', '-sDEVICE=png16m',
+                  '-dFirstPage=1', '-dLastPage=1', '-r150', f'-sOutputFile={output}', source], timeout)
+            return output
+        return None
+
+    def _preview(self, source, target):
+        """Write the first page as WebP and JPEG; returns its size or (None, None)."""
+        with tempfile.TemporaryDirectory(dir=target, prefix='.tmp-') as directory:
+            try:
+                page = self._render_first_page(source, directory)
+            except (OSError, subprocess.SubprocessError) as e:
+                self.app.logger.warning(f"Не удалось построить превью {source}: {e}")
+                page = None
+            if page is None or not os.path.exists(page):
+                for name in PREVIEW_FORMATS.values():
+                    if os.path.exists(os.path.join(target, name)):
+                        os.remove(os.path.join(target, name))
+                return None, None
+            img = open_image(page)
+            size = self.app.config['PDF_PREVIEW_SIZE']
+            img.thumbnail((size, size), Image.Resampling.LANCZOS)
+            for fmt, name in PREVIEW_FORMATS.items():
+                atomic_write(os.path.join(target, name), encode_image(img, fmt))
+            return img.size
+
+    def _web_copy(self, source, target, source_size):
+        """Write a linearized (and with Ghostscript recompressed) copy; returns its size or None."""
+        timeout = self.app.config['PDF_TOOL_TIMEOUT']
+        path = os.path.join(target, WEB_COPY)
+        fd, tmp_path = tempfile.mkstemp(dir=target, prefix='.tmp-', suffix='.pdf')
+        os.close(fd)
+        try:
+            if self.tools['gs']:
+                _run([self.tools['gs'], '-q', '-dSAFER', '-dBATCH', '-dNOPAUSE', '-sDEVICE=pdfwrite',
+                      f"-dPDFSETTINGS={self.app.config['PDF_WEB_SETTINGS']}", '-dFastWebView=true',
+                      f'-sOutputFile={tmp_path}', source], timeout)
+                # Пересжатие иногда только увеличивает файл
+                keep = os.path.getsize(tmp_path) < source_size
+            elif self.tools['qpdf']:
+                _run([self.tools['qpdf'], '--linearize', source, tmp_path], timeout)
+                keep = True
+            else:
+                keep = False
+            if keep:
+                os.chmod(tmp_path, 0o644)
+                os.replace(tmp_path, path)
+                return os.path.getsize(path)
+        except (OSError, subprocess.SubprocessError) as e:
+            self.app.logger.warning(f"Не удалось оптимизировать {source}: {e}")
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        if os.path.exists(path):
+            os.remove(path)
+        return None
+
+    def _manifest(self, url):
+        relative = upload_relative(url)
+        if relative is None:
+            return None
+        target = safe_join(current_app.config['UPLOAD_FOLDER'], DERIVED_DIR, relative)
+        if target is None:
+            return None
+        manifest_path = os.path.join(target, 'manifest.json')
+        try:
+            mtime = os.stat(manifest_path).st_mtime_ns
+            cached = self._manifests.get(manifest_path)
+            if cached and cached[0] == mtime:
+                return cached[1]
+            with open(manifest_path, encoding='utf-8') as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return None
+        self._manifests[manifest_path] = (mtime, manifest)
+        return manifest
+
+    def meta(self, url):
+        """``{'pages', 'size', 'preview', 'web_file', ...}`` of an uploaded PDF, None until it is processed."""
+        manifest = self._manifest(url)
+        if manifest is None or manifest.get('version') != PDF_MANIFEST_VERSION:
+            return None
+        base = f'{UPLOAD_URL_PREFIX}{DERIVED_DIR}/{upload_relative(url)}/'
+        has_preview = manifest['preview_width'] is not None
+        return {
+            'pages': manifest['pages'],
+            'size': manifest['source_size'],
+            'preview': {fmt: base + name for fmt, name in PREVIEW_FORMATS.items()} if has_preview else None,
+            'preview_width': manifest['preview_width'],
+            'preview_height': manifest['preview_height'],
+            'web_file': base + WEB_COPY if manifest['web_size'] else None,
+            'web_size': manifest['web_size'],
+        }
+
+
+pdf_ingest = PDFIngest()
+
+
+def pdf_meta(url):
+    return pdf_ingest.meta(url)
@@ -0,0 +1,235 @@
+import fcntl
+import hashlib
+import html
+import os
+import re
+import threading
+from datetime import datetime
+import click
+from PIL import Image
+from sqlalchemy import select
+from werkzeug.security import safe_join
+from app import db
+from app.models.category import Category
+from app.models.portfolio_pdf import PortfolioPDF
+from app.models.project import Project, project_category
+from app.utils.content_versions import content_versions, table_names
+from app.utils.file_upload import commit_upload, spool_file
+from app.utils.image_cache import resized_images
+from app.utils.images import image_pipeline, upload_relative
+from app.utils.localization import localized_fields
+from app.utils.pdf import PDFTemplate
+from app.utils.prefetch import project_plan
+
+PORTFOLIO_TABLES = table_names(Project, Category, project_category)
+_TAGS = re.compile(r'<[^>]+>')
+
+PORTFOLIO_TITLES = {'ru': 'Портфолио', 'tk': 'Portfolio', 'en': 'Portfolio'}
+
+
+def _plain(value):
+    # Описания из CKEditor: в PDF только текст
+    return ' '.join(html.unescape(_TAGS.sub(' ', value or '')).split())
+
+
+def _portfolio_header(pdf):
+    pdf.set_font(pdf.base_font, size=8)
+    pdf.cell(0, 6, txt=pdf.context['title'], align='R', ln=True)
+    pdf.set_font(pdf.base_font, size=pdf.template.font_size)
+
+
+PORTFOLIO = PDFTemplate('portfolio', font_size=11, heading_size=18, header=_portfolio_header, page_numbers=True)
+
+
+class PortfolioBuilder:
+    """Builds one portfolio PDF per locale from all projects and registers it as PortfolioPDF.
+
+    Projects are loaded in batches and their images are embedded as
+    downscaled JPEGs from the /img/ cache, so the document stays small
+    whatever the size of the uploads. Builds run in a background thread,
+    started from the admin or, after PORTFOLIO_PDF_DELAY seconds, by a
+    commit that changed projects or categories. A lock file lets only one
+    worker build at a time and keeps the content version of the last build.
+    """
+
+    def __init__(self):
+        self.app = None
+        self._thread = None
+        self._timer = None
+        self._timer_lock = threading.Lock()
+
+    def init_app(self, app):
+        self.app = app
+        app.config.setdefault('PORTFOLIO_PDF_LOCALES', ('ru', 'tk', 'en'))
+        app.config.setdefault('PORTFOLIO_PDF_IMAGE_SIZE', 1280)
+        app.config.setdefault('PORTFOLIO_PDF_MAX_IMAGES', 4)
+        app.config.setdefault('PORTFOLIO_PDF_BATCH', 20)
+        app.config.setdefault('PORTFOLIO_PDF_DELAY', 60.0)
+        app.config.setdefault('PORTFOLIO_PDF_AUTO', True)
+
+        @app.cli.command('portfolio-build')
+        @click.option('--force', is_flag=True, help='Rebuild even if projects have not changed.')
+        def portfolio_build(force):
+            """Build the portfolio PDF for every locale."""
+            for pdf in self.build(force=force) or ():
+                click.echo(f'{pdf.locale}: {pdf.pdf_file}')
+
+        if app.config['PORTFOLIO_PDF_AUTO']:
+            content_versions.subscribe(self._on_change)
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, force=True):
+        """Build in a background thread; False if a build is already running in this worker."""
+        if self.running:
+            return False
+        self._thread = threading.Thread(target=self._build_in_background, args=(force,), daemon=True)
+        self._thread.start()
+        return True
+
+    def _on_change(self, tables):
+        if not tables & PORTFOLIO_TABLES:
+            return
+        # Admin saves come in bursts; build once after they settle
+        with self._timer_lock:
+            if self._timer is not None:
+                self._timer.cancel()
+            self._timer = threading.Timer(self.app.config['PORTFOLIO_PDF_DELAY'], self.start, kwargs={'force': False})
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _build_in_background(self, force):
+        with self.app.app_context():
+            try:
+                self.build(force=force)
+            except Exception as e:
+                db.session.rollback()
+                self.app.logger.error(f"Failed to build portfolio PDF: {str(e)}")
+            finally:
+                db.session.remove()
+
+    def _tag(self):
+        return hashlib.sha1(repr(content_versions.stamp(PORTFOLIO_TABLES)).encode('utf-8')).hexdigest()[:16]
+
+    def build(self, force=False):
+        """Build and register every locale; None if another worker is building or nothing changed."""
+        locales = self.app.config['PORTFOLIO_PDF_LOCALES']
+        lock_path = os.path.join(self.app.instance_path, 'portfolio-build.lock')
+        os.makedirs(self.app.instance_path, exist_ok=True)
+        with open(lock_path, 'a+') as lock:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return None  # another worker is building
+            lock.seek(0)
+            built_tag = lock.read().strip()
+            tag = self._tag()
+            registered = set(db.session.execute(
+                select(PortfolioPDF.locale).where(PortfolioPDF.locale.in_(locales))
+            ).scalars())
+            if not force and built_tag == tag and registered >= set(locales):
+                return None
+            results = [self._register(locale, self.render(locale)) for locale in locales]
+            lock.seek(0)
+            lock.truncate()
+            lock.write(tag)
+        return results
+
+    def render(self, locale):
+        """Write the portfolio for ``locale`` into Uploads/ and return its URL."""
+        folder = self.app.config['UPLOAD_FOLDER']
+        pdf = PORTFOLIO.new(locale=locale, title=PORTFOLIO_TITLES.get(locale, 'Portfolio'))
+        pdf.add_page()
+        pdf.heading(pdf.context['title'], size=24)
+
+        t = localized_fields(Project, locale)
+        c = localized_fields(Category, locale)
+        last_id = 0
+        batch_size = self.app.config['PORTFOLIO_PDF_BATCH']
+        while True:
+            projects = (
+                Project.query.options(*project_plan())
+                .filter(Project.id > last_id).order_by(Project.id).limit(batch_size).all()
+            )
+            if not projects:
+                break
+            for project in projects:
+                self._project_page(pdf, project, t, c, folder)
+            last_id = projects[-1].id
+            # Batch is on the page now; let the ORM objects go
+            db.session.expunge_all()
+
+        fd, tmp_path = spool_file(folder)
+        os.close(fd)
+        try:
+            pdf.output(tmp_path, 'F')
+            digest = hashlib.sha256()
+            with open(tmp_path, 'rb') as f:
+                for chunk in iter(lambda: f.read(64 * 1024), b''):
+                    digest.update(chunk)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+        return commit_upload(tmp_path, digest.hexdigest(), 'pdf', folder)
+
+    def _project_page(self, pdf, project, t, c, folder):
+        pdf.add_page()
+        pdf.heading(t.title(project))
+        categories = ', '.join(c.title(cat) for cat in project.categories)
+        if categories:
+            pdf.set_font(pdf.base_font, size=9)
+            pdf.cell(0, 6, txt=categories, ln=True, align='C')
+            pdf.set_font(pdf.base_font, size=pdf.template.font_size)
+        pdf.ln(4)
+        description = _plain(t.description(project))
+        if description:
+            pdf.multi_cell(0, 6, txt=description)
+            pdf.ln(4)
+
+        urls = [project.main_image] + list(project.images or [])
+        images = [path for path in (self._image(url, folder) for url in urls if url) if path]
+        for path in images[:self.app.config['PORTFOLIO_PDF_MAX_IMAGES']]:
+            self._place_image(pdf, path)
+
+    def _image(self, url, folder):
+        relative = upload_relative(url)
+        source = safe_join(folder, relative) if relative else None
+        if source is None or not os.path.isfile(source):
+            return None
+        size = self.app.config['PORTFOLIO_PDF_IMAGE_SIZE']
+        try:
+            return resized_images.get(source, size, size, 'jpeg')
+        except OSError as e:
+            self.app.logger.warning(f"Portfolio PDF: skipped image {url}: {e}")
+            return None
+
+    def _place_image(self, pdf, path):
+        with Image.open(path) as img:
+            width, height = img.size
+        w = pdf.w - pdf.l_margin - pdf.r_margin
+        h = w * height / width
+        max_h = (pdf.h - pdf.t_margin - pdf.b_margin) * 0.6
+        if h > max_h:
+            w, h = max_h * width / height, max_h
+        if pdf.get_y() + h > pdf.page_break_trigger:
+            pdf.add_page()
+        x = (pdf.w - w) / 2
+        pdf.image(path, x=x, y=pdf.get_y(), w=w, h=h, type='JPG')
+        pdf.set_y(pdf.get_y() + h + 4)
+
+    def _register(self, locale, url):
+        # One row per locale; the previous file loses its reference and is collected later
+        pdf = PortfolioPDF.query.filter_by(locale=locale).order_by(PortfolioPDF.id.desc()).first()
+        if pdf is None:
+            pdf = PortfolioPDF(locale=locale)
+            db.session.add(pdf)
+        pdf.pdf_file = url
+        pdf.created_at = datetime.utcnow()
+        db.session.commit()
+        image_pipeline.submit([url], (PortfolioPDF.__table__.name,))
+        return pdf
+
+
+portfolio_builder = PortfolioBuilder()
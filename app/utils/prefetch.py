@@ -0,0 +1,23 @@
+from sqlalchemy.orm import joinedload, selectinload
+from app.models.about import About, AboutItem
+from app.models.project import Project
+from app.models.service import Service
+
+# Loader options per endpoint, so to_dict graphs never hit lazy loads.
+# Each plan adds a fixed number of queries regardless of the row count.
+
+
+def project_plan():
+    return (selectinload(Project.categories),)
+
+
+def service_plan():
+    return (
+        joinedload(Service.category),
+        selectinload(Service.projects).selectinload(Project.categories),
+        selectinload(Service.blogs),
+    )
+
+
+def about_plan():
+    return (selectinload(About.items).selectinload(AboutItem.categories),)
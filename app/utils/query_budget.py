@@ -0,0 +1,45 @@
+import threading
+from functools import wraps
+from flask import current_app, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+_local = threading.local()
+
+
+class QueryBudgetExceeded(RuntimeError):
+    pass
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _record_statement(conn, cursor, statement, parameters, context, executemany):
+    statements = getattr(_local, 'statements', None)
+    if statements is not None:
+        statements.append(statement)
+
+
+def query_budget(limit):
+    """Fail (QUERY_BUDGET_STRICT) or warn when a GET view runs more than ``limit`` SQL statements."""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(*args, **kwargs)
+
+            outer = getattr(_local, 'statements', None)
+            _local.statements = statements = []
+            try:
+                result = view(*args, **kwargs)
+            finally:
+                _local.statements = outer
+                if outer is not None:
+                    outer.extend(statements)
+
+            if len(statements) > limit:
+                message = f"{request.endpoint} ran {len(statements)} queries, budget is {limit}"
+                if current_app.config.get('QUERY_BUDGET_STRICT'):
+                    raise QueryBudgetExceeded(message + '\n' + '\n'.join(statements))
+                current_app.logger.warning(message)
+            return result
+        return wrapper
+    return decorator
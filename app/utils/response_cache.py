@@ -0,0 +1,195 @@
+import gzip
+import hashlib
+import threading
+from collections import OrderedDict, namedtuple
+from datetime import datetime, timezone
+from functools import wraps
+from flask import Response, current_app, request
+from flask_babel import get_locale
+from app.utils.content_versions import content_versions, table_names
+
+try:
+    import brotli
+except ImportError:  # brotli необязателен, без него отдаём только gzip
+    brotli = None
+
+CachedResponse = namedtuple('CachedResponse', 'stamp tables status body mimetype encoded')
+
+# Preferred first when the client accepts several with the same q
+ENCODINGS = ('br', 'gzip')
+# Промах кэша сжимается прямо в запросе: brotli-11 на сотнях КБ JSON — секунды,
+# brotli-5 и gzip-6 — миллисекунды при почти том же размере
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+# Заранее сжатые файлы static_export: время не важно, важен размер
+STATIC_GZIP_LEVEL = 9
+STATIC_BROTLI_QUALITY = 11
+
+
+def compress(body, min_size=1024, gzip_level=GZIP_LEVEL, brotli_quality=BROTLI_QUALITY):
+    """Encoded variants of ``body`` keyed by Content-Encoding, only those that are smaller."""
+    if len(body) < min_size:
+        return {}
+    variants = {'gzip': gzip.compress(body, compresslevel=gzip_level, mtime=0)}
+    if brotli is not None:
+        variants['br'] = brotli.compress(body, quality=brotli_quality)
+    return {encoding: data for encoding, data in variants.items() if len(data) < len(body)}
+
+
+def cache_key(args=()):
+    """Endpoint + view args + the query ``args`` the view reads + resolved locale.
+
+    Other query arguments do not change the response, so ``?x=1`` hits the
+    same entry instead of creating (and compressing) a new one.
+    """
+    values = tuple(
+        (key, tuple(v.strip() for v in request.args.getlist(key)))
+        for key in sorted(args)
+        if any(v.strip() for v in request.args.getlist(key))
+    )
+    view_args = tuple(sorted((request.view_args or {}).items()))
+    return (request.endpoint, view_args, values, str(get_locale()) or 'en')
+
+
+def _etag(key, stamp):
+    return hashlib.sha1(repr((key, stamp)).encode('utf-8')).hexdigest()
+
+
+def _last_modified(stamp):
+    newest = max(stamp, default=0)
+    if not newest:
+        return None
+    return datetime.fromtimestamp(newest // 10**9, tz=timezone.utc)
+
+
+def _not_modified(etag, last_modified):
+    """ETag to answer a 304 with, or None when the client's copy is stale."""
+    if request.if_none_match:
+        # Any encoded variant of the same content is still fresh
+        for tag in (etag, *(f'{etag}-{encoding}' for encoding in ENCODINGS)):
+            if request.if_none_match.contains_weak(tag):
+                return tag
+        return None
+    if last_modified and request.if_modified_since and last_modified <= request.if_modified_since:
+        return etag
+    return None
+
+
+class ResponseCache:
+    """In-process LRU of serialized GET responses, validated by content versions."""
+
+    def __init__(self, maxsize=512, compress_min_size=1024):
+        self.maxsize = maxsize
+        self.compress_min_size = compress_min_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.maxsize = app.config.setdefault('RESPONSE_CACHE_SIZE', self.maxsize)
+        self.compress_min_size = app.config.setdefault('RESPONSE_COMPRESS_MIN_SIZE', self.compress_min_size)
+        content_versions.subscribe(self.invalidate)
+
+    def get(self, key, stamp):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry.stamp != stamp:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key, stamp, tables, response):
+        body = response.get_data()
+        # Compressed once here, every hit afterwards just picks a variant
+        entry = CachedResponse(
+            stamp, tables, response.status_code, body, response.mimetype, compress(body, self.compress_min_size)
+        )
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return entry
+
+    def invalidate(self, tables):
+        with self._lock:
+            for key in [k for k, e in self._entries.items() if e.tables & tables]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+response_cache = ResponseCache()
+
+
+def _encoded_response(entry):
+    encoding = request.accept_encodings.best_match([e for e in ENCODINGS if e in entry.encoded])
+    if encoding is None:
+        return Response(entry.body, status=entry.status, mimetype=entry.mimetype), None
+    response = Response(entry.encoded[encoding], status=entry.status, mimetype=entry.mimetype)
+    response.content_encoding = encoding
+    return response, encoding
+
+
+def _with_validators(response, etag, last_modified):
+    from app import LANGUAGES  # app импортирует этот модуль до объявления LANGUAGES
+    if request.args.get('lang') not in LANGUAGES:
+        # Язык выбран по Accept-Language: копия в браузере или CDN годится только для него
+        response.vary.add('Accept-Language')
+    response.set_etag(etag)
+    if last_modified:
+        response.last_modified = last_modified
+    # Clients must revalidate; the ETag makes that a cheap 304
+    response.cache_control.no_cache = True
+    return response
+
+
+def cached_response(*sources, args=()):
+    """Cache a GET view's 200 response until one of ``sources`` (models or tables) changes.
+
+    ``args`` are the query arguments the view reads; only they go into the
+    cache key. Responses carry a strong ETag and Last-Modified derived from
+    the content versions, so conditional requests get a 304 without running
+    the view.
+    """
+    tables = table_names(*sources)
+    query_args = tuple(args)
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(*args, **kwargs)
+
+            key = cache_key(query_args)
+            # Stamp is taken before querying so cached data is never older than it
+            stamp = content_versions.stamp(tables)
+            etag = _etag(key, stamp)
+            last_modified = _last_modified(stamp)
+
+            matched = _not_modified(etag, last_modified)
+            if matched:
+                response = Response(status=304)
+                etag = matched
+            else:
+                use_cache = current_app.config.get('RESPONSE_CACHE_ENABLED', True)
+                entry = response_cache.get(key, stamp) if use_cache else None
+                if entry is None:
+                    response = current_app.make_response(view(*args, **kwargs))
+                    if response.status_code != 200 or response.is_streamed:
+                        return response
+                    if not use_cache:
+                        return _with_validators(response, etag, last_modified)
+                    entry = response_cache.set(key, stamp, tables, response)
+                response, encoding = _encoded_response(entry)
+                if encoding:
+                    # Each representation needs its own strong ETag
+                    etag = f'{etag}-{encoding}'
+            response.vary.add('Accept-Encoding')
+            return _with_validators(response, etag, last_modified)
+        return wrapper
+    return decorator
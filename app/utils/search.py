@@ -0,0 +1,317 @@
+import html
+import re
+from collections import OrderedDict
+import click
+from sqlalchemy import (
+    Integer, bindparam, case, column, event, false, literal, literal_column, select, text, table as sql_table
+)
+from sqlalchemy.exc import InterfaceError, OperationalError
+from app import db, LANGUAGES
+from app.models.blog import Blog
+from app.models.category import Category
+from app.models.project import Project, project_category
+from app.models.service import Service
+from app.utils.localization import current_locale
+from app.utils.slugify import transliterate
+
+_TAGS = re.compile(r'<[^>]+>')
+_WORDS = re.compile(r'\w+')
+
+# rowid = ref_id * 4 + code, so a write replaces its row without scanning
+KIND_CODES = {'project': 1, 'blog': 2, 'service': 3}
+
+
+def _plain(value):
+    """Text without CKEditor markup, HTML-escaped so snippets only carry <mark> tags."""
+    if not value:
+        return ''
+    if isinstance(value, (list, tuple)):
+        value = ', '.join(str(v) for v in value)
+    return html.escape(' '.join(html.unescape(_TAGS.sub(' ', str(value))).split()), quote=False)
+
+
+def _in_locale(row, name, locale):
+    """Like localized_fields: ``<name>_<locale>``, else ``<name>_en``."""
+    column = f'{name}_{locale}'
+    return _plain(row[column] if column in row else row.get(f'{name}_en'))
+
+
+def _per_locale(row, name):
+    return {locale: _in_locale(row, name, locale) for locale in LANGUAGES}
+
+
+def _categories(connection, project_id):
+    categories = Category.__table__
+    return connection.execute(
+        select(categories).join(project_category, project_category.c.category_id == categories.c.id)
+        .where(project_category.c.project_id == project_id)
+    ).mappings().all()
+
+
+def _project_document(connection, row):
+    description, content = _per_locale(row, 'description'), _per_locale(row, 'content')
+    body = {locale: ' '.join(v for v in (description[locale], content[locale]) if v) for locale in LANGUAGES}
+    # Проект находится и по названиям своих категорий
+    tags = [_plain(row[f'tags_{locale}']) for locale in LANGUAGES if f'tags_{locale}' in row]
+    for category in _categories(connection, row['id']):
+        tags.extend(_per_locale(category, 'title').values())
+    return _per_locale(row, 'title'), body, ' '.join(dict.fromkeys(t for t in tags if t))
+
+
+def _blog_document(connection, row):
+    return _per_locale(row, 'title'), _per_locale(row, 'description'), _plain(row['tags'])
+
+
+def _service_document(connection, row):
+    # Services have no title of their own; the category names it
+    title = dict.fromkeys(LANGUAGES, '')
+    if row['category_id']:
+        category = connection.execute(
+            select(Category.__table__).where(Category.__table__.c.id == row['category_id'])
+        ).mappings().first()
+        if category:
+            title = _per_locale(category, 'title')
+    return title, _per_locale(row, 'content'), ''
+
+
+SOURCES = {
+    'project': (Project, _project_document),
+    'blog': (Blog, _blog_document),
+    'service': (Service, _service_document),
+}
+KIND_MODELS = {model: kind for kind, (model, _) in SOURCES.items()}
+# title_<locale> и body_<locale>: подсветка и сниппет на языке запроса
+TEXT_COLUMNS = (*(f'title_{locale}' for locale in LANGUAGES), *(f'body_{locale}' for locale in LANGUAGES), 'tags', 'translit')
+# bm25: kind, ref_id, заголовки, тексты, теги, транслит
+BM25_WEIGHTS = ', '.join(map(str, (0, 0, *(10.0,) * len(LANGUAGES), *(1.0,) * len(LANGUAGES), 5.0, 2.0)))
+_session_key = 'search_index.pending'
+
+
+def match_expression(query):
+    """FTS5 MATCH for every word as a prefix, in its original and transliterated form."""
+    terms = []
+    for word in _WORDS.findall(query.lower()):
+        variants = sorted({v for v in (word, transliterate(word)) if v})
+        terms.append('(' + ' OR '.join(f'"{v}"*' for v in variants) + ')')
+    return ' AND '.join(terms)
+
+
+class SearchIndex:
+    """SQLite FTS5 index over projects, blogs and services.
+
+    Titles and texts are stored per locale, so highlights and snippets come
+    in the language of the request. Rows are rewritten after each flush
+    inside the same transaction, so the index commits and rolls back
+    together with the content; bulk query.delete()/update() resync the
+    affected kind. Until ``flask search-reindex`` has created the table,
+    and on other databases, search() returns None and callers fall back
+    to ilike.
+    """
+
+    table = 'search_index'
+
+    def __init__(self):
+        self._ready = False
+
+    def init_app(self, app):
+        # Без запросов к БД при старте: `flask db upgrade` тоже создаёт приложение
+        app.cli.command('search-reindex')(self._reindex_command)
+        event.listen(db.session, 'before_flush', self._before_flush)
+        event.listen(db.session, 'after_flush', self._after_flush)
+        event.listen(db.session, 'do_orm_execute', self._on_orm_execute)
+
+    def ready(self, connection=None):
+        """True once the FTS5 table exists in its current layout; ``flask search-reindex`` creates it."""
+        if self._ready:
+            return True
+        connection = connection if connection is not None else db.session.connection()
+        if connection.dialect.name != 'sqlite':
+            return False
+        # Таблица со старым набором колонок до переиндексации не используется
+        self._ready = connection.execute(
+            text('SELECT 1 FROM pragma_table_info(:name) WHERE name = :column'),
+            {'name': self.table, 'column': TEXT_COLUMNS[0]}
+        ).first() is not None
+        return self._ready
+
+    def _reindex_command(self):
+        """Recreate the full-text search table and fill it."""
+        if db.engine.dialect.name != 'sqlite':
+            raise click.ClickException('Full-text search is not available for this database')
+        try:
+            # Пересоздаётся целиком: так подхватывается и новый набор колонок
+            db.session.execute(text(f'DROP TABLE IF EXISTS {self.table}'))
+            db.session.execute(text(
+                f"CREATE VIRTUAL TABLE {self.table} USING fts5("
+                f"kind UNINDEXED, ref_id UNINDEXED, {', '.join(TEXT_COLUMNS)}, "
+                "tokenize = 'unicode61 remove_diacritics 2')"
+            ))
+        except OperationalError as e:
+            db.session.rollback()
+            raise click.ClickException(f'FTS5 is not available: {e}')
+        self._ready = True
+        click.echo(f'Indexed {self.rebuild()} documents')
+
+    def rebuild(self):
+        connection = db.session.connection()
+        connection.execute(text(f'DELETE FROM {self.table}'))
+        total = sum(self.index_kind(connection, kind) for kind in SOURCES)
+        db.session.commit()
+        return total
+
+    def index_kind(self, connection, kind):
+        """Rewrite every row of ``kind`` and drop rows whose object is gone."""
+        model = SOURCES[kind][0]
+        connection.execute(
+            text(f'DELETE FROM {self.table} WHERE kind = :kind AND ref_id NOT IN (SELECT id FROM {model.__table__.name})'),
+            {'kind': kind}
+        )
+        ids = connection.execute(select(model.__table__.c.id)).scalars().all()
+        for ref_id in ids:
+            self.index(connection, kind, ref_id)
+        return len(ids)
+
+    def index(self, connection, kind, ref_id):
+        model, document = SOURCES[kind]
+        rowid = ref_id * 4 + KIND_CODES[kind]
+        connection.execute(text(f'DELETE FROM {self.table} WHERE rowid = :rowid'), {'rowid': rowid})
+        row = connection.execute(select(model.__table__).where(model.__table__.c.id == ref_id)).mappings().first()
+        if row is None:
+            return
+        title, body, tags = document(connection, row)
+        values = {f'title_{locale}': title[locale] for locale in LANGUAGES}
+        values.update({f'body_{locale}': body[locale] for locale in LANGUAGES})
+        values['tags'] = tags
+        values['translit'] = transliterate(' '.join(dict.fromkeys(v for v in values.values() if v)))
+        connection.execute(
+            text(f"INSERT INTO {self.table} (rowid, kind, ref_id, {', '.join(TEXT_COLUMNS)}) "
+                 f"VALUES (:rowid, :kind, :ref_id, {', '.join(':' + name for name in TEXT_COLUMNS)})"),
+            {'rowid': rowid, 'kind': kind, 'ref_id': ref_id, **values}
+        )
+
+    def matches(self, query, kind):
+        """Subquery ``(ref_id, rank)`` of the ``kind`` rows matching ``query``; lower rank is better.
+
+        Views join it, so paging and COUNT(*) cover every match rather than
+        a capped id list. None when full-text search is unavailable.
+        """
+        if db.session.get_bind().dialect.name != 'sqlite' or not self.ready():
+            return None
+        match = match_expression(query)
+        index = sql_table(self.table, column('kind'), column('ref_id', Integer))
+        if not match:
+            return select(index.c.ref_id, literal(0).label('rank')).where(false()).subquery('search_matches')
+        return (
+            select(index.c.ref_id, literal_column(f'bm25({self.table}, {BM25_WEIGHTS})').label('rank'))
+            .where(text(f'{self.table} MATCH :search_match').bindparams(search_match=match))
+            .where(index.c.kind == kind)
+            .subquery('search_matches')
+        )
+
+    def search(self, query, kind=None, limit=500, locale=None, ids=None):
+        """Ranked hits as ``{ref_id: {'type', 'id', 'title', 'snippet'}}``, best first.
+
+        Without ``kind`` the keys are ``(kind, ref_id)``, since ids repeat
+        across kinds. ``ids`` limits the hits to those rows, e.g. the page
+        a view is about to return. ``title`` and ``snippet`` are in
+        ``locale`` (the request's by default). Returns None when full-text
+        search is unavailable.
+        """
+        if db.session.get_bind().dialect.name != 'sqlite':
+            return None
+        match = match_expression(query)
+        if not match:
+            return OrderedDict()
+        locale = locale or current_locale()
+        position = LANGUAGES.index(locale if locale in LANGUAGES else 'en')
+        title_column = 2 + position
+        body_column = 2 + len(LANGUAGES) + position
+        statement = text(
+            f"SELECT kind, ref_id, highlight({self.table}, {title_column}, '<mark>', '</mark>') AS title, "
+            f"snippet({self.table}, {body_column}, '<mark>', '</mark>', '…', 24) AS snippet "
+            f"FROM {self.table} WHERE {self.table} MATCH :match AND (:kind IS NULL OR kind = :kind) "
+            + ("AND ref_id IN :ids " if ids is not None else "")
+            + f"ORDER BY bm25({self.table}, {BM25_WEIGHTS}) LIMIT :limit"
+        )
+        params = {'match': match, 'kind': kind, 'limit': limit}
+        if ids is not None:
+            statement = statement.bindparams(bindparam('ids', expanding=True))
+            params['ids'] = list(ids)
+        try:
+            rows = db.session.execute(statement, params).mappings().all()
+        except (OperationalError, InterfaceError):
+            # Таблицы ещё нет (или она старого формата): отдельной проверкой не тратим запрос из бюджета
+            db.session.rollback()
+            return None
+        return OrderedDict(
+            (row['ref_id'] if kind else (row['kind'], row['ref_id']),
+             {'type': row['kind'], 'id': row['ref_id'], 'title': row['title'], 'snippet': row['snippet']})
+            for row in rows
+        )
+
+    def _before_flush(self, session, flush_context, instances):
+        # Связи удаляемой или переименованной категории: после flush их уже не найти
+        pending = session.info.setdefault(_session_key, set())
+        categories = [obj for obj in session.dirty | session.deleted if isinstance(obj, Category) and obj.id]
+        if not categories or not self.ready(session.connection()):
+            return
+        ids = [category.id for category in categories]
+        connection = session.connection()
+        services = Service.__table__
+        pending.update(('service', ref_id) for ref_id in connection.execute(
+            select(services.c.id).where(services.c.category_id.in_(ids))
+        ).scalars())
+        pending.update(('project', ref_id) for ref_id in connection.execute(
+            select(project_category.c.project_id).where(project_category.c.category_id.in_(ids))
+        ).scalars())
+
+    def _after_flush(self, session, flush_context):
+        # After the flush, so project_category rows are already written
+        pending = session.info.pop(_session_key, set())
+        for obj in session.new | session.dirty | session.deleted:
+            kind = KIND_MODELS.get(type(obj))
+            if kind:
+                pending.add((kind, obj.id))
+        if not pending or not self.ready(session.connection()):
+            return
+        connection = session.connection()
+        for kind, ref_id in sorted(pending):
+            self.index(connection, kind, ref_id)
+
+    def _on_orm_execute(self, orm_execute_state):
+        # Bulk query.delete()/update() (seed.py, admin actions) skip the flush events
+        mapper = orm_execute_state.bind_mapper
+        if not (orm_execute_state.is_delete or orm_execute_state.is_update) or mapper is None:
+            return None
+        if mapper.class_ is Category:
+            kinds = ('project', 'service')
+        elif mapper.class_ in KIND_MODELS:
+            kinds = (KIND_MODELS[mapper.class_],)
+        else:
+            return None
+        result = orm_execute_state.invoke_statement()
+        connection = orm_execute_state.session.connection()
+        if self.ready(connection):
+            for kind in kinds:
+                self.index_kind(connection, kind)
+        return result
+
+
+search_index = SearchIndex()
+
+
+def relevance_order(column, hits):
+    """ORDER BY expression following the rank order of ``hits``."""
+    return case({ref_id: position for position, ref_id in enumerate(hits)}, value=column, else_=len(hits))
+
+
+def with_highlight(data, hits):
+    if hits and data.get('id') in hits:
+        hit = hits[data['id']]
+        data['highlight'] = {'title': hit['title'], 'snippet': hit['snippet']}
+    return data
+
+
+def include_object(object, name, type_, reflected, compare_to):
+    """Keep Alembic autogenerate away from the FTS5 table and its shadow tables."""
+    return not (type_ == 'table' and name.startswith(SearchIndex.table))
@@ -0,0 +1,168 @@
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+import click
+from sqlalchemy import select
+from app import db, LANGUAGES
+from app.models.blog import Blog
+from app.models.project import Project
+from app.utils.bundle import BUNDLE_TABLES
+from app.utils.content_versions import content_versions
+from app.utils.response_cache import STATIC_BROTLI_QUALITY, STATIC_GZIP_LEVEL, compress
+
+# GET endpoints whose default response depends only on ?lang=
+STATIC_ENDPOINTS = (
+    '/api/banners', '/api/clients', '/api/categories', '/api/services', '/api/partners',
+    '/api/reviews', '/api/contact', '/api/about', '/api/bundle',
+)
+# Lists exported for every ?page= at the default per_page
+PAGED_ENDPOINTS = ('/api/projects', '/api/blog/')
+DETAIL_ENDPOINTS = (('/api/projects/{}', Project), ('/api/blog/{}', Blog))
+
+
+def export_path(root, url, locale, page=None):
+    """File for ``url?lang=<locale>[&page=<page>]``; mirrors the map in deployment/nginx.conf."""
+    name = f'page-{page}' if page else 'index'
+    return os.path.join(root, url.strip('/'), locale, f'{name}.json')
+
+
+class StaticExporter:
+    """Snapshot of the public API as plain JSON files for nginx.
+
+    Every export renders into a fresh release directory and then swaps the
+    ``current`` symlink, so nginx never serves a mix of two versions. A 404
+    (no contact or about row yet) leaves its file out and nginx passes the
+    request to the app; any other error fails the export.
+    """
+
+    keep_releases = 2
+
+    def __init__(self):
+        self.app = None
+        self.folder = None
+        self._lock = threading.Lock()
+        self._timer = None
+        self._timer_lock = threading.Lock()
+
+    def init_app(self, app):
+        self.app = app
+        self.folder = app.config.setdefault('STATIC_EXPORT_FOLDER', os.path.join(app.instance_path, 'static-export'))
+        app.config.setdefault('STATIC_EXPORT_AUTO', True)
+        app.config.setdefault('STATIC_EXPORT_DELAY', 2.0)
+        app.cli.command('export-static')(self._export_command)
+        if app.config['STATIC_EXPORT_AUTO']:
+            content_versions.subscribe(self._on_change)
+
+    def _export_command(self):
+        """Write all public API responses as static JSON files."""
+        release, count = self.export()
+        click.echo(f'Exported {count} files to {release}')
+
+    def _on_change(self, tables):
+        if not tables & BUNDLE_TABLES:
+            return
+        # Admin saves come in bursts; export once after they settle
+        with self._timer_lock:
+            if self._timer is not None:
+                self._timer.cancel()
+            self._timer = threading.Timer(self.app.config['STATIC_EXPORT_DELAY'], self._export_in_background)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _export_in_background(self):
+        with self.app.app_context():
+            try:
+                self.export()
+            except Exception as e:
+                self.app.logger.error(f"Failed to export static API: {str(e)}")
+
+    def export(self):
+        with self._lock:
+            tag = hashlib.sha1(repr(content_versions.stamp(BUNDLE_TABLES)).encode('utf-8')).hexdigest()[:16]
+            releases = os.path.join(self.folder, 'releases')
+            release = os.path.join(releases, tag)
+            count = 0
+            if not os.path.isdir(release):
+                os.makedirs(releases, exist_ok=True)
+                staging = tempfile.mkdtemp(prefix=f'.{tag}-', dir=releases)
+                try:
+                    count = self._render(staging)
+                    os.chmod(staging, 0o755)
+                    os.replace(staging, release)
+                except OSError:
+                    # Another worker already published this version
+                    shutil.rmtree(staging, ignore_errors=True)
+                    if not os.path.isdir(release):
+                        raise
+                except BaseException:
+                    shutil.rmtree(staging, ignore_errors=True)
+                    raise
+            self._activate(tag)
+            self._prune(releases, tag)
+            return release, count
+
+    def _render(self, root):
+        client = self.app.test_client()
+        count = 0
+
+        def save(url, locale, page=None):
+            query = {'lang': locale}
+            if page:
+                query['page'] = page
+            # Fresh app context per request: Babel caches the locale on g
+            with self.app.app_context():
+                response = client.get(url, query_string=query)
+            if response.status_code == 404:
+                # Например, /api/contact без строки в БД: файла нет, nginx спросит @api
+                return None
+            if response.status_code != 200:
+                raise RuntimeError(f'{url} ({locale}) returned {response.status_code}')
+            path = export_path(root, url, locale, page)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            body = response.get_data()
+            with open(path, 'wb') as f:
+                f.write(body)
+            # For gzip_static / brotli_static in nginx
+            for encoding, data in compress(
+                body, self.app.config['RESPONSE_COMPRESS_MIN_SIZE'], STATIC_GZIP_LEVEL, STATIC_BROTLI_QUALITY
+            ).items():
+                with open(f"{path}.{'gz' if encoding == 'gzip' else encoding}", 'wb') as f:
+                    f.write(data)
+            return response
+
+        for locale in LANGUAGES:
+            for url in STATIC_ENDPOINTS:
+                count += save(url, locale) is not None
+            for url in PAGED_ENDPOINTS:
+                first = save(url, locale)
+                if first is None:
+                    continue
+                pages = first.get_json().get('pages') or 1
+                count += 1 + sum(save(url, locale, page) is not None for page in range(1, pages + 1))
+            for url, model in DETAIL_ENDPOINTS:
+                for ref_id in db.session.execute(select(model.id)).scalars().all():
+                    count += save(url.format(ref_id), locale) is not None
+        return count
+
+    def _activate(self, tag):
+        link = os.path.join(self.folder, 'current')
+        tmp_link = f'{link}.{os.getpid()}'
+        if os.path.lexists(tmp_link):
+            os.remove(tmp_link)
+        os.symlink(os.path.join('releases', tag), tmp_link)
+        os.replace(tmp_link, link)
+
+    def _prune(self, releases, tag):
+        # The previous release stays for requests nginx is still answering from it
+        names = sorted(
+            (name for name in os.listdir(releases) if not name.startswith('.') and name != tag),
+            key=lambda name: os.path.getmtime(os.path.join(releases, name)),
+            reverse=True,
+        )
+        for name in names[self.keep_releases - 1:]:
+            shutil.rmtree(os.path.join(releases, name), ignore_errors=True)
+
+
+static_exporter = StaticExporter()
@@ -0,0 +1,101 @@
+from functools import partial
+import click
+from sqlalchemy import event, inspect, select
+from app import db
+from app.models.blog import Blog, blog_tag
+from app.models.project import Project, project_tag
+
+# Модель -> (таблица тегов, колонка id, {locale: колонка со списком})
+TAGGED = {
+    Project: (project_tag, 'project_id', {'ru': 'tags_ru', 'en': 'tags_en'}),
+    Blog: (blog_tag, 'blog_id', {None: 'tags'}),
+}
+TAG_MAX_LENGTH = 255
+
+
+def tag_key(tag):
+    """Case- and whitespace-insensitive form a tag is looked up by."""
+    return ' '.join(str(tag).split()).casefold()[:TAG_MAX_LENGTH]
+
+
+def string_list(value):
+    """``"a, b"`` from API arguments as ``['a', 'b']``; lists pass through, empty values give []."""
+    if isinstance(value, (list, tuple)):
+        items = value
+    elif isinstance(value, str):
+        items = value.split(',')
+    else:
+        items = []
+    return [item.strip() for item in items if isinstance(item, str) and item.strip()]
+
+
+def tag_rows(model, obj_id, values):
+    """Rows of the tag table for ``values`` = ``{column: list}`` of one object."""
+    table, id_column, columns = TAGGED[model]
+    rows = {}
+    for locale, name in columns.items():
+        for tag in string_list(values.get(name)):
+            key = tag_key(tag)
+            row = {id_column: obj_id, 'tag_key': key, 'tag': tag[:TAG_MAX_LENGTH]}
+            if locale:
+                row['locale'] = locale
+            rows.setdefault((locale, key), row)
+    return list(rows.values())
+
+
+def tagged(model, tag):
+    """WHERE clause for objects of ``model`` having ``tag`` in any language; uses the tag_key index."""
+    table, id_column, _ = TAGGED[model]
+    return model.id.in_(select(table.c[id_column]).where(table.c.tag_key == tag_key(tag)))
+
+
+def _write(model, connection, target):
+    table, id_column, columns = TAGGED[model]
+    connection.execute(table.delete().where(table.c[id_column] == target.id))
+    rows = tag_rows(model, target.id, {name: getattr(target, name) for name in columns.values()})
+    if rows:
+        connection.execute(table.insert(), rows)
+
+
+def _after_insert(model, mapper, connection, target):
+    _write(model, connection, target)
+
+
+def _after_update(model, mapper, connection, target):
+    state = inspect(target)
+    if any(state.attrs[name].history.has_changes() for name in TAGGED[model][2].values()):
+        _write(model, connection, target)
+
+
+def _before_delete(model, mapper, connection, target):
+    # SQLite не выполняет ON DELETE CASCADE без PRAGMA foreign_keys
+    table, id_column, _ = TAGGED[model]
+    connection.execute(table.delete().where(table.c[id_column] == target.id))
+
+
+for _model in TAGGED:
+    event.listen(_model, 'after_insert', partial(_after_insert, _model))
+    event.listen(_model, 'after_update', partial(_after_update, _model))
+    event.listen(_model, 'before_delete', partial(_before_delete, _model))
+
+
+def reindex_tags():
+    """Rebuild the tag tables from the list columns; returns the number of rows written."""
+    written = 0
+    for model, (table, id_column, columns) in TAGGED.items():
+        source = model.__table__
+        db.session.execute(table.delete())
+        for row in db.session.execute(select(source.c.id, *(source.c[name] for name in columns.values()))).mappings():
+            rows = tag_rows(model, row['id'], row)
+            if rows:
+                db.session.execute(table.insert(), rows)
+                written += len(rows)
+    db.session.commit()
+    return written
+
+
+def init_app(app):
+    @app.cli.command('tags-reindex')
+    def tags_reindex():
+        """Rebuild project_tag and blog_tag, e.g. after writes that bypassed the ORM."""
+        click.echo(f'Indexed {reindex_tags()} tags')
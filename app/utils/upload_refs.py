@@ -0,0 +1,365 @@
+import fcntl
+import os
+import re
+import shutil
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from functools import partial
+import click
+from sqlalchemy import event, inspect, select
+from sqlalchemy.orm import object_session
+from app import db
+from app.models.about import About, AboutItem
+from app.models.banner import Banner
+from app.models.blog import Blog
+from app.models.category import Category
+from app.models.client import Client
+from app.models.partner import Partner
+from app.models.portfolio_pdf import PortfolioPDF
+from app.models.project import Project
+from app.models.review import Review
+from app.models.service import Service
+from app.models.upload_ref import UploadRef
+from app.utils.file_upload import UPLOAD_URL_PREFIX, is_immutable_upload
+from app.utils.images import DERIVED_DIR, upload_relative
+
+# Колонки со ссылками на Uploads/: строка или список строк
+UPLOAD_COLUMNS = {
+    Banner: ('image_url', 'logo_url'),
+    Project: ('main_image', 'images', 'pdf_file'),
+    Blog: ('image_url', 'additional_images'),
+    Client: ('logo_url', 'default_logo'),
+    Partner: ('logo_url',),
+    AboutItem: ('background_image_url',),
+    PortfolioPDF: ('pdf_file',),
+}
+# HTML из CKEditor: картинки, вставленные в текст, тоже ссылки на Uploads/
+HTML_COLUMNS = {
+    About: ('description_ru', 'description_en'),
+    AboutItem: ('description_ru', 'description_en', 'deliverables_ru', 'deliverables_en'),
+    Blog: ('description_ru', 'description_en'),
+    Category: ('description_ru', 'description_en'),
+    Partner: ('description_ru', 'description_en'),
+    Project: ('description_ru', 'description_en', 'content_ru', 'content_en'),
+    Review: ('content_ru', 'content_tk', 'content_en'),
+    Service: ('content_ru', 'content_en'),
+}
+TRACKED_MODELS = tuple(dict.fromkeys((*UPLOAD_COLUMNS, *HTML_COLUMNS)))
+_HTML_UPLOAD = re.compile(re.escape(UPLOAD_URL_PREFIX) + r'[^\s"\'<>()?#]+')
+_session_key = 'upload_refs.before'
+
+
+def referenced_paths(values):
+    """Upload paths (relative to UPLOAD_FOLDER) found in column values."""
+    paths = set()
+    for value in values:
+        for item in (value if isinstance(value, (list, tuple)) else [value]):
+            relative = upload_relative(item)
+            if relative:
+                paths.add(relative)
+    return paths
+
+
+def html_paths(values):
+    """Upload paths of /Uploads/ URLs anywhere in HTML values, absolute URLs included."""
+    return referenced_paths(
+        _HTML_UPLOAD.findall(value) for value in values if isinstance(value, str)
+    )
+
+
+def replace_html_urls(value, urls):
+    """``value`` with every /Uploads/ URL found in ``urls`` swapped for its new URL."""
+    if not isinstance(value, str):
+        return value
+    return _HTML_UPLOAD.sub(lambda match: urls.get(match.group(0), match.group(0)), value)
+
+
+def tracked_columns(model):
+    return UPLOAD_COLUMNS.get(model, ()) + HTML_COLUMNS.get(model, ())
+
+
+def row_paths(model, row):
+    """Upload paths referenced by one row, given as ``{column: value}``."""
+    return (referenced_paths(row[name] for name in UPLOAD_COLUMNS.get(model, ()))
+            | html_paths(row[name] for name in HTML_COLUMNS.get(model, ())))
+
+
+def _row_paths(connection, model, ref_id):
+    table = model.__table__
+    row = connection.execute(
+        select(*(table.c[name] for name in tracked_columns(model))).where(table.c.id == ref_id)
+    ).mappings().first()
+    return row_paths(model, row) if row else set()
+
+
+def _adjust(connection, added, removed):
+    table = UploadRef.__table__
+    now = datetime.utcnow()
+    for path, delta in [(p, 1) for p in added] + [(p, -1) for p in removed]:
+        result = connection.execute(
+            table.update().where(table.c.path == path).values(refs=table.c.refs + delta, updated_at=now)
+        )
+        if result.rowcount == 0:
+            connection.execute(table.insert().values(path=path, refs=max(delta, 0), updated_at=now))
+
+
+def _after_insert(model, mapper, connection, target):
+    _adjust(connection, row_paths(model, {name: getattr(target, name) for name in tracked_columns(model)}), ())
+
+
+def _changed(model, target):
+    state = inspect(target)
+    return any(state.attrs[name].history.has_changes() for name in tracked_columns(model))
+
+
+def _before_update(model, mapper, connection, target):
+    # Old values come from the row itself: attributes expired by a commit have no history
+    if _changed(model, target):
+        before = object_session(target).info.setdefault(_session_key, {})
+        before[(model, target.id)] = _row_paths(connection, model, target.id)
+
+
+def _after_update(model, mapper, connection, target):
+    before = object_session(target).info.get(_session_key, {})
+    old_paths = before.pop((model, target.id), None)
+    if old_paths is None:
+        return
+    new_paths = _row_paths(connection, model, target.id)
+    _adjust(connection, new_paths - old_paths, old_paths - new_paths)
+
+
+def _before_delete(model, mapper, connection, target):
+    _adjust(connection, (), _row_paths(connection, model, target.id))
+
+
+for _model in TRACKED_MODELS:
+    event.listen(_model, 'after_insert', partial(_after_insert, _model))
+    event.listen(_model, 'before_update', partial(_before_update, _model))
+    event.listen(_model, 'after_update', partial(_after_update, _model))
+    event.listen(_model, 'before_delete', partial(_before_delete, _model))
+
+
+class UploadCollector:
+    """Deletes content-addressed files in Uploads/ that no row references any more.
+
+    Only files written by commit_upload (``ab/cd/<sha256>.<ext>``) are
+    candidates; anything saved under its own name, such as Uploads/images/
+    from the API, is never touched. References are the URL columns in
+    UPLOAD_COLUMNS and /Uploads/ links inside the CKEditor HTML columns.
+    The upload_ref table counts them and is updated from mapper events
+    in the same transaction as the content. A file is removed only after its
+    count has been zero, and the file itself untouched, for UPLOAD_GC_GRACE
+    seconds, so uploads whose form is still being saved are safe. Each run
+    first reconciles the counts with the tables, which also covers writes
+    that bypass the ORM (bulk deletes, raw SQL, seed scripts).
+    """
+
+    def __init__(self):
+        self.app = None
+        self._timer = None
+        self._timer_lock = threading.Lock()
+
+    def init_app(self, app):
+        self.app = app
+        app.config.setdefault('UPLOAD_GC_GRACE', 24 * 3600)
+        app.config.setdefault('UPLOAD_GC_BATCH', 200)
+        app.config.setdefault('UPLOAD_GC_INTERVAL', 6 * 3600)
+        app.config.setdefault('UPLOAD_GC_AUTO', False)
+        app.cli.command('uploads-reindex')(self._reindex_command)
+
+        @app.cli.command('uploads-gc')
+        @click.option('--dry-run', is_flag=True, help='Only report what would be deleted.')
+        def uploads_gc(dry_run):
+            """Delete unreferenced files from Uploads/ after the grace period."""
+            self._print_report(self.collect(dry_run=dry_run), dry_run)
+
+        if app.config['UPLOAD_GC_AUTO']:
+            # Timer is started by the first request, i.e. after gunicorn forks
+            app.before_request(self._schedule)
+
+    def _reindex_command(self):
+        """Recount references to files in Uploads/."""
+        click.echo(f'Corrected {self.reconcile()} reference counts')
+
+    def _print_report(self, report, dry_run):
+        for path, size in report['files']:
+            click.echo(f'{size:>12}  {path}')
+        verb = 'Would delete' if dry_run else 'Deleted'
+        click.echo(
+            f"{verb} {len(report['files'])} files ({report['bytes']} bytes); "
+            f"{report['in_grace']} unreferenced files are within the grace period"
+        )
+
+    def count(self):
+        counts = Counter()
+        for model in TRACKED_MODELS:
+            table = model.__table__
+            for row in db.session.execute(select(*(table.c[name] for name in tracked_columns(model)))).mappings():
+                counts.update(row_paths(model, row))
+        return counts
+
+    def _index(self):
+        return {row.path: row for row in db.session.execute(select(UploadRef.__table__)).all()}
+
+    def reconcile(self):
+        """Bring upload_ref in line with the tables; returns the number of corrected paths."""
+        table = UploadRef.__table__
+        counts = self.count()
+        index = self._index()
+        now = datetime.utcnow()
+        corrected = 0
+        for path in set(counts) | set(index):
+            refs = counts.get(path, 0)
+            row = index.get(path)
+            if row is None:
+                db.session.execute(table.insert().values(path=path, refs=refs, updated_at=now))
+            elif row.refs != refs:
+                db.session.execute(table.update().where(table.c.path == path).values(refs=refs, updated_at=now))
+            else:
+                continue
+            corrected += 1
+        db.session.commit()
+        return corrected
+
+    def _candidates(self, counts, index):
+        folder = self.app.config['UPLOAD_FOLDER']
+        cutoff = time.time() - self.app.config['UPLOAD_GC_GRACE']
+        released_before = datetime.utcnow() - timedelta(seconds=self.app.config['UPLOAD_GC_GRACE'])
+        candidates, in_grace = [], 0
+        for root, dirs, files in os.walk(folder):
+            at_top = root == folder
+            dirs[:] = [d for d in dirs if not d.startswith('.') and not (at_top and d == DERIVED_DIR)]
+            for name in files:
+                if name.startswith('.'):
+                    continue
+                path = os.path.join(root, name)
+                relative = os.path.relpath(path, folder).replace(os.sep, '/')
+                if not is_immutable_upload(relative) or counts.get(relative):
+                    continue
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                row = index.get(relative)
+                if stat.st_mtime > cutoff or (row is not None and row.updated_at > released_before):
+                    in_grace += 1
+                    continue
+                candidates.append((relative, stat.st_size))
+        return candidates, in_grace
+
+    def collect(self, dry_run=False):
+        """Delete unreferenced uploads in batches; returns ``{'files', 'bytes', 'in_grace'}``."""
+        if dry_run:
+            counts = self.count()
+        else:
+            corrected = self.reconcile()
+            if corrected:
+                self.app.logger.warning(f"Исправлено счётчиков ссылок на загрузки: {corrected}")
+            counts = None
+        index = self._index()
+        if counts is None:
+            counts = {path: row.refs for path, row in index.items()}
+        candidates, in_grace = self._candidates(counts, index)
+        report = {'files': [], 'bytes': 0, 'in_grace': in_grace}
+        if dry_run:
+            report['files'] = candidates
+            report['bytes'] = sum(size for _, size in candidates)
+            return report
+
+        batch_size = self.app.config['UPLOAD_GC_BATCH']
+        for start in range(0, len(candidates), batch_size):
+            batch = dict(candidates[start:start + batch_size])
+            self._delete_batch(batch, report)
+        return report
+
+    def _delete_batch(self, batch, report):
+        table = UploadRef.__table__
+        folder = self.app.config['UPLOAD_FOLDER']
+        # Ссылка могла появиться после сканирования
+        revived = set(db.session.execute(
+            select(table.c.path).where(table.c.path.in_(batch), table.c.refs > 0)
+        ).scalars())
+        deleted = []
+        for relative, size in batch.items():
+            if relative in revived:
+                continue
+            try:
+                os.remove(os.path.join(folder, relative))
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                self.app.logger.error(f"Не удалось удалить {relative}: {str(e)}")
+                continue
+            shutil.rmtree(os.path.join(folder, DERIVED_DIR, relative), ignore_errors=True)
+            self._prune_dirs(folder, relative)
+            self._prune_dirs(folder, f'{DERIVED_DIR}/{relative}')
+            deleted.append(relative)
+            report['files'].append((relative, size))
+            report['bytes'] += size
+        if deleted:
+            db.session.execute(table.delete().where(table.c.path.in_(deleted), table.c.refs <= 0))
+        db.session.commit()
+
+    def _prune_dirs(self, folder, relative):
+        # Пустые каталоги ab/cd/ после удаления последнего файла
+        parent = os.path.dirname(relative)
+        while parent:
+            try:
+                os.rmdir(os.path.join(folder, parent))
+            except OSError:
+                break
+            parent = os.path.dirname(parent)
+
+    def _schedule(self):
+        if self._timer is None:
+            self._start_timer(60)
+
+    def _start_timer(self, delay):
+        with self._timer_lock:
+            if self._timer is not None and self._timer.is_alive() and self._timer is not threading.current_thread():
+                return
+            self._timer = threading.Timer(delay, self._run_in_background)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _run_in_background(self):
+        interval = self.app.config['UPLOAD_GC_INTERVAL']
+        lock_path = os.path.join(self.app.instance_path, 'upload-gc.lock')
+        try:
+            with open(lock_path, 'a+') as lock:
+                try:
+                    fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    return  # another worker is collecting
+                lock.seek(0)
+                try:
+                    last_run = float(lock.read() or 0)
+                except ValueError:
+                    last_run = 0
+                # Every worker has a timer; the file keeps the real interval across them
+                if time.time() - last_run < interval:
+                    return
+                with self.app.app_context():
+                    try:
+                        report = self.collect()
+                        if report['files']:
+                            self.app.logger.info(
+                                f"Удалено неиспользуемых загрузок: {len(report['files'])} ({report['bytes']} байт)"
+                            )
+                    except Exception as e:
+                        db.session.rollback()
+                        self.app.logger.error(f"Ошибка очистки загрузок: {str(e)}")
+                    finally:
+                        db.session.remove()
+                lock.seek(0)
+                lock.truncate()
+                lock.write(str(time.time()))
+        except OSError as e:
+            self.app.logger.error(f"Ошибка очистки загрузок: {str(e)}")
+        finally:
+            self._start_timer(interval)
+
+
+upload_collector = UploadCollector()
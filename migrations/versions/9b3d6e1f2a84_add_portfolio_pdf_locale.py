@@ -0,0 +1,28 @@
+"""add portfolio_pdf.locale for generated portfolios
+
+Revision ID: 9b3d6e1f2a84
+Revises: f5b8d2c61a47
+Create Date: 2026-10-18 18:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9b3d6e1f2a84'
+down_revision = 'f5b8d2c61a47'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('portfolio_pdf', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('locale', sa.String(length=5), nullable=True))
+        batch_op.create_index(batch_op.f('ix_portfolio_pdf_locale'), ['locale'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('portfolio_pdf', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_portfolio_pdf_locale'))
+        batch_op.drop_column('locale')
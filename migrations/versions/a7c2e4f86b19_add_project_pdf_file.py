@@ -0,0 +1,27 @@
+"""add project.pdf_file
+
+Revision ID: a7c2e4f86b19
+Revises: 9b3d6e1f2a84
+Create Date: 2026-10-18 19:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a7c2e4f86b19'
+down_revision = '9b3d6e1f2a84'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # /project/<id>/upload-pdf set the attribute, but the column never existed
+    with op.batch_alter_table('project', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('pdf_file', sa.String(length=255), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('project', schema=None) as batch_op:
+        batch_op.drop_column('pdf_file')
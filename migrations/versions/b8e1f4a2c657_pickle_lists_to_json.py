@@ -0,0 +1,163 @@
+"""store tag and image lists as JSON, add project_tag/blog_tag
+
+Revision ID: b8e1f4a2c657
+Revises: a7c2e4f86b19
+Create Date: 2026-10-18 20:00:00.000000
+
+"""
+import json
+import pickle
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b8e1f4a2c657'
+down_revision = 'a7c2e4f86b19'
+branch_labels = None
+depends_on = None
+
+# table -> list columns that were PickleType
+LIST_COLUMNS = {
+    'project': ('tags_ru', 'tags_en', 'images'),
+    'blog': ('additional_images', 'tags'),
+}
+# table -> (tag table, id column, {locale: column})
+TAG_SOURCES = {
+    'project': ('project_tag', 'project_id', {'ru': 'tags_ru', 'en': 'tags_en'}),
+    'blog': ('blog_tag', 'blog_id', {None: 'tags'}),
+}
+BATCH_SIZE = 500
+
+
+def _load_list(raw):
+    """Old column value as a list of strings.
+
+    Besides pickled lists there are pickled strings (the API stored form
+    values as-is) and plain TEXT left over from before e83187d6a133.
+    """
+    if raw is None:
+        return None
+    if isinstance(raw, memoryview):
+        raw = raw.tobytes()
+    value = raw
+    if isinstance(raw, bytes):
+        try:
+            value = pickle.loads(raw)
+        except Exception:
+            value = raw.decode('utf-8', 'replace')
+    if isinstance(value, str):
+        try:
+            parsed = json.loads(value)
+        except ValueError:
+            parsed = None
+        value = parsed if isinstance(parsed, list) else value.split(',')
+    if not isinstance(value, (list, tuple)):
+        return None
+    return [str(item).strip() for item in value if item is not None and str(item).strip()]
+
+
+def _batches(connection, table_name, columns, column_type=None):
+    # Keyset по id: память и длина транзакции не зависят от размера таблицы
+    source = sa.table(table_name, sa.column('id', sa.Integer), *(sa.column(name, column_type) for name in columns))
+    last_id = 0
+    while True:
+        rows = connection.execute(
+            sa.select(source).where(source.c.id > last_id).order_by(source.c.id).limit(BATCH_SIZE)
+        ).mappings().all()
+        if not rows:
+            return
+        yield rows
+        last_id = rows[-1]['id']
+
+
+def _replace_columns(table_name, columns, convert, read_type, write_type):
+    """Swap each column for a ``write_type`` one filled through ``convert``, batch by batch."""
+    with op.batch_alter_table(table_name, schema=None) as batch_op:
+        for name in columns:
+            batch_op.add_column(sa.Column(f'{name}_new', write_type, nullable=True))
+
+    connection = op.get_bind()
+    target = sa.table(
+        table_name, sa.column('id', sa.Integer),
+        *(sa.column(f'{name}_new', write_type) for name in columns)
+    )
+    update = target.update().where(target.c.id == sa.bindparam('_id')).values(
+        {f'{name}_new': sa.bindparam(f'_{name}') for name in columns}
+    )
+    for rows in _batches(connection, table_name, columns, read_type):
+        connection.execute(update, [
+            {'_id': row['id'], **{f'_{name}': convert(row[name]) for name in columns}} for row in rows
+        ])
+
+    with op.batch_alter_table(table_name, schema=None) as batch_op:
+        for name in columns:
+            batch_op.drop_column(name)
+            batch_op.alter_column(f'{name}_new', new_column_name=name, existing_nullable=True)
+
+
+def _tag_key(tag):
+    return ' '.join(tag.split()).casefold()[:255]
+
+
+def _fill_tags():
+    connection = op.get_bind()
+    for table_name, (tag_table, id_column, sources) in TAG_SOURCES.items():
+        target = sa.table(
+            tag_table, sa.column(id_column), sa.column('tag_key'), sa.column('tag'),
+            *((sa.column('locale'),) if None not in sources else ())
+        )
+        connection.execute(target.delete())
+        for rows in _batches(connection, table_name, tuple(sources.values()), sa.JSON()):
+            tags = {}
+            for row in rows:
+                for locale, name in sources.items():
+                    for tag in row[name] or []:
+                        if not isinstance(tag, str) or not tag.strip():
+                            continue
+                        key = _tag_key(tag)
+                        values = {id_column: row['id'], 'tag_key': key, 'tag': tag.strip()[:255]}
+                        if locale:
+                            values['locale'] = locale
+                        tags.setdefault((row['id'], locale, key), values)
+            if tags:
+                connection.execute(target.insert(), list(tags.values()))
+
+
+def upgrade():
+    # create_app() runs db.create_all(), so `flask db upgrade` may find the tag tables already there
+    existing = sa.inspect(op.get_bind()).get_table_names()
+    if 'project_tag' not in existing:
+        op.create_table('project_tag',
+        sa.Column('project_id', sa.Integer(), nullable=False),
+        sa.Column('locale', sa.String(length=5), nullable=False),
+        sa.Column('tag_key', sa.String(length=255), nullable=False),
+        sa.Column('tag', sa.String(length=255), nullable=False),
+        sa.ForeignKeyConstraint(['project_id'], ['project.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('project_id', 'locale', 'tag_key')
+        )
+        op.create_index('ix_project_tag_tag_key', 'project_tag', ['tag_key', 'project_id'], unique=False)
+    if 'blog_tag' not in existing:
+        op.create_table('blog_tag',
+        sa.Column('blog_id', sa.Integer(), nullable=False),
+        sa.Column('tag_key', sa.String(length=255), nullable=False),
+        sa.Column('tag', sa.String(length=255), nullable=False),
+        sa.ForeignKeyConstraint(['blog_id'], ['blog.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('blog_id', 'tag_key')
+        )
+        op.create_index('ix_blog_tag_tag_key', 'blog_tag', ['tag_key', 'blog_id'], unique=False)
+
+    # Raw values: some rows are not pickles at all. Empty values stay SQL NULL, not JSON 'null'
+    for table_name, columns in LIST_COLUMNS.items():
+        _replace_columns(table_name, columns, _load_list, None, sa.JSON(none_as_null=True))
+    _fill_tags()
+
+
+def downgrade():
+    for table_name, columns in LIST_COLUMNS.items():
+        _replace_columns(table_name, columns, lambda value: value, sa.JSON(), sa.PickleType())
+
+    op.drop_index('ix_blog_tag_tag_key', table_name='blog_tag')
+    op.drop_table('blog_tag')
+    op.drop_index('ix_project_tag_tag_key', table_name='project_tag')
+    op.drop_table('project_tag')
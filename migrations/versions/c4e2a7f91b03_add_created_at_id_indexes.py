@@ -0,0 +1,32 @@
+"""add (created_at, id) indexes for keyset pagination
+
+Revision ID: c4e2a7f91b03
+Revises: a3f9c1e2d4b5
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c4e2a7f91b03'
+down_revision = 'a3f9c1e2d4b5'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('project', schema=None) as batch_op:
+        batch_op.create_index('ix_project_created_at_id', ['created_at', 'id'], unique=False)
+
+    with op.batch_alter_table('blog', schema=None) as batch_op:
+        batch_op.create_index('ix_blog_created_at_id', ['created_at', 'id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('blog', schema=None) as batch_op:
+        batch_op.drop_index('ix_blog_created_at_id')
+
+    with op.batch_alter_table('project', schema=None) as batch_op:
+        batch_op.drop_index('ix_project_created_at_id')
@@ -0,0 +1,33 @@
+"""add upload_ref reference counts
+
+Revision ID: f5b8d2c61a47
+Revises: c4e2a7f91b03
+Create Date: 2026-10-18 15:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f5b8d2c61a47'
+down_revision = 'c4e2a7f91b03'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Counts are filled by `flask uploads-reindex` or by the next collection.
+    # create_app() runs db.create_all(), which may have created the table already
+    if 'upload_ref' in sa.inspect(op.get_bind()).get_table_names():
+        return
+    op.create_table('upload_ref',
+    sa.Column('path', sa.String(length=512), nullable=False),
+    sa.Column('refs', sa.Integer(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('path')
+    )
+
+
+def downgrade():
+    op.drop_table('upload_ref')
@@ -0,0 +1,92 @@
+"""CRUD resources of /api/banners, /api/projects and /api/blog."""
+import pytest
+
+BANNER = {
+    'title_ru': 'Баннер', 'title_en': 'Banner', 'subtitle_ru': 'Подзаголовок', 'subtitle_en': 'Subtitle',
+    'image_url': '/Uploads/banner.png', 'button_text_ru': 'Далее', 'button_text_en': 'More', 'button_link': '/',
+}
+PROJECT = {
+    'title_ru': 'Проект', 'title_en': 'Project', 'description_ru': '<p>Описание</p>',
+    'description_en': '<p>Description</p>', 'tags_en': 'Branding, Print', 'type': 'branding',
+}
+BLOG = {
+    'title_ru': 'Статья', 'title_en': 'Article', 'description_ru': '<p>Текст</p>', 'description_en': '<p>Text</p>',
+    'image_url': '/Uploads/blog.png', 'date': '2024-01-01', 'additional_images': '',
+}
+
+
+@pytest.fixture(scope='module')
+def app(tmp_path_factory):
+    database = tmp_path_factory.mktemp('api-resources') / 'site.db'
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setenv('DATABASE_URL', f'sqlite:///{database}')
+        mp.setenv('QUERY_BUDGET_STRICT', '1')
+        mp.setenv('RESPONSE_CACHE_ENABLED', '0')
+        mp.setenv('STATIC_EXPORT_AUTO', '0')
+        mp.setenv('UPLOAD_GC_AUTO', '0')
+        from app import create_app, db
+        from app.models.user import User
+        app = create_app()
+    app.config['TESTING'] = True
+    app.config['PORTFOLIO_PDF_DELAY'] = 24 * 3600
+    with app.app_context():
+        user = User(username='admin', is_admin=True)
+        user.set_password('admin')
+        db.session.add(user)
+        db.session.commit()
+    return app
+
+
+@pytest.fixture
+def admin(app):
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = '1'
+        session['_fresh'] = True
+    return client
+
+
+@pytest.mark.parametrize('method, url', [
+    ('post', '/api/banners'),
+    ('put', '/api/banners/1'),
+    ('delete', '/api/banners/1'),
+    ('post', '/api/projects'),
+    ('put', '/api/projects/1'),
+    ('delete', '/api/projects/1'),
+    ('post', '/api/blog'),
+    ('put', '/api/blog/1'),
+    ('delete', '/api/blog/1'),
+])
+def test_writes_require_login(app, method, url):
+    assert getattr(app.test_client(), method)(url, json={}).status_code == 302
+
+
+@pytest.mark.parametrize('url, body, read', [
+    ('/api/banners', BANNER, '/api/banners/{id}'),
+    ('/api/projects', PROJECT, '/api/projects/{id}'),
+    ('/api/blog', BLOG, '/api/blog/{id}'),
+])
+def test_create_update_delete(admin, url, body, read):
+    response = admin.post(url, json=body)
+    assert response.status_code == 200, response.get_data(as_text=True)
+    item_id = response.get_json()['id']
+    assert admin.put(f'{url}/{item_id}', json=dict(body, title_en='Updated')).status_code == 200
+    data = admin.get(read.format(id=item_id), headers={'Accept-Language': 'en'}).get_json()
+    assert data.get('data', data)['title'] == 'Updated'
+    assert admin.delete(f'{url}/{item_id}').status_code == 200
+    assert admin.get(read.format(id=item_id)).status_code == 404
+
+
+def test_public_reads_within_budget(admin, app):
+    for i in range(3):
+        assert admin.post('/api/blog', json=dict(BLOG, title_en=f'Article {i}')).status_code == 200
+    banner_id = admin.post('/api/banners', json=BANNER).get_json()['id']
+    client = app.test_client()
+    assert client.get(f'/api/banners/{banner_id}', headers={'Accept-Language': 'en'}).get_json()['title'] == 'Banner'
+
+    first = client.get('/api/blog?per_page=2&with_total=1&fields=id,title').get_json()
+    assert first['pagination']['total'] == 3 and len(first['data']) == 2
+    cursor = first['pagination']['next_cursor']
+    rest = client.get(f'/api/blog?per_page=2&cursor={cursor}&with_total=1').get_json()
+    assert len(rest['data']) == 1 and rest['pagination']['total'] == 3
+    assert client.get('/api/blog?tag=nothing').get_json()['pagination']['total'] == 0
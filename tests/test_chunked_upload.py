@@ -0,0 +1,78 @@
+"""Routing and argument checks of the chunked upload API."""
+import hashlib
+import pytest
+
+PDF = b'%PDF-1.4\n' + b'0' * 2048 + b'\n%%EOF\n'
+
+
+@pytest.fixture(scope='module')
+def app(tmp_path_factory):
+    database = tmp_path_factory.mktemp('chunked-upload') / 'site.db'
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setenv('DATABASE_URL', f'sqlite:///{database}')
+        mp.setenv('STATIC_EXPORT_AUTO', '0')
+        mp.setenv('UPLOAD_GC_AUTO', '0')
+        from app import create_app, db
+        from app.models.user import User
+        app = create_app()
+    app.config['TESTING'] = True
+    with app.app_context():
+        user = User(username='admin', is_admin=True)
+        user.set_password('admin')
+        db.session.add(user)
+        db.session.commit()
+    return app
+
+
+@pytest.fixture
+def client(app):
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = '1'
+        session['_fresh'] = True
+    return client
+
+
+def test_requires_login(app):
+    assert app.test_client().post('/api/uploads', json={'filename': 'a.pdf', 'size': 1}).status_code == 302
+
+
+@pytest.mark.parametrize('method, url', [
+    ('get', '/api/uploads'),
+    ('put', '/api/uploads'),
+    ('delete', '/api/uploads'),
+    ('post', '/api/uploads/abc'),
+])
+def test_wrong_method_is_405(client, method, url):
+    assert getattr(client, method)(url).status_code == 405
+
+
+@pytest.mark.parametrize('body', [
+    {'filename': 'a.pdf', 'size': len(PDF), 'sha256': 123},
+    {'filename': 'a.pdf', 'size': len(PDF), 'sha256': 'abc'},
+    {'filename': 'a.pdf', 'size': len(PDF), 'sha256': 'g' * 64},
+    {'filename': 'a.pdf', 'size': True},
+    {'filename': 'a.pdf', 'size': '10'},
+    {'filename': 123, 'size': 10},
+    {'filename': 'a.exe', 'size': 10},
+])
+def test_invalid_start_is_400(client, body):
+    assert client.post('/api/uploads', json=body).status_code == 400
+
+
+def test_upload_round_trip(client):
+    digest = hashlib.sha256(PDF).hexdigest()
+    response = client.post('/api/uploads', json={'filename': 'a.pdf', 'size': len(PDF), 'sha256': digest.upper()})
+    assert response.status_code == 201
+    upload_id = response.get_json()['upload_id']
+    try:
+        half = len(PDF) // 2
+        assert client.put(f'/api/uploads/{upload_id}?offset=0', data=PDF[:half]).get_json()['offset'] == half
+        assert client.get(f'/api/uploads/{upload_id}').get_json()['offset'] == half
+        client.put(f'/api/uploads/{upload_id}', data=PDF[half:],
+                   headers={'Content-Range': f'bytes {half}-{len(PDF) - 1}/{len(PDF)}'})
+        status = client.post(f'/api/uploads/{upload_id}/complete').get_json()
+        assert status['complete'] and status['sha256'] == digest
+    finally:
+        assert client.delete(f'/api/uploads/{upload_id}').status_code == 200
+    assert client.get(f'/api/uploads/{upload_id}').status_code == 404
@@ -0,0 +1,41 @@
+"""References rewritten by ``flask media optimize``."""
+import os
+import pytest
+from PIL import Image
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    monkeypatch.setenv('DATABASE_URL', f"sqlite:///{tmp_path / 'site.db'}")
+    monkeypatch.setenv('STATIC_EXPORT_AUTO', '0')
+    monkeypatch.setenv('UPLOAD_GC_AUTO', '0')
+    from app import create_app
+    app = create_app()
+    app.config['TESTING'] = True
+    app.config['UPLOAD_FOLDER'] = str(tmp_path / 'Uploads')
+    app.config['MEDIA_CHECKPOINT'] = str(tmp_path / 'media-optimize.json')
+    os.makedirs(app.config['UPLOAD_FOLDER'])
+    return app
+
+
+def test_rewrites_upload_and_html_columns(app):
+    from app import db
+    from app.models.blog import Blog
+    from app.utils.media import media_optimizer
+
+    Image.effect_noise((1200, 900), 64).convert('RGB').save(
+        os.path.join(app.config['UPLOAD_FOLDER'], 'photo.jpg'), quality=100
+    )
+    with app.app_context():
+        blog = Blog(title_ru='Фото', title_en='Photo', image_url='/Uploads/photo.jpg',
+                    description_en='<p><img src="https://example.com/Uploads/photo.jpg"></p>',
+                    description_ru='<p><a href="/Uploads/photo.jpg">фото</a> <img src="/Uploads/other.jpg"></p>')
+        db.session.add(blog)
+        db.session.commit()
+
+        media_optimizer.optimize(workers=1, max_size=800)
+
+        blog = db.session.get(Blog, blog.id)
+        assert blog.image_url != '/Uploads/photo.jpg'
+        assert blog.description_en == f'<p><img src="https://example.com{blog.image_url}"></p>'
+        assert blog.description_ru == f'<p><a href="{blog.image_url}">фото</a> <img src="/Uploads/other.jpg"></p>'
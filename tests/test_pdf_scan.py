@@ -0,0 +1,23 @@
+"""Page count of PDFs from compressed object streams."""
+import zlib
+import pytest
+from app.utils.pdf_ingest import SCAN_CHUNK, PDFScanLimitExceeded, _scan_pages
+
+
+def _pdf(tmp_path, payload):
+    path = tmp_path / 'doc.pdf'
+    path.write_bytes(b'%PDF-1.5\n1 0 obj <</Type /ObjStm>> stream\n' + zlib.compress(payload) + b'\nendstream\n%%EOF\n')
+    return str(path)
+
+
+def test_pages_across_chunks(tmp_path):
+    # Объекты страниц попадают и на границы кусков распаковки
+    page = b'<</Type /Page>>'
+    payload = b''.join(b' ' * (SCAN_CHUNK - 7 + i) + page for i in range(4))
+    assert _scan_pages(_pdf(tmp_path, payload), 16 * SCAN_CHUNK) == 4
+
+
+def test_limit_rejects_bomb(tmp_path):
+    path = _pdf(tmp_path, b'\0' * (8 * SCAN_CHUNK))
+    with pytest.raises(PDFScanLimitExceeded):
+        _scan_pages(path, 4 * SCAN_CHUNK)
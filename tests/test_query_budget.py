@@ -0,0 +1,150 @@
+"""Every public GET endpoint stays within its query_budget on a populated database.
+
+QUERY_BUDGET_STRICT=1 turns an exceeded budget into an exception, so an
+N+1 on related rows shows up here as a failed request. The response cache
+is off, otherwise repeated URLs would never reach the view.
+"""
+from datetime import date, datetime, timedelta
+import pytest
+
+ROWS = 5
+
+
+def _seed(db):
+    from app.models.about import About, AboutItem
+    from app.models.banner import Banner
+    from app.models.blog import Blog
+    from app.models.category import Category
+    from app.models.client import Client
+    from app.models.contact import Contact
+    from app.models.partner import Partner
+    from app.models.portfolio_pdf import PortfolioPDF
+    from app.models.project import Project
+    from app.models.review import Review
+    from app.models.service import Service
+
+    now = datetime.utcnow()
+    categories = [
+        Category(title_ru=f'Категория {i}', title_en=f'Category {i}', slug=f'category-{i}',
+                 description_ru='<p>Описание</p>', description_en='<p>Description</p>')
+        for i in range(ROWS)
+    ]
+    projects = [
+        Project(title_ru=f'Проект {i}', title_en=f'Project {i}', type='branding' if i % 2 else 'others',
+                description_ru='<p>Описание</p>', description_en='<p>Brand project</p>',
+                main_image=f'/Uploads/project-{i}.png', images=[f'/Uploads/project-{i}-{j}.png' for j in range(3)],
+                tags_ru=['Брендинг', f'Тег {i}'], tags_en=['Branding', f'Tag {i}'],
+                categories=categories[i % ROWS:i % ROWS + 2], created_at=now - timedelta(days=i))
+        for i in range(ROWS)
+    ]
+    blogs = [
+        Blog(title_ru=f'Статья {i}', title_en=f'Brand article {i}', description_ru='<p>Текст</p>',
+             description_en='<p>Text</p>', image_url=f'/Uploads/blog-{i}.png',
+             additional_images=[f'/Uploads/blog-{i}-{j}.png' for j in range(2)], tags=['Branding', f'Tag {i}'],
+             date=date(2024, 1, i + 1), created_at=now - timedelta(days=i))
+        for i in range(ROWS)
+    ]
+    services = [
+        Service(content_ru=f'Услуга {i}', content_en=f'Brand service {i}', category=categories[i],
+                projects=projects[:2], blogs=blogs[:2])
+        for i in range(ROWS)
+    ]
+    about = About(title_ru='О нас', title_en='About', description_ru='<p>Мы</p>', description_en='<p>Us</p>')
+    about.items = [
+        AboutItem(title_ru=f'Пункт {i}', title_en=f'Item {i}', type='service',
+                  background_image_url=f'/Uploads/about-{i}.png', categories=categories[:2], created_at=now)
+        for i in range(ROWS)
+    ]
+    db.session.add_all(categories + projects + blogs + services + [about])
+    db.session.add_all(
+        Banner(title_ru=f'Баннер {i}', title_en=f'Banner {i}', image_url=f'/Uploads/banner-{i}.png')
+        for i in range(ROWS)
+    )
+    db.session.add_all(Client(logo_url=f'/Uploads/client-{i}.png', order=i) for i in range(ROWS))
+    db.session.add_all(
+        Partner(name_ru=f'Партнёр {i}', name_en=f'Partner {i}', logo_url=f'/Uploads/partner-{i}.png',
+                description_ru='Описание', description_en='Description', order=i)
+        for i in range(ROWS)
+    )
+    db.session.add_all(
+        Review(content_ru='Отзыв', content_en='Review', author_ru='Автор', author_en='Author', project=projects[i])
+        for i in range(ROWS)
+    )
+    db.session.add_all(
+        PortfolioPDF(pdf_file=f'/Uploads/portfolio-{locale}.pdf', locale=locale) for locale in ('ru', 'tk', 'en')
+    )
+    db.session.add(Contact(phone='+993 12 000000', email='info@example.com', address_ru='Ашхабад', address_en='Ashgabat'))
+    db.session.commit()
+
+
+@pytest.fixture(scope='module')
+def client(tmp_path_factory):
+    database = tmp_path_factory.mktemp('query-budget') / 'site.db'
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setenv('DATABASE_URL', f'sqlite:///{database}')
+        mp.setenv('QUERY_BUDGET_STRICT', '1')
+        mp.setenv('RESPONSE_CACHE_ENABLED', '0')
+        mp.setenv('STATIC_EXPORT_AUTO', '0')
+        mp.setenv('UPLOAD_GC_AUTO', '0')
+        from app import create_app, db
+        app = create_app()
+    app.config['TESTING'] = True
+    # Портфолио в Uploads/ за время тестов не собирается
+    app.config['PORTFOLIO_PDF_DELAY'] = 24 * 3600
+    with app.app_context():
+        _seed(db)
+    assert app.test_cli_runner().invoke(args=['search-reindex']).exit_code == 0
+    return app.test_client()
+
+
+@pytest.mark.parametrize('url', [
+    '/index',
+    '/api/banners',
+    '/api/clients',
+    '/api/categories',
+    '/api/services',
+    '/api/services?search=brand',
+    '/api/partners',
+    '/api/bundle',
+    '/api/search?q=brand',
+    '/api/search?q=brand&type=project',
+    '/api/portfolio_pdf',
+    '/api/reviews',
+    '/api/contact',
+    '/api/about',
+    '/api/blog/',
+    '/api/blog/?per_page=2&page=2',
+    '/api/blog/?search=brand',
+    '/api/blog/?tag=branding',
+    '/api/blog/1',
+    '/api/projects',
+    '/api/projects?per_page=2&page=2',
+    '/api/projects?category=1',
+    '/api/projects?search=project',
+    '/api/projects?tag=branding',
+    '/api/projects?id=1',
+    '/api/projects/1',
+])
+@pytest.mark.parametrize('lang', ['ru', 'en'])
+def test_endpoint_within_budget(client, url, lang):
+    response = client.get(url, headers={'Accept-Language': lang})
+    assert response.status_code == 200, response.get_data(as_text=True)[:500]
+
+
+@pytest.mark.parametrize('url', ['/api/blog/?per_page=2', '/api/projects?per_page=2'])
+def test_cursor_pages_within_budget(client, url):
+    cursor = client.get(url).get_json()['next_cursor']
+    assert cursor
+    response = client.get(f'{url}&cursor={cursor}')
+    assert response.status_code == 200, response.get_data(as_text=True)[:500]
+    assert response.get_json()['data']
+
+
+@pytest.mark.parametrize('url', ['/api/blog/?search=brand', '/api/projects?search=project'])
+def test_search_pages_cover_every_match(client, url):
+    seen = []
+    for page in (1, 2, 3):
+        body = client.get(f'{url}&per_page=2&page={page}').get_json()
+        assert body['total'] == ROWS
+        seen += [item['id'] for item in body['data']]
+    assert sorted(seen) == list(range(1, ROWS + 1))
@@ -0,0 +1,51 @@
+"""Cache keys and headers of cached_response views."""
+import pytest
+
+
+@pytest.fixture(scope='module')
+def app(tmp_path_factory):
+    database = tmp_path_factory.mktemp('response-cache') / 'site.db'
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setenv('DATABASE_URL', f'sqlite:///{database}')
+        mp.setenv('STATIC_EXPORT_AUTO', '0')
+        mp.setenv('UPLOAD_GC_AUTO', '0')
+        from app import create_app
+        app = create_app()
+    app.config['TESTING'] = True
+    return app
+
+
+@pytest.fixture
+def client(app):
+    from app.utils.response_cache import response_cache
+    response_cache.clear()
+    return app.test_client()
+
+
+def test_unread_query_args_share_one_entry(client):
+    from app.utils.response_cache import response_cache
+    first = client.get('/api/blog/?page=1')
+    assert first.status_code == 200
+    for junk in ('x=1', 'x=2', 'utm_source=mail'):
+        response = client.get(f'/api/blog/?page=1&{junk}')
+        assert response.status_code == 200
+        assert response.headers['ETag'] == first.headers['ETag']
+    assert len(response_cache._entries) == 1
+    assert client.get('/api/blog/?page=2').headers['ETag'] != first.headers['ETag']
+    assert len(response_cache._entries) == 2
+
+
+def test_request_path_compression_levels(app):
+    from app.utils.response_cache import compress
+    body = b'{"data": "' + b'lorem ipsum dolor sit amet ' * 4000 + b'"}'
+    variants = compress(body)
+    assert variants['gzip'] and len(variants['gzip']) < len(body)
+
+
+def test_vary_accept_language_without_lang(client):
+    response = client.get('/api/categories', headers={'Accept-Language': 'ru'})
+    assert 'Accept-Language' in response.vary
+    response = client.get('/api/categories?lang=ru', headers={'Accept-Language': 'en'})
+    assert 'Accept-Language' not in response.vary
+    assert 'Accept-Encoding' in response.vary
+    assert client.get('/api/categories', headers={'If-None-Match': response.headers['ETag']}).vary